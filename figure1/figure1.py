@@ -9,6 +9,9 @@ import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 import os, sys
 sys.path.append(os.getcwd())
+from util.neurograms import NeurogramStore
+from util.plotting import render_neurogram
+from util.precision import WorkingPrecision
 import matplotlib
 matplotlib.use('Agg')
 
@@ -23,24 +26,22 @@ def sim_and_plot_neurogram(f0, xlow=20, xhigh=25):
         xlow (int): the lower limit of the x-axis, in periods of the tone
         xhigh (int); the upper limit of the x-axis, in periods of the tone
     """
-    # Simulate neurogram
+    # Simulate neurogram (or load it from the neurogram store, if it has already been simulated)
     params = si.Parameters(f0=f0, level=50, fs=int(200e3), cf_low=f0*0.5, cf_high=f0*15, h_low=4, h_high=13, n_cf=200,
                            dur=0.10, dur_ramp=0.01, fiber_type='msr')
-    stimulus = sy.ComplexTone().synthesize_sequence(params)
-    params.add_inputs(stimulus)
     sim = anf.AuditoryNerveZilany2014()
-    resp = sim.run(params)
+    neurogram = NeurogramStore().simulate(params[0], 'Zilany2014', sy.ComplexTone(), WorkingPrecision(sim.simulate))
 
-    # Calculate various axes
-    t = np.linspace(0, resp[0].shape[1]/params[0]['fs'], resp[0].shape[1])
+    # Read only the plotted window of the neurogram and calculate various axes
+    times = neurogram.index_times(xlow/f0, xhigh/f0)
+    t, f, resp = neurogram.read(xlow/f0, xhigh/f0)
     t = t / (1/f0) - xlow  # adjust by requested xlow so that the x-axis will start at 0
     xhigh = xhigh - xlow
     xlow = xlow - xlow
-    f = 10**np.linspace(np.log10(params[0]['cf_low']), np.log10(params[0]['cf_high']), params[0]['n_cf'])
 
     # Get stimulus and add zero padding to it
     stim = np.concatenate([np.zeros(int(params[0]['fs']*0.005)),
-                                        params[0]['_input'],
+                                        neurogram.stimulus,
                                         np.zeros(int(params[0]['fs']*0.040))])
 
     # Generate plot
@@ -54,22 +55,22 @@ def sim_and_plot_neurogram(f0, xlow=20, xhigh=25):
     axs[3, 2].axis('off')
 
     # Plot surface (middle)
-    axs[1, 1].pcolormesh(t, f, resp[0], shading='auto')
+    render_neurogram(axs[1, 1], t, f, resp, xlim=(xlow, xhigh))
     axs[1, 1].get_xaxis().set_visible(False)
     axs[1, 1].get_yaxis().set_visible(False)
     axs[1, 1].set_xlim((xlow, xhigh))
 
     # Plot acoustic stimulus (top)
-    axs[0, 1].plot(t, stim, color='black')
+    axs[0, 1].plot(t, stim[times], color='black')
     axs[0, 1].get_xaxis().set_visible(False)
     axs[0, 1].set_xlim((xlow, xhigh))
     axs[0, 1].set_ylabel('Amplitude (Pa)', rotation='horizontal', ha='right')
 
     # Plot average neural response (bottom, on-CF)
     idx = np.argmin(np.abs(f - f0*4))
-    h4 = axs[2, 1].plot(t, resp[0][idx, :], color='slateblue')
+    h4 = axs[2, 1].plot(t, resp[idx, :], color='slateblue')
     idx = np.argmin(np.abs(f - f0*12))
-    h12 = axs[2, 1].plot(t, resp[0][idx, :], color='cornflowerblue')
+    h12 = axs[2, 1].plot(t, resp[idx, :], color='cornflowerblue')
     axs[2, 1].set_xlim((xlow, xhigh))
     #axs[2, 1].set_xlabel('Normalized time (periods)')
     axs[2, 1].legend(['H4', 'H12'], framealpha=1, loc=1)
@@ -80,9 +81,9 @@ def sim_and_plot_neurogram(f0, xlow=20, xhigh=25):
 
     # Plot average neural response (bottom, off-CF)
     idx = np.argmin(np.abs(f - f0*5.5))
-    axs[3, 1].plot(t, resp[0][idx, :], color='salmon')
+    axs[3, 1].plot(t, resp[idx, :], color='salmon')
     idx = np.argmin(np.abs(f - f0*9.5))
-    axs[3, 1].plot(t, resp[0][idx, :], color='maroon')
+    axs[3, 1].plot(t, resp[idx, :], color='maroon')
     axs[3, 1].set_xlim((xlow, xhigh))
     axs[3, 1].set_xlabel('Normalized time (periods)')
     axs[3, 1].legend(['H5.5', 'H9.5'], framealpha=1, loc=1)
@@ -105,15 +106,15 @@ def sim_and_plot_neurogram(f0, xlow=20, xhigh=25):
     axs[1, 0].set_xlabel('Level (dB)')
 
     # Plot excitation pattern (right)
-    axs[1, 2].plot(np.mean(resp[0], axis=1), f)
+    axs[1, 2].plot(neurogram.mean, f)
     idx = np.argmin(np.abs(f - f0*4))
-    axs[1, 2].plot([0, np.mean(resp[0], axis=1)[idx]], [f0*4, f0*4], color='slateblue', linestyle='dashed')
+    axs[1, 2].plot([0, neurogram.mean[idx]], [f0*4, f0*4], color='slateblue', linestyle='dashed')
     idx = np.argmin(np.abs(f - f0*12))
-    axs[1, 2].plot([0, np.mean(resp[0], axis=1)[idx]], [f0*12, f0*12], color='cornflowerblue', linestyle='dashed')
+    axs[1, 2].plot([0, neurogram.mean[idx]], [f0*12, f0*12], color='cornflowerblue', linestyle='dashed')
     idx = np.argmin(np.abs(f - f0*5.5))
-    axs[1, 2].plot([0, np.mean(resp[0], axis=1)[idx]], [f0*5.5, f0*5.5], color='salmon', linestyle='dashed')
+    axs[1, 2].plot([0, neurogram.mean[idx]], [f0*5.5, f0*5.5], color='salmon', linestyle='dashed')
     idx = np.argmin(np.abs(f - f0*9.5))
-    axs[1, 2].plot([0, np.mean(resp[0], axis=1)[idx]], [f0*9.5, f0*9.5], color='maroon', linestyle='dashed')
+    axs[1, 2].plot([0, neurogram.mean[idx]], [f0*9.5, f0*9.5], color='maroon', linestyle='dashed')
     axs[1, 2].set_ylim(params[0]['cf_low'], params[0]['cf_high'])
     axs[1, 2].get_yaxis().set_visible(False)
     axs[1, 2].set_xlabel('Firing rate')
@@ -6,9 +6,14 @@ import apcmodels.simulation as si
 import apcmodels.anf as anf
 import numpy as np
 from util.functions import ISOToneGuest2021, GEOMToneGuest2021
+from util.cache import CachedSimulation
+from util.summaries import ChannelSummary
 import matplotlib.pyplot as plt
 import os, sys
 sys.path.append(os.getcwd())
+# Seed the global random number generator so that the random levels and noise in the stimuli (and thus the
+# cached model responses, see util/cache.py) are identical across runs
+np.random.seed(0)
 
 
 def plot_ep(axis_main, F0, condition, level, level_noise, title, first, color, interval_size=0.5, fs=int(100e3), fiber_type='hsr'):
@@ -46,11 +51,11 @@ def plot_ep(axis_main, F0, condition, level, level_noise, title, first, color, i
     params.flatten_and_unnest()
     # Estimate responses
     sim = anf.AuditoryNerveZilany2014()
-    resp = sim.run(params)
+    resp = np.array(sim.run(params, runfunc=CachedSimulation(ChannelSummary(sim.simulate))))
     # Calculate cfs
     cfs = 10**np.linspace(np.log10(F0*4), np.log10(F0*12), 200)
     # Calculate mean over time and standard deivation over means
-    firing_rates = np.array([np.mean(r, axis=1) for r in resp])
+    firing_rates = resp['mean']
     mean_response = np.mean(firing_rates, axis=0)
     sd_response = np.std(firing_rates, axis=0)
     # Plot
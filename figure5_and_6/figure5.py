@@ -5,6 +5,7 @@ This script implements the simulations described in Figure 5a of Guest and Oxenh
 import apcmodels.simulation as si
 import apcmodels.anf as anf
 import numpy as np
+from scipy.fft import next_fast_len, rfft, irfft
 import itertools
 import os, sys
 sys.path.append(os.getcwd())
@@ -13,10 +14,33 @@ import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 import util as cfg
 from util.functions import adjust_level
+from util.cache import CachedSimulation
+
+# Seed the global random number generator so that the noise in the stimuli (and thus the cached model responses,
+# see util/cache.py) is identical across runs
+np.random.seed(0)
+
+
+def autocorrelate(signals, n_lag=None, pad=False):
+    """ Calculates the autocorrelation of each row of a 2D array using real FFTs along the time axis
+
+    Args:
+        signals (ndarray): array of signals of shape (n_signal, n_sample)
+        n_lag (int, None): number of lags (starting at zero) to keep, or None to keep every lag
+        pad (bool): if True, signals are zero-padded so that the autocorrelation is linear rather than circular
+
+    Returns:
+        output (ndarray): array of autocorrelations of shape (n_signal, n_lag), in the same precision as signals
+    """
+    n_sample = signals.shape[-1]
+    n_fft = next_fast_len(2*n_sample - 1, real=True) if pad else n_sample
+    spectrum = rfft(signals, n=n_fft, axis=-1)
+    spectrum = spectrum.real**2 + spectrum.imag**2
+    return irfft(spectrum, n=n_fft, axis=-1)[:, :n_lag]
 
 
 # Function to calculate autocorrelations
-def calculate_autocorrelation(f0, neural_harm_nums, tmr, n_repeat=20, level_noise=37):
+def calculate_autocorrelation(f0, neural_harm_nums, tmr, n_repeat=20, level_noise=37, pad=False):
    # Setup params [simulation]
     params = si.Parameters(fs=int(100e3), fs_synapse=20e3, n_cf=1, anf_num=(1, 0, 0),                        # model
                            F0=f0, F0_masker_1=f0*2**(-5.5/12), F0_masker_2=f0*2**(6/12),                     # F0s
@@ -38,22 +62,20 @@ def calculate_autocorrelation(f0, neural_harm_nums, tmr, n_repeat=20, level_nois
 
     # Select model and run
     sim = anf.AuditoryNerveZilany2014()
-    results = sim.run(params, runfunc=lambda x: [sim.simulate(ele) for ele in x])
-
-    # Loop through CFs and repeats and transform firing rate into autocorrelation
-    output = []
-    for ele in results:
-        output.append([np.fft.ifft(np.abs(np.fft.fft(np.squeeze(repeat)))**2) for repeat in ele])
-    output = [np.mean(np.array(ele), axis=0) for ele in output]
-    output = np.array(output)
-
-    # Calculate lags
-    lags = np.linspace(0, output.shape[1]/100e3, output.shape[1])
-
-    # Get rid of extraneous samples
-    keep = lags < (1/f0 * 20)
-    lags = lags[keep]
-    output = output[:, keep]
+    simulate = CachedSimulation(sim.simulate)
+    results = sim.run(params, runfunc=lambda x: [simulate(ele, replicate=idx) for idx, ele in enumerate(x)])
+
+    # Stack CFs and repeats into one array of shape (n_cf*n_repeat, n_sample) (in the working precision, see
+    # util/precision.py)
+    rates = np.array([np.squeeze(repeat) for ele in results for repeat in ele])
+
+    # Calculate lags and keep only those below 20 periods
+    lags = np.linspace(0, rates.shape[1]/100e3, rates.shape[1])
+    lags = lags[lags < (1/f0 * 20)]
+
+    # Transform firing rates into autocorrelations and average over repeats
+    output = autocorrelate(rates, n_lag=len(lags), pad=pad)
+    output = np.mean(output.reshape((len(results), -1, len(lags))), axis=1)
 
     # Return
     return lags, neural_harm_nums, np.abs(output)
@@ -5,12 +5,17 @@ import apcmodels.simulation as si
 import apcmodels.anf as anf
 import numpy as np
 from util.functions import DBLToneGuest2021
+from util.cache import CachedSimulation
+from util.summaries import ChannelSummary
 import matplotlib.pyplot as plt
 import os, sys
 sys.path.append(os.getcwd())
 from functools import partial
 plt.rcParams['font.family'] = 'sans-serif'
 plt.rcParams['font.sans-serif'] = ['Arial']
+# Seed the global random number generator so that the random levels and noise in the stimuli (and thus the
+# cached model responses, see util/cache.py) are identical across runs
+np.random.seed(0)
 
 def prep_ep(F0, level, level_maskers, level_noise, fs=int(100e3), fiber_type='msr'):
     """ Helper function for plotting excitation patterns
@@ -79,8 +84,8 @@ def gen_ep(F0, level, level_maskers, level_noise, fs=100e3, fiber_type='msr'):
     params.flatten_and_unnest()
     # Estimate responses
     sim = anf.AuditoryNerveZilany2014()
-    resp = sim.run(params)
-    # Save
+    resp = np.array(sim.run(params, runfunc=CachedSimulation(ChannelSummary(sim.simulate))))
+    # Save per-channel summaries of each repeat, of shape (n_repeat, n_cf)
     np.save(os.path.join('figure5_and_6', 'excitation_patterns_' + str(F0) + '_' + str(level_maskers) + '_' + fiber_type + '.npy'), resp)
 
 
@@ -103,11 +108,11 @@ def plot_ep(axis_main, F0, level_maskers, title, first, color,
         yaxis_side (str): where to plot the yticks and yticklabels ('left' or 'right')
     """
     # Load from disk
-    resp = np.load(os.path.join('figure5_and_6', 'excitation_patterns_' + str(F0) + '_' + str(level_maskers) + '_' + fiber_type + '.npy'), allow_pickle=True)
+    resp = np.load(os.path.join('figure5_and_6', 'excitation_patterns_' + str(F0) + '_' + str(level_maskers) + '_' + fiber_type + '.npy'))
     # Calculate cfs
     cfs = 10**np.linspace(np.log10(F0*4), np.log10(F0*12), 200)
     # Calculate mean over time and standard deivation over means
-    firing_rates = np.array([np.mean(r, axis=1) for r in resp])
+    firing_rates = resp['mean']
     mean_response = np.mean(firing_rates, axis=0)
     sd_response = np.std(firing_rates, axis=0)
     # Plot masker components
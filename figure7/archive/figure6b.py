@@ -9,7 +9,7 @@ from apcmodels.util import save_to_csv
 import numpy as np
 import os, sys
 sys.path.append(os.getcwd())
-from util.functions import adjust_level
+from util.functions import adjust_level, common_random_draws, latin_hypercube_uniform
 
 
 def simulate_figure6_fdls_phase_roving(model, model_name, fs, n_rep=10):
@@ -39,7 +39,6 @@ def simulate_figure6_fdls_phase_roving(model, model_name, fs, n_rep=10):
     params = si.Parameters(dur=dur, dur_ramp=dur_ramp, fs=fs, n_cf=n_cf, delta_theta=np.array([0.001, 0.001]),
                            API=np.array([[0, 0], [0, 1/360**2]]), n_fiber_per_chan=n_fiber_per_chan,
                            model_name=model_name)
-    params.append('phase', lambda: np.random.uniform(0, 360, 1))  # append random phase
     params.wiggle('freq', freqs)                                  # wiggle frequencies
     params.stitch('cf_low', cf_low)                               # stitch cf_low (each freq corresponds to a cf_low)
     params.stitch('cf_high', cf_high)                             # stitch cf_high (each freq corresponds to a cf_high)
@@ -51,8 +50,10 @@ def simulate_figure6_fdls_phase_roving(model, model_name, fs, n_rep=10):
         ele['nominal_level'] = ele['level']                                 # encode nominal level (dB re: threshold)
         ele['level'] = adjust_level(ele['freq'], ele['level'], model_name)  # encode actual level (dB SPL)
 
-    # Encode repeats and increments
+    # Encode repeats, random phases (shared by every condition and by the baseline and incremented stimuli of each
+    # trial), and increments
     params.repeat(n_rep)
+    common_random_draws(params, 'phase', latin_hypercube_uniform(0, 360, 1))
     params.increment({'freq': 0.001, 'phase': 0.001})  # increment frequency and phase
 
     # Synthesize stimuli
@@ -89,10 +90,7 @@ def simulate_figure6_fdls_level_roving(model, model_name, fs, n_rep=10):
     """
     # Define stimulus parameters
     freqs = 8 * 10**np.linspace(np.log10(280) - 0.2, np.log10(1400) + 0.1, 24)  # simulate 8th harmonic of F0s
-    nominal_levels = [20, 30, 40]  # dB SL
-    levels = [lambda: np.random.uniform(17, 23, 1),
-              lambda: np.random.uniform(27, 33, 1),
-              lambda: np.random.uniform(37, 43, 1)]  # dB SL
+    nominal_levels = [20, 30, 40]  # dB SL, roved by +/- 3 dB on each trial
     dur = 0.10  # seconds
     dur_ramp = 0.01  # seconds
 
@@ -109,13 +107,18 @@ def simulate_figure6_fdls_level_roving(model, model_name, fs, n_rep=10):
     params.wiggle('freq', freqs)                                  # wiggle frequencies
     params.stitch('cf_low', cf_low)                               # stitch cf_low (each freq corresponds to a cf_low)
     params.stitch('cf_high', cf_high)                             # stitch cf_high (each freq corresponds to a cf_high)
-    params.wiggle_parallel(['level', 'nominal_level'], [levels, nominal_levels])  # wiggle levels
+    params.wiggle('nominal_level', nominal_levels)                # wiggle levels
 
     # Flatten parameters
     params.flatten()
 
-    # Encode repeats and increments
+    # Encode repeats, random levels (shared by every condition and by the baseline and incremented stimuli of each
+    # trial), and increments
     params.repeat(n_rep)
+    common_random_draws(params, 'level_rove', latin_hypercube_uniform(-3, 3, 1))
+    for ele in params:
+        for repeat in ele:
+            repeat['level'] = repeat['nominal_level'] + repeat['level_rove']  # encode roved level (dB SL)
     params.increment({'freq': 0.001, 'level': 0.001})  # increment frequency and phase
 
     # Adjust levels to be in dB re: threshold
@@ -4,23 +4,28 @@ This script implements the simulations described in Figure 6 of Guest and Oxenha
 import apcmodels.synthesis as sy
 import apcmodels.simulation as si
 import apcmodels.anf as anf
-import apcmodels.decode as dc
 from apcmodels.util import save_to_csv
 import numpy as np
 import os, sys
 sys.path.append(os.getcwd())
 from util.functions import adjust_level
+from util.scratch import ScratchDirectory
+from util.sharding import Sweep, run_sharded
+from util.stimuli import StimulusPool
 
 
-def simulate_figure7_fdls(model, model_name, fs):
+def prepare_figure7_fdls(model_name, fs):
     """
-    Estimates frequency difference limens (FDLs) using ideal observer analysis for a given auditory nerve model. Saves
-    the results to disk.
+    Prepares the parameters used to estimate frequency difference limens (FDLs) using ideal observer analysis for a
+    given auditory nerve model.
 
     Args:
-        model: Model object from apcmodels.anf
         model_name (str): name of the model, either "Heinz2001", "Zilany2014", or "Verhulst2018"
         fs (int): sampling rate in Hz
+
+    Returns:
+        params (Parameters): flattened Parameters object without stimuli, which are synthesized just in time by the
+            workers (see Sweep in util/sharding.py)
     """
     # Define stimulus parameters
     freqs = 8 * 10**np.linspace(np.log10(280) - 0.2, np.log10(1400) + 0.1, 24)  # simulate 8th harmonic of F0s
@@ -50,27 +55,45 @@ def simulate_figure7_fdls(model, model_name, fs):
 
     # Encode increments
     params.increment({'freq': 0.001})  # increment frequency
+    return params
 
-    # Synthesize stimuli
-    synth = sy.PureTone()
-    stimuli = synth.synthesize_sequence(params)
-    params.add_inputs(stimuli)
 
-    # Construct simulation and run
-    sim = model()
-    results = sim.run(params, runfunc=dc.decode_ideal_observer(sim.simulate))
+def save_figure7_fdls(results, params, model_name):
+    """
+    Saves the results of the ideal observer analysis for a given auditory nerve model to disk.
 
-    # Compile results
+    Args:
+        results (list): output of dc.decode_ideal_observer for each element of params
+        params (Parameters): Parameters object returned by prepare_figure7_fdls
+        model_name (str): name of the model, either "Heinz2001", "Zilany2014", or "Verhulst2018"
+    """
     save_to_csv([res[0] for res in results], params,
-                'figure7/' + model_name + '_figure6_unroved_AI.csv', decoding_type='AI',
+                'figure7/' + model_name + '_figure7_unroved_AI.csv', decoding_type='AI',
                 model=model_name, roving_type='none')
     save_to_csv([res[1] for res in results], params,
-                'figure7/' + model_name + '_figure6_unroved_RP.csv', decoding_type='RP',
+                'figure7/' + model_name + '_figure7_unroved_RP.csv', decoding_type='RP',
                 model=model_name, roving_type='none')
 
 
-# Loop through models and calculate FDLs for each model
-for model, model_name, fs in zip([anf.AuditoryNerveHeinz2001, anf.AuditoryNerveZilany2014, anf.AuditoryNerveVerhulst2018],
-                                 ['Heinz2001', 'Zilany2014', 'Verhulst2018'],
-                                 [int(1250e3), int(200e3), int(300e3)]):
-    simulate_figure7_fdls(model, model_name, fs)
+if __name__ == '__main__':
+    # Prepare simulations for each model (or only for the models named on the command line, e.g.,
+    # `python3 figure7/figure7a.py Zilany2014`, to rerun a single model)
+    # Stimuli are drawn from a pool in which each stimulus is synthesized once per model, at the model's sampling rate
+    # and at 0 dB SPL, and then scaled to its level in the workers
+    pool = StimulusPool(sy.PureTone(), fs_synthesis=None)
+    sweeps = []
+    for model, model_name, fs in zip([anf.AuditoryNerveHeinz2001, anf.AuditoryNerveZilany2014,
+                                      anf.AuditoryNerveVerhulst2018],
+                                     ['Heinz2001', 'Zilany2014', 'Verhulst2018'],
+                                     [int(1250e3), int(200e3), int(300e3)]):
+        if len(sys.argv) > 1 and model_name not in sys.argv[1:]:
+            continue
+        sweeps.append(Sweep(model, model_name, prepare_figure7_fdls(model_name, fs), synthesizer=pool))
+
+    # Synthesize the stimuli, run the simulations for all models at once on a shared process pool, and save the results
+    # for each model
+    with ScratchDirectory() as scratch:
+        pool.fill([sweep.params for sweep in sweeps], scratch)
+        results = run_sharded(sweeps)
+    for sweep, results_sweep in zip(sweeps, results):
+        save_figure7_fdls(results_sweep, sweep.params, sweep.model_name)
@@ -7,13 +7,17 @@ import apcmodels.simulation as si
 import apcmodels.anf as anf
 import numpy as np
 from scipy.interpolate import interp1d
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import sys, os
 sys.path.append(os.getcwd())
 import util as cfg
+from util.pipeline import total_memory
+from util.sharding import MEMORY_PER_WORKER
 
 
 # Define function to estimate rate-level functions
-def estimate_rate_level_function(cf, levels, fs, model):
+def estimate_rate_level_function(cf, levels, fs, model, parallel=True):
     """
     Calculates the mean firing rate of an auditory nerve model simulation responding to a short pure tone at a range
     of levels at a given CF
@@ -23,6 +27,7 @@ def estimate_rate_level_function(cf, levels, fs, model):
         levels (list, ndarray): list or array of levels to test in dB SPL
         fs (int): sampling rate of the stimulus and model simulation in Hz
         model: model object from apcmodels.anf
+        parallel (bool): whether to simulate the levels in parallel
 
     Returns:
         results (list): list of mean firing rates in spikes per second at each level in levels
@@ -41,26 +46,128 @@ def estimate_rate_level_function(cf, levels, fs, model):
 
     # Run model
     sim = model()
-    results = sim.run(params)
+    results = sim.run(params, parallel=parallel)
     return [np.mean(result) for result in results]  # return mean of response at each level
 
 
-# Parameters
-fs = int(200e3)  # sampling rate in Hz
-cfs = 10**np.linspace(np.log10(200), np.log10(20000), 25)  # CFs for which we will measure rate-level functions
-levels = np.linspace(-10, 40, num=25)  # range of levels over which we will estimate rate-level functions
-
-# Save cfs to disk
-np.save('nofigure/absolute_thresholds/cfs.npy', cfs)
-
-# Loop through models
-for model, model_name in zip([anf.AuditoryNerveHeinz2001, anf.AuditoryNerveZilany2014, anf.AuditoryNerveVerhulst2018],
-                             ['Heinz2001', 'Zilany2014', 'Verhulst2018']):
-    # Compute rate-level function for each CF and then estimate the level at which 1.05 x spontaneous rate is achieved
-    absolute_thresholds = []
-    for cf in cfs:
-        rate_level_function = estimate_rate_level_function(cf, levels, fs, model)
-        absolute_thresholds.append(interp1d(rate_level_function, levels)(np.min([rate_level_function[0] * 1.05,
-                                                                                np.max(rate_level_function)])))
-    # Save absolute thresholds to disk
-    np.save('nofigure/absolute_thresholds/' + model_name + '.npy', absolute_thresholds)
+def estimate_absolute_threshold_grid(cf, levels, fs, model):
+    """
+    Estimates the level at which the firing rate of an auditory nerve model simulation reaches 1.05 times its
+    spontaneous rate by simulating a full rate-level function and interpolating it
+
+    Parameters:
+        cf (float): characteristic frequency to probe in Hz
+        levels (list, ndarray): list or array of levels to test in dB SPL, the first of which should be well below
+            threshold
+        fs (int): sampling rate of the stimulus and model simulation in Hz
+        model: model object from apcmodels.anf
+
+    Returns:
+        threshold (float): absolute threshold in dB SPL
+        n_eval (int): number of levels at which the model was simulated
+    """
+    rate_level_function = estimate_rate_level_function(cf, levels, fs, model, parallel=False)
+    threshold = interp1d(rate_level_function, levels)(np.min([rate_level_function[0] * 1.05,
+                                                             np.max(rate_level_function)]))
+    return float(threshold), len(levels)
+
+
+def estimate_absolute_threshold_adaptive(cf, levels, fs, model, tol=0.1):
+    """
+    Estimates the level at which the firing rate of an auditory nerve model simulation reaches 1.05 times its
+    spontaneous rate by searching for the criterion crossing, which only simulates the model at levels near threshold.
+
+    Below saturation, the driven rate (i.e., rate minus spontaneous rate) grows roughly exponentially with level, so
+    the search looks for the zero of log(driven rate / criterion driven rate) using the Illinois variant of the false
+    position method. Until a level with a positive driven rate below the criterion has been found, the bracket is
+    bisected instead.
+
+    Parameters:
+        cf (float): characteristic frequency to probe in Hz
+        levels (list, ndarray): list or array of levels, the lowest of which should be well below threshold (and is used
+            to estimate spontaneous rate) and the highest of which bounds the search
+        fs (int): sampling rate of the stimulus and model simulation in Hz
+        model: model object from apcmodels.anf
+        tol (float): the search stops once successive level estimates (or the bracket) differ by less than tol dB
+
+    Returns:
+        threshold (float): absolute threshold in dB SPL
+        n_eval (int): number of levels at which the model was simulated
+    """
+    rate = lambda level: estimate_rate_level_function(cf, [level], fs, model, parallel=False)[0]
+    # Estimate spontaneous rate and the rate at the top of the search range
+    level_low, level_high = np.min(levels), np.max(levels)
+    rate_spont, rate_high = rate(level_low), rate(level_high)
+    n_eval = 2
+    criterion = rate_spont * 0.05  # criterion driven rate
+    if rate_high - rate_spont <= criterion:
+        return float(level_high), n_eval
+
+    def error(rate_level):
+        # Log ratio of driven rate to criterion driven rate, which is -inf if there is no driven rate
+        if rate_level <= rate_spont:
+            return -np.inf
+        return np.log((rate_level - rate_spont) / criterion)
+
+    # Search for the level where the error changes sign
+    error_low, error_high = -np.inf, error(rate_high)
+    level_prev = np.inf
+    side = 0
+    while True:
+        if np.isinf(error_low):
+            level = (level_low + level_high) / 2
+        else:
+            level = level_high - error_high * (level_high - level_low) / (error_high - error_low)
+        if np.abs(level - level_prev) < tol or level_high - level_low < tol:
+            return float(level), n_eval
+        error_level = error(rate(level))
+        n_eval += 1
+        if error_level == 0:
+            return float(level), n_eval
+        if error_level > 0:
+            level_high, error_high = level, error_level
+            if side == 1:
+                error_low = error_low / 2  # Illinois modification, keeps one end of the bracket from getting stuck
+            side = 1
+        else:
+            level_low, error_low = level, error_level
+            if side == -1:
+                error_high = error_high / 2
+            side = -1
+        level_prev = level
+
+
+if __name__ == '__main__':
+    # Parameters
+    fs = int(200e3)  # sampling rate in Hz
+    cfs = 10**np.linspace(np.log10(200), np.log10(20000), 25)  # CFs for which we will measure rate-level functions
+    levels = np.linspace(-10, 40, num=25)  # range of levels over which we will estimate rate-level functions
+
+    # Save cfs to disk
+    np.save('nofigure/absolute_thresholds/cfs.npy', cfs)
+
+    # Select search method from command line, i.e., either
+    # `python3 nofigure/absolute_thresholds/absolute_thresholds.py grid` (the default) to simulate full rate-level
+    # functions, or `python3 nofigure/absolute_thresholds/absolute_thresholds.py adaptive 0.05` to search for each
+    # threshold adaptively (with an optional tolerance in dB)
+    method = sys.argv[1] if len(sys.argv) > 1 else 'grid'
+    tol = float(sys.argv[2]) if len(sys.argv) > 2 else 0.1
+    estimate_absolute_threshold = {'adaptive': partial(estimate_absolute_threshold_adaptive, tol=tol),
+                                   'grid': estimate_absolute_threshold_grid}[method]
+
+    # Loop through models
+    for model, model_name in zip([anf.AuditoryNerveHeinz2001, anf.AuditoryNerveZilany2014,
+                                  anf.AuditoryNerveVerhulst2018],
+                                 ['Heinz2001', 'Zilany2014', 'Verhulst2018']):
+        # Estimate the level at which 1.05 x spontaneous rate is achieved for each CF, running CFs concurrently on as
+        # many workers as fit in memory (see MEMORY_PER_WORKER in util/sharding.py)
+        n_workers = os.cpu_count() or 1
+        if total_memory() is not None:
+            n_workers = max(1, min(n_workers, total_memory() // MEMORY_PER_WORKER[model_name]))
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            outputs = list(executor.map(estimate_absolute_threshold, cfs, [levels]*len(cfs), [fs]*len(cfs),
+                                        [model]*len(cfs)))
+        absolute_thresholds = [threshold for threshold, _ in outputs]
+        print(model_name + ': ' + str(sum([n_eval for _, n_eval in outputs])) + ' model evaluations')
+        # Save absolute thresholds to disk
+        np.save('nofigure/absolute_thresholds/' + model_name + '.npy', absolute_thresholds)
@@ -0,0 +1,64 @@
+"""
+This script checks that the pure-tone frequency difference limens (FDLs) in figure7/*_figure7_unroved_AI.csv and
+figure7/*_figure7_unroved_RP.csv are reproduced to within a set relative error when stimuli, model responses, and
+decoders use single precision (see util/precision.py). Both decoders are checked, since the rate-place (RP) decoder only
+sees small differences between average rates, which may be more sensitive to rounding than the all-information (AI)
+decoder. Both thresholds are computed from the same responses, so if either fails, figure7a.py and figure8a.py must be
+run in double precision (the default). Each condition is rebuilt from the parameters stored in the CSVs rather than from
+figure7a.py, so the check compares like with like even if the level adjustments used by figure7a.py change. Run it from
+the root of the repository, optionally followed by the names of the models to check, e.g.,
+`python3 nofigure/precision_checks/check_float32_thresholds.py Heinz2001`.
+"""
+import apcmodels.synthesis as sy
+import apcmodels.anf as anf
+import numpy as np
+import pandas as pd
+import os, sys
+sys.path.append(os.getcwd())
+from util.precision import set_precision
+from util.results import parse_column
+from util.sharding import Sweep, run_sharded
+
+# Switch to single precision before any worker processes are started, so that they inherit the setting
+set_precision('float32')
+
+# Define check parameters
+rtol = 0.01  # maximum relative error of each threshold re: the double-precision threshold
+n_condition = 12  # number of conditions checked per model, spread evenly over the rows of each CSV
+
+if __name__ == '__main__':
+    # Load the double-precision thresholds for each model and rebuild the baseline and incremented parameters
+    models = [anf.AuditoryNerveHeinz2001, anf.AuditoryNerveZilany2014, anf.AuditoryNerveVerhulst2018]
+    model_names = ['Heinz2001', 'Zilany2014', 'Verhulst2018']
+    sweeps = []
+    references = []
+    for model, model_name in zip(models, model_names):
+        if len(sys.argv) > 1 and model_name not in sys.argv[1:]:
+            continue
+        frames = [pd.read_csv(os.path.join('figure7', model_name + '_figure7_unroved_' + decoding_type + '.csv'),
+                              index_col=0) for decoding_type in ['AI', 'RP']]
+        rows = np.unique(np.linspace(0, len(frames[0]) - 1, n_condition).astype(int))
+        frame = frames[0].iloc[rows]
+        elements = []
+        for _, row in frame.iterrows():
+            delta_theta = float(parse_column(np.array([row['delta_theta']], dtype=object))[0])
+            baseline = dict(freq=row['freq'], level=row['level'], cf_low=row['cf_low'], cf_high=row['cf_high'],
+                            fs=int(row['fs']), n_cf=int(row['n_cf']), n_fiber_per_chan=int(row['n_fiber_per_chan']),
+                            dur=row['dur'], dur_ramp=row['dur_ramp'], API=np.zeros(1), delta_theta=[delta_theta],
+                            model_name=model_name)
+            elements.append([baseline, dict(baseline, freq=row['freq'] + delta_theta)])
+        sweeps.append(Sweep(model, model_name, elements, synthesizer=sy.PureTone()))
+        references.append([ele.iloc[rows]['result'].to_numpy() for ele in frames])
+
+    # Run the single-precision simulations for all models at once and compare them to the double-precision thresholds
+    results = run_sharded(sweeps)
+    failed = []
+    for sweep, result, reference in zip(sweeps, results, references):
+        for idx, decoding_type in enumerate(['AI', 'RP']):
+            error = np.abs(np.array([res[idx] for res in result]) - reference[idx])/reference[idx]
+            print(sweep.model_name + ' ' + decoding_type + ': maximum relative error = ' + str(np.max(error)))
+            if np.max(error) > rtol:
+                failed.append(sweep.model_name + ' ' + decoding_type)
+    if len(failed) > 0:
+        raise AssertionError('Single-precision thresholds deviate from double-precision thresholds for ' +
+                             ', '.join(failed))
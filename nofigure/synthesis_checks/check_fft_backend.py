@@ -0,0 +1,31 @@
+"""
+This script checks that the FFT (chirp z-transform) synthesis backend in util/functions.py produces the same waveforms
+as the default time-domain backend at the nominal F0s used in the figures, for both a short stimulus at a low sampling
+rate and a long stimulus at the highest sampling rate used by the models.
+"""
+import numpy as np
+import os, sys
+sys.path.append(os.getcwd())
+from util.functions import ISOToneGuest2021, GEOMToneGuest2021, ISOToneGuest2021_exp1b
+
+# Define stimulus parameters
+dur_ramp = 0.01  # seconds
+tolerance = 1e-6  # maximum error re: peak amplitude of the time-domain waveform
+conditions = [(0.10, int(200e3)), (0.35, int(1250e3))]  # pairs of duration (seconds) and sampling rate (Hz)
+F0s = np.array([280, 500, 1400, 1000*2**(3/12)])  # Hz, nominal F0s (not adjusted to any frequency grid)
+
+# Loop through synthesizers and compare the two backends
+for dur, fs in conditions:
+    for synth, kwargs in zip([ISOToneGuest2021, GEOMToneGuest2021, ISOToneGuest2021_exp1b],
+                             [{'level': 40}, {'level': 40, 'level_masker': 40}, {'level': 40}]):
+        for F0 in F0s:
+            params = dict(F0=F0, dur=dur, dur_ramp=dur_ramp, fs=fs, F0_masker=F0*2**(0.5/12), **kwargs)
+            reference = synth(backend='time').synthesize(**params)
+            # Check single-stimulus path and batched path
+            for output in [synth(backend='fft').synthesize(**params),
+                           synth(backend='fft').synthesize_sequence([params])[0]]:
+                error = np.max(np.abs(output - reference))/np.max(np.abs(reference))
+                print(synth.__name__ + ' F0=' + str(np.round(F0, 3)) + ' Hz, dur=' + str(dur) + ' s, fs=' + str(fs) +
+                      ' Hz: relative error = ' + str(error))
+                if error > tolerance:
+                    raise AssertionError('FFT backend deviates from time-domain backend')
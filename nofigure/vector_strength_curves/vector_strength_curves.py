@@ -12,7 +12,7 @@ from util.functions import adjust_level
 
 
 # Define function to estimate vector strength
-def estimate_vector_strength(freqs, fs, model, model_name, n_rep, n_stim_rep, dur=2):
+def estimate_vector_strength(freqs, fs, model, model_name, n_rep, n_stim_rep, dur=2, method='poisson', seed=0):
     """
     Calculates the firing rate of an auditory nerve for a pure tone at a range of freqs (with the CF matched to the
     freq) and then estimates vector strength for those responses. Spike trains are generated from the firing rates
@@ -27,35 +27,40 @@ def estimate_vector_strength(freqs, fs, model, model_name, n_rep, n_stim_rep, du
         n_stim_rep (int): number of firing rate waveforms to stitch together... allows us to cheat out a "long" stimulus
             without actually simulating the full response
         dur (float): duration of the sinusoidal input stimulus, in seconds
+        method (str): either 'poisson' to estimate vector strength from simulated spike trains or 'analytic' to
+            calculate the vector strength of the firing rate waveform itself (i.e., the limit for infinitely many
+            spikes), in which case the standard error is zero
+        seed (int): seed for the random number generator used to simulate spike trains
 
     Returns:
-        output (ndarray): array of mean firing rates of shape (n_freq, n_level)
+        output (list): list of tuples containing the mean and standard error of the vector strength for each freq
     """
     # Write simple wrapper around runfunc to compute Poisson spike trains, calculate vector strength, and average
     def vector_strength_wrapper(runfunc):
         def inner(params):
             # Calculate firing rate
-            rates = runfunc(params)  # output is expected to be (1, n_sample)
+            rates = np.squeeze(runfunc(params))  # output is expected to be (1, n_sample)
 
-            # Calculate n_stim_rep spike trains and concatenate them (as if we had presented the stimulus n_stim_rep
-            # times and then calculated peri-stimulus spike times for each), then do this n_rep times and store in a
-            # list
-            spike_times = [np.concatenate([calculate_spike_times(simulate_poisson_spike_train(rates.T, fs), fs) for rep in range(n_stim_rep)]) for rep in range(n_rep)]
+            # Calculate phase of the stimulus frequency at each sample
+            phasors = np.exp(1j * 2*np.pi*params['freq'] * np.arange(len(rates)) * (1 / fs))
+
+            if method == 'analytic':
+                return calculate_vector_strength(rates, phasors), 0.0
+
+            # Concatenating the peri-stimulus spike times of n_stim_rep Bernoulli spike trains is equivalent to
+            # drawing, for each sample, a binomial number of spikes out of n_stim_rep, so we draw all n_rep spike
+            # count waveforms at once from a generator seeded by the condition
+            rng = np.random.default_rng([seed, int(round(params['freq']*1000))])
+            counts = rng.binomial(n_stim_rep, np.clip(rates * (1 / fs), 0, 1), size=(n_rep, len(rates)))
 
             # Calculate vector strength for each spike train
-            vector_strengths = list(map(lambda x: calculate_vector_strength(x, params['freq']), spike_times))
+            vector_strengths = calculate_vector_strength(counts, phasors)
 
             # Return mean and standard error
             return np.mean(vector_strengths), np.std(vector_strengths)/np.sqrt(len(vector_strengths))
 
-        def simulate_poisson_spike_train(fr, fs):
-            return np.random.rand(len(fr), 1) < fr * (1 / fs)
-
-        def calculate_spike_times(spike_train, fs):
-            return np.where(spike_train)[0] * (1 / fs)
-
-        def calculate_vector_strength(spike_train, freq):
-            return np.abs(1/len(spike_train) * np.sum(np.exp(1j * 2*np.pi*freq * spike_train)))
+        def calculate_vector_strength(counts, phasors):
+            return np.abs(counts @ phasors) / np.sum(counts, axis=-1)
 
         return inner
 
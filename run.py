@@ -0,0 +1,164 @@
+"""
+Replicates every figure in Guest and Oxenham (2021), including reproducing underlying simulations, but only reruns the
+steps whose outputs are missing or out of date. Independent steps are run in parallel.
+
+Usage:
+    python3 run.py                      # bring every figure up to date
+    python3 run.py figure7a_plot        # bring only Figure 7A (and the simulations it needs) up to date
+    python3 run.py --dry-run            # list the steps that would be run
+    python3 run.py --force figure4      # rerun Figure 4 even if it is up to date
+    python3 run.py -j 4                 # run at most 4 steps at once
+"""
+import argparse
+import os, sys
+sys.path.append(os.getcwd())
+from util.pipeline import Task, run_pipeline, share_resources
+
+# Shared modules imported by the simulation scripts (util/functions.py and the util modules it imports)
+models = ['Heinz2001', 'Zilany2014', 'Verhulst2018']
+synthesis = ['util/functions.py', 'util/cache.py', 'util/precision.py']
+# Files that (directly or via adjust_level) affect the stimuli of every simulation
+common = synthesis + ['nofigure/absolute_thresholds/' + model + '.npy' for model in models]
+
+
+def python(script, *args):
+    return ['python3', script] + list(args)
+
+
+def rscript(script):
+    return ['Rscript', script]
+
+
+tasks = [
+    # Behavioral data
+    Task('data', ['bash', '-c', 'mkdir -p data && '
+                                'wget https://zenodo.org/record/4750384/files/data_archive.zip?download=1 '
+                                '-O data/data_archive.zip && unzip data/data_archive.zip && cp data_archive/* data && '
+                                'rm -r data_archive && rm data/data_archive.zip'],
+         outputs=['data/*']),
+    # Absolute thresholds
+    Task('absolute_thresholds', python('nofigure/absolute_thresholds/absolute_thresholds.py'),
+         inputs=['nofigure/absolute_thresholds/absolute_thresholds.py'],
+         outputs=['nofigure/absolute_thresholds/cfs.npy'] +
+                 ['nofigure/absolute_thresholds/' + model + '.npy' for model in models]),
+    # Tuning curves
+    Task('freq_level_functions', python('nofigure/tuning_curves/estimate_freq_level_functions.py'),
+         inputs=['nofigure/tuning_curves/estimate_freq_level_functions.py'],
+         outputs=['nofigure/tuning_curves/' + name + '.npy'
+                  for name in ['cfs', 'freqs', 'levels', 'Heinz2001', 'Zilany2014']]),
+    Task('tuning_curves', python('nofigure/tuning_curves/extract_tuning_curves.py'),
+         inputs=['nofigure/tuning_curves/extract_tuning_curves.py'] +
+                ['nofigure/tuning_curves/' + name + '.npy' for name in ['cfs', 'freqs', 'levels', 'Heinz2001',
+                                                                        'Zilany2014']],
+         outputs=['nofigure/tuning_curves/Heinz2001_tuning_curves.npy',
+                  'nofigure/tuning_curves/Zilany2014_tuning_curves.npy']),
+    Task('q10', python('nofigure/tuning_curves/estimate_q10.py'),
+         inputs=['nofigure/tuning_curves/estimate_q10.py', 'nofigure/tuning_curves/Heinz2001_tuning_curves.npy',
+                 'nofigure/tuning_curves/Zilany2014_tuning_curves.npy'],
+         outputs=['nofigure/tuning_curves/Heinz2001_q10s.npy', 'nofigure/tuning_curves/Zilany2014_q10s.npy']),
+    Task('q10_bm_clicks', python('nofigure/tuning_curves/estimate_q10_bm_clicks.py'),
+         inputs=['nofigure/tuning_curves/estimate_q10_bm_clicks.py', 'nofigure/tuning_curves/cfs.npy'],
+         outputs=['nofigure/tuning_curves/Verhulst2018_q10s.npy']),
+    # Vector strength
+    Task('vector_strength', python('nofigure/vector_strength_curves/vector_strength_curves.py'),
+         inputs=['nofigure/vector_strength_curves/vector_strength_curves.py'] + common,
+         outputs=['nofigure/vector_strength_curves/freqs.npy'] +
+                 ['nofigure/vector_strength_curves/' + model + suffix + '.npy'
+                  for model in models for suffix in ['', '_means']]),
+    # Figures 1-6
+    Task('figure1', python('figure1/figure1.py'),
+         inputs=['figure1/figure1.py', 'util/neurograms.py', 'util/plotting.py', 'util/cache.py',
+                 'util/precision.py'],
+         outputs=['plots/fig1a.png', 'plots/fig1b.png']),
+    Task('figure2', rscript('figure2/figure2.R'),
+         inputs=['figure2/figure2.R', 'config.R', 'data/*'],
+         outputs=['plots/fig2.png']),
+    Task('figure3', rscript('figure3/figure3.R'),
+         inputs=['figure3/figure3.R', 'config.R', 'data/*'],
+         outputs=['plots/fig3.png']),
+    Task('figure4', python('figure4/figure4.py'),
+         inputs=['figure4/figure4.py', 'util/summaries.py'] + synthesis,
+         outputs=['plots/fig4_raw.png']),
+    Task('figure5', python('figure5_and_6/figure5.py'),
+         inputs=['figure5_and_6/figure5.py'] + common,
+         outputs=['figure5_and_6/autocorr_tmr_*.npy', 'figure5_and_6/neural_harm_nums_tmr_*.npy',
+                  'figure5_and_6/lags_tmr_*.npy', 'plots/fig5a1.png', 'plots/fig5b1.png', 'plots/fig5zoom*.png']),
+    Task('figure6', python('figure5_and_6/figure6.py'),
+         inputs=['figure5_and_6/figure6.py', 'util/summaries.py'] + synthesis,
+         outputs=['figure5_and_6/excitation_patterns_*.npy', 'plots/fig5c1.png', 'plots/fig5d1.png']),
+] + [
+    # Figures 7 and 8 simulations (one task per figure, which runs every model on a single process pool so that the
+    # models share stimuli). Each task starts its own process pool, so the CPUs and memory of the machine are split
+    # between them (see util/sharding.py)
+    Task(figure + 'a', python(figure + '/' + figure + 'a.py'),
+         inputs=[figure + '/' + figure + 'a.py', 'util/sharding.py', 'util/pipeline.py', 'util/scratch.py',
+                 'util/stimuli.py'] + common,
+         outputs=[figure + '/' + model + '_' + figure + '_unroved_' + decoding_type + '.csv'
+                  for model in models for decoding_type in ['AI', 'RP']],
+         env=share_resources(2))
+    for figure in ['figure7', 'figure8']
+] + [
+    # Figures 7 and 8 plots
+    Task('figure7a_plot', rscript('figure7/figure7a.R'),
+         inputs=['figure7/figure7a.R', 'config.R', 'figure7/*.csv'],
+         outputs=['plots/fig6a.png']),
+    Task('figure7c', rscript('figure7/figure7c.R'),
+         inputs=['figure7/figure7c.R', 'config.R', 'figure7/*.csv'],
+         outputs=['plots/fig6c.png']),
+    Task('figure7d', rscript('figure7/figure7d.R'),
+         inputs=['figure7/figure7d.R', 'config.R', 'figure7/*.csv', 'nofigure/vector_strength_curves/*.npy',
+                 'nofigure/tuning_curves/cfs.npy', 'nofigure/tuning_curves/*_q10s.npy'],
+         outputs=['plots/fig7d_vector_strength_new.png', 'plots/fig7d_tuning_new.png',
+                  'plots/fig7d_correlations.png']),
+    Task('figure8a_plot', rscript('figure8/figure8a.R'),
+         inputs=['figure8/figure8a.R', 'config.R', 'figure8/*.csv'],
+         outputs=['plots/fig8a.png']),
+    Task('figure8c', rscript('figure8/figure8c.R'),
+         inputs=['figure8/figure8c.R', 'config.R', 'figure8/*.csv'],
+         outputs=['plots/fig8c.png']),
+    Task('figure8d', rscript('figure8/figure8d.R'),
+         inputs=['figure8/figure8d.R', 'config.R', 'figure8/*.csv', 'nofigure/vector_strength_curves/*.npy',
+                 'nofigure/tuning_curves/cfs.npy', 'nofigure/tuning_curves/*_q10s.npy'],
+         outputs=['plots/fig8d_vector_strength_new.png', 'plots/fig8d_tuning_new.png']),
+    # S1 Text, Fig A
+    Task('supfigure1a', python('supfigure1/supfigure1a.py'),
+         inputs=['supfigure1/supfigure1a.py', 'nofigure/vector_strength_curves/*.npy'],
+         outputs=['plots/supfig1a.png']),
+    Task('supfigure1b', python('supfigure1/supfigure1b.py'),
+         inputs=['supfigure1/supfigure1b.py', 'nofigure/tuning_curves/*_tuning_curves.npy',
+                 'nofigure/tuning_curves/cfs.npy'],
+         outputs=['plots/supfig1b.png']),
+    Task('supfigure1c', python('supfigure1/supfigure1c.py'),
+         inputs=['supfigure1/supfigure1c.py'] + synthesis,
+         outputs=['plots/supfig1c.png']),
+    Task('supfigure1d_isis', python('supfigure1/supfigure1d/generate_ISIs.py'),
+         inputs=['supfigure1/supfigure1d/generate_ISIs.py', 'util/intervals.py'] + synthesis,
+         outputs=['supfigure1/supfigure1d/isi_*.npy']),
+    Task('supfigure1d', python('supfigure1/supfigure1d/supfigure7d.py'),
+         inputs=['supfigure1/supfigure1d/supfigure7d.py', 'supfigure1/supfigure1d/isi_*.npy'],
+         outputs=['plots/supfig1d.png']),
+    Task('supfigure1e_isi_histograms', python('supfigure1/supfigure1e/generate_ISI_histograms.py'),
+         inputs=['supfigure1/supfigure1e/generate_ISI_histograms.py', 'util/intervals.py'] + synthesis,
+         outputs=['supfigure1/supfigure1e/isi_histograms.npy', 'supfigure1/supfigure1e/neural_harm_nums.npy']),
+    Task('supfigure1e', python('supfigure1/supfigure1e/supfigure7e.py'),
+         inputs=['supfigure1/supfigure1e/supfigure7e.py', 'supfigure1/supfigure1e/isi_histograms.npy',
+                 'supfigure1/supfigure1e/neural_harm_nums.npy'],
+         outputs=['plots/supfig1e.png']),
+]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Regenerate out-of-date simulations and figures.')
+    parser.add_argument('targets', nargs='*', help='names of tasks to bring up to date (default: all tasks)')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='maximum number of tasks to run at once')
+    parser.add_argument('--force', action='store_true', help='rerun selected tasks even if they are up to date')
+    parser.add_argument('--dry-run', action='store_true', help='list the tasks that would be run and exit')
+    parser.add_argument('--list', action='store_true', help='list all tasks and exit')
+    args = parser.parse_args()
+    if args.list:
+        for task in tasks:
+            print(task.name + ': ' + ' '.join(task.command))
+        sys.exit(0)
+    failed = run_pipeline(tasks, targets=args.targets or None, n_jobs=args.jobs, force=args.force,
+                          dry_run=args.dry_run)
+    sys.exit(1 if len(failed) > 0 else 0)
@@ -1,19 +1,22 @@
 import apcmodels.simulation as si
 import apcmodels.anf as anf
 import numpy as np
-import itertools
 import os, sys
 sys.path.append(os.getcwd())
 from util.functions import ComplexToneCedolin2005
+from util.intervals import all_order_isi_histogram
 
 
 def calculate_ISIs_Cedolin_2005(F0):
     """
-    Synthesizes a complex tone and simulates interspike intervals for an auditory nerve fiber for it. A list of ISIs
-    is then saved out to disk.
+    Synthesizes a complex tone and simulates interspike intervals for an auditory nerve fiber for it. An all-order
+    ISI histogram, pooled over every channel and repeat, is returned.
 
     Parameters:
         F0 (float): F0 of the complex tone
+
+    Returns:
+        histogram (np.ndarray): interval counts in 2200 bins from 0 to 0.22 s
     """
     # Setup params
     params = si.Parameters(fs=int(200e3), fiber_type='hsr', n_cf=60, cf_low=450, cf_high=9200, F0=F0, species='cat')
@@ -28,20 +31,17 @@ def calculate_ISIs_Cedolin_2005(F0):
     sim = anf.AuditoryNerveZilany2014Spikes()
     results = sim.run(params, runfunc=sim.simulate)
 
-    # Extract spike times from results
-    ISIs = []
+    # Extract spike times from results and accumulate ISI histogram
+    histogram = np.zeros(2200, dtype=np.int64)
     for result in results:
         for idx, channel in result.iterrows():
-            spike_times = channel.loc['spikes']
-            ISIs.append([np.abs(spike_times[idx[1]] - spike_times[idx[0]]) for idx in
-                         itertools.combinations(list(range(len(spike_times))), r=2)])
-    ISIs = list(itertools.chain(*ISIs))
+            all_order_isi_histogram([channel.loc['spikes']], bins=2200, range=(0, 0.22), counts=histogram)
 
     # Return
-    return ISIs
+    return histogram
 
 
-# Loop through F0s we want to test, generate ISIs, and save to disk
+# Loop through F0s we want to test, generate ISI histograms, and save to disk
 for F0 in [320, 880]:
-    ISIs = calculate_ISIs_Cedolin_2005(F0)
-    np.save('supfigure1/supfigure1d/isi_' + str(F0) + '.npy', ISIs)
\ No newline at end of file
+    histogram = calculate_ISIs_Cedolin_2005(F0)
+    np.save('supfigure1/supfigure1d/isi_histogram_' + str(F0) + '.npy', histogram)
\ No newline at end of file
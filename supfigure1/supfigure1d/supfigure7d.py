@@ -5,20 +5,20 @@ sys.path.append(os.getcwd())
 import util as cfg
 
 
-def plot_isi_histogram(ax, ISIs, F0, first):
+def plot_isi_histogram(ax, hist_low, F0, first):
     """
-    Plots an interspike-interval histograms from a list of interspike intervals recorded in a simulation.
+    Plots an interspike-interval histogram computed from interspike intervals recorded in a simulation.
 
     Arguments:
         ax (axis): axis object on which this figure should be plotted
-        ISIs (np.ndarray): array of interspike intervals, of shape (n_interval, )
+        hist_low (np.ndarray): array of interval counts in 2200 bins from 0 to 0.22 s, of shape (2200, )
         F0 (float): F0 at which the interspike intervals were simulated, used to plot vertical lines indicating
             intervals of the F0
         first (bool): bool indicating whether or not this is the first plot in a column of plots, if True then we
             don't label the x-axis
     """
-    # Calculate histogram
-    hist_low, edges_low = np.histogram(ISIs, bins=2200, range=(0, 0.22))
+    # Calculate histogram edges
+    edges_low = np.linspace(0, 0.22, 2201)
     # Plot dashed lines at F0 intervals
     for ii in range(1, 50):
         ax.plot([ii * 1 / F0 * 1000, ii * 1 / F0 * 1000], [0, 14000], color='gray', linestyle='dashed',
@@ -36,10 +36,10 @@ def plot_isi_histogram(ax, ISIs, F0, first):
 
 # Create figure and saxes
 fig, ax = plt.subplots(nrows=2, ncols=1, figsize=(4, 4))
-ISIs = np.load('supfigure1/supfigure1d/isi_' + str(320) + '.npy')
-plot_isi_histogram(ax[0], ISIs, 320, True)
-ISIs = np.load('supfigure1/supfigure1d/isi_' + str(880) + '.npy')
-plot_isi_histogram(ax[1], ISIs, 880, False)
+histogram = np.load('supfigure1/supfigure1d/isi_histogram_' + str(320) + '.npy')
+plot_isi_histogram(ax[0], histogram, 320, True)
+histogram = np.load('supfigure1/supfigure1d/isi_histogram_' + str(880) + '.npy')
+plot_isi_histogram(ax[1], histogram, 880, False)
 plt.tight_layout()
 # Save plot
 plt.savefig('plots/supfig1d.png')
\ No newline at end of file
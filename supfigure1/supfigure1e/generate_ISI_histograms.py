@@ -1,10 +1,10 @@
 import apcmodels.simulation as si
 import apcmodels.anf as anf
 import numpy as np
-import itertools
 import os, sys
 sys.path.append(os.getcwd())
 from util.functions import ComplexToneLarsen2008
+from util.intervals import all_order_isi_histogram
 
 
 def calculate_ISI_histograms_Larsen_2008(cf, neural_harm_nums):
@@ -37,20 +37,10 @@ def calculate_ISI_histograms_Larsen_2008(cf, neural_harm_nums):
     # Extract spike times from results
     histograms = []  # top-level list that will store the histogram for all neural harm numbers
     for idx_result, result in enumerate(results):
-        isis_this_channel = []  # list will store the isis for this neural harm number
-        for repeat in result:
-            # Extract spikes from data frame
-            spike_times = repeat.loc[0]['spikes']
-            # Calculate ISIs
-            isi = [np.abs(spike_times[idx[1]] - spike_times[idx[0]]) for idx in
-                         itertools.combinations(list(range(len(spike_times))), r=2)]
-            isis_this_channel.append(isi)
-        # Combine ISIs into one list/array
-        ISIs = list(itertools.chain(*isis_this_channel))
-        # Transform ISIs from seconds into units of F0 period
-        ISIs_period = np.array(ISIs) / (1 / (cf / neural_harm_nums[idx_result]))
-        # Calculate histogram and append to results
-        hist_low, edges_low = np.histogram(ISIs_period, bins=2200, range=(0, 20))
+        # Calculate histogram of ISIs in units of F0 period, pooled over repeats, and append to results
+        spike_trains = [repeat.loc[0]['spikes'] for repeat in result]
+        hist_low, edges_low = all_order_isi_histogram(spike_trains, bins=2200, range=(0, 20),
+                                                      unit=1 / (cf / neural_harm_nums[idx_result]))
         histograms.append(hist_low)
 
     # Return
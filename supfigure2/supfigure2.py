@@ -8,7 +8,7 @@ from apcmodels.util import save_to_csv
 import numpy as np
 import os, sys
 sys.path.append(os.getcwd())
-from util.functions import adjust_level
+from util.functions import adjust_level, common_random_draws, latin_hypercube_uniform
 
 
 class ISOToneGuest2021_exp1a_variable_harms(sy.Synthesizer):
@@ -163,7 +163,6 @@ def simulate_supfigure2_f0dls_phase_roving(model, model_name, fs, n_rep=10):
     # Encode parameters
     params = si.Parameters(dur=dur, dur_ramp=dur_ramp, fs=fs, n_cf=n_cf, delta_theta=delta_theta, API=API,
                            n_fiber_per_chan=n_fiber_per_chan, model_name=model_name)
-    params.append('phase', lambda: np.random.uniform(0, 360, 5))  # append random phase
     params.wiggle('F0', F0s)                                   # wiggle F0s
     params.wiggle('h_low', h_lows)
     params.stitch('cf_low', cf_low)                            # stitch cf_low (each F0 * h_low combo corresponds to a cf_low)
@@ -176,8 +175,10 @@ def simulate_supfigure2_f0dls_phase_roving(model, model_name, fs, n_rep=10):
         ele['nominal_level'] = ele['level']                                 # encode nominal level (dB re: threshold)
         ele['level'] = adjust_level(ele['F0']*8, ele['level'], model_name)  # encode actual level (dB SPL)
 
-    # Encode repeats and increments
+    # Encode repeats, random phases, and increments (each repeat draws one phase per component, stratified across
+    # repeats and shared by every condition and by the baseline and incremented stimuli of each trial)
     params.repeat(n_rep)
+    common_random_draws(params, 'phase', latin_hypercube_uniform(0, 360, 5))
     params.increment({'F0': 0.001,                                  # increment F0
                       '(1)_phase': np.array([0.001, 0, 0, 0, 0]),   # increment phase of H6
                       '(2)_phase': np.array([0, 0.001, 0, 0, 0]),   # increment phase of H7
@@ -7,6 +7,8 @@ import numpy as np
 import os, sys
 sys.path.append(os.getcwd())
 from util.functions import ISOToneGuest2021_exp1a, adjust_level
+from util.cache import CachedSimulation
+from util.summaries import ChannelSummary
 import util as cfg
 import matplotlib.pyplot as plt
 
@@ -42,7 +44,7 @@ def simulate_complex_tone_response(F0, F0_base, level, model=anf.AuditoryNerveZi
 
     # Construct simulation and run
     sim = model()
-    results = sim.run(params)
+    results = sim.run(params, runfunc=CachedSimulation(ChannelSummary(sim.simulate)))
 
     return cfs, results[0]
 
@@ -78,7 +80,7 @@ def simulate_pure_tone_response(freq, freq_base, level, model=anf.AuditoryNerveZ
 
     # Construct simulation and run
     sim = model()
-    results = sim.run(params)
+    results = sim.run(params, runfunc=CachedSimulation(ChannelSummary(sim.simulate)))
     return cfs, results[0]
 
 # FDLs
@@ -88,7 +90,7 @@ fig, axs = plt.subplots(1, 3, figsize=(8, 2.5), sharey=True)
 for idx, idx_freq in zip([0, 1, 2], [0, 10, 20]):
     for level in levels:
         cfs, x = simulate_pure_tone_response(freqs[idx_freq], freqs[idx_freq], level, n_cf=100, fs=100e3, fs_synapse=20e3)
-        axs[idx].plot(cfs/freqs[idx_freq], np.mean(x, axis=1))
+        axs[idx].plot(cfs/freqs[idx_freq], x['mean'])
         axs[idx].set_title('Freq = ' + str(round(freqs[idx_freq])) + ' Hz')
     axs[idx].set_xlabel('CF (Hz)')
     axs[idx].plot([0.5, 0.5], [0, 300], color='gray', linestyle='dashed')
@@ -104,7 +106,7 @@ fig, axs = plt.subplots(1, 3, figsize=(8, 2.5), sharey=True)
 for idx, idx_F0 in zip([0, 1, 2], [0, 10, 20]):
     for level in levels:
         cfs, x = simulate_complex_tone_response(F0s[idx_F0], F0s[idx_F0], level, n_cf=100, fs=100e3, fs_synapse=20e3)
-        axs[idx].plot(cfs/F0s[idx_F0], np.mean(x, axis=1))
+        axs[idx].plot(cfs/F0s[idx_F0], x['mean'])
         axs[idx].set_title('F0 = ' + str(round(F0s[idx_F0])) + ' Hz')
     axs[idx].set_xlabel('CF (Hz)')
     axs[idx].plot([5, 5], [0, 300], color='gray', linestyle='dashed')
@@ -0,0 +1,20 @@
+"""
+This script collates the results of supfigure_maskers_estimate_thresholds.py and
+supfigure_maskers_estimate_thresholds_function_of_interval.py, which are stored in columnar result stores (see
+util/results.py), into a single CSV per sweep for the R plotting scripts. If a store does not exist yet, it is first
+populated from the per-condition CSV files written by earlier versions of those scripts.
+"""
+import glob
+import os, sys
+sys.path.append(os.getcwd())
+from util.results import ResultsStore, import_csv
+
+for store_path, legacy_pattern in [('supfigure_maskers/results',
+                                    'supfigure_maskers/*_supfigure_maskers_unroved_*.csv'),
+                                   ('supfigure_maskers/masker_interval_simulations/results',
+                                    'supfigure_maskers/masker_interval_simulations/*_supfigure_maskers_unroved_*.csv')]:
+    store = ResultsStore(store_path)
+    if len(store.read(columns=['result'])) == 0:
+        import_csv(sorted(glob.glob(legacy_pattern)), store)
+    store.compact()
+    store.read().to_csv(os.path.join(store_path, 'collated.csv'), index=False)
@@ -3,97 +3,15 @@ This script implements the simulations described in Figure 6 of Guest and Oxenha
 """
 import apcmodels.simulation as si
 import apcmodels.anf as anf
-import apcmodels.decode as dc
 from apcmodels.util import save_to_csv
 import numpy as np
 import os, sys
 sys.path.append(os.getcwd())
 from util.functions import ISOToneGuest2021, GEOMToneGuest2021, adjust_level
+from util.information import get_information_curves
 import matplotlib.pyplot as plt
 
 
-def get_information_curves(ratefunc):
-
-    def inner(params):
-        # Pull parameters from encoded list/dict of parameters
-        fs = dc.find_parameter(params, 'fs')
-        delta_theta = dc.find_parameter(params, 'delta_theta')
-        n_fiber_per_chan = dc.find_parameter(params, 'n_fiber_per_chan')
-        API = dc.find_parameter(params, 'API')
-
-        # Run ratefunc on kwargs and get firing rates for each input
-        rates = dc.run_rates_util(ratefunc, params)
-
-        # Check to see if the elements of rates are ndarrays or lists... if they are not lists, we need to put
-        # rates inside a list so it can be processed by the list comprehension below
-        if type(rates[0]) is not list:
-            rates = [rates]
-
-        # Compute partial derivative matrices for rates for AI and then RP
-        pdms_AI = [compute_information_curve(x, fs, delta_theta, n_fiber_per_chan, 'AI') for x in rates]
-        pdms_AI = np.array(pdms_AI)
-
-        pdms_RP = [compute_information_curve(x, fs, delta_theta, n_fiber_per_chan, 'RP') for x in rates]
-        pdms_RP = np.array(pdms_RP)
-
-        return pdms_AI, pdms_RP
-
-    return inner
-
-
-def compute_information_curve(x, fs, delta_theta, n_fiber_per_chan, _type):
-    """ Computes information curves
-
-    Args:
-        x (list): list of ndarrays containing firing-rate simulations in shape (n_channel x n_sample). The first
-            array should be a firing-rate simulation for baseline parameter values. The following arrays should
-            be firing-rate simulations where a single parameter has been incremented by a small amount.
-        fs (int): sampling rate in Hz
-        delta_theta (ndarray): 1d ndarray containing the increment size for each element of x after the first
-        n_fiber_per_chan (array): array containing integers of len n_cf, each element indicates how many fibers
-            are theoretically represented by the single corresponding channel in x
-        _type (str): either 'AI' or 'RP' for all-information or rate-place
-
-    """
-    # Calculate n_param
-    n_param = len(x) - 1
-    if n_param < 1:
-        raise ValueError('There is only one simulation per condition --- ideal observer needs n_param + 1 '
-                         'simulations!')
-    # Transform from list to ndarray
-    x = np.array(x)
-    x = np.transpose(x, [1, 0, 2])  # shape: n_cf x (n_param + 1) x n_sample
-    # Add small baseline firing rate to avoid issues with zeros and NaNs
-    x += 1
-    # Construct one ndarray of baseline values and another of incremented values
-    baseline = np.tile(x[:, 0, :], [n_param, 1, 1])
-    baseline = np.transpose(baseline, [1, 0, 2])  # shape: n_cf x n_param x n_sample
-    incremented = x[:, 1:, :]  # shape: n_cf x n_param x n_sample
-    if _type == 'AI':
-        # Estimate derivative with respect to each parameter
-        deriv_estimate = np.transpose(np.transpose((incremented - baseline), [0, 2, 1]) / delta_theta,
-                                      [0, 2, 1])  # shape: n_CF x n_param x n_time
-        # Normalize the derivatives by the square root of rate
-        deriv_norm = np.sqrt(1 / baseline) * deriv_estimate  # shape: n_CF x n_param x n_time
-        deriv_matrix = 1 / fs * np.matmul(deriv_norm,
-                                          np.transpose(deriv_norm, [0, 2, 1]))  # shape: n_CF x n_param x n_param
-        return deriv_matrix
-    elif _type == 'RP':
-        # Calculate the duration of the response
-        t_max = baseline.shape[2] * 1 / fs
-        # Average results across time
-        baseline = np.mean(baseline, axis=2)
-        incremented = np.mean(incremented, axis=2)
-        # Estimate derivative with respect to each parameter
-        deriv_estimate = (incremented - baseline) / delta_theta
-        # Normalize the derivatives by the square root of rate
-        deriv_norm = np.sqrt(1 / baseline) * deriv_estimate  # shape: n_CF x n_param
-        # Compute derivative matrix
-        deriv_norm = np.stack((deriv_norm, deriv_norm), axis=2)
-        deriv_matrix = np.matmul(deriv_norm, np.transpose(deriv_norm, [0, 2, 1]))  # shape: n_CF x n_param x n_param
-        return deriv_matrix
-
-
 def simulate_supfigure3_information_curves_iso(F0, level, model, model_name, fs, n_cf=40):
     """
     Estimates F0 difference limens (FDLs) using ideal observer analysis for a given auditory nerve model. Saves
@@ -134,9 +52,9 @@ def simulate_supfigure3_information_curves_iso(F0, level, model, model_name, fs,
     stimuli = synth.synthesize_sequence(params)
     params.add_inputs(stimuli)
 
-    # Construct simulation and run
+    # Construct simulation and run (spilling each response to disk so that only one is in memory at a time)
     sim = model()
-    results = sim.run(params, runfunc=get_information_curves(sim.simulate))
+    results = sim.run(params, runfunc=get_information_curves(sim.simulate, spill=True))
 
     return results
 
@@ -184,9 +102,9 @@ def simulate_supfigure3_information_curves_geom(F0, level, model, model_name, fs
     stimuli = synth.synthesize_sequence(params)
     params.add_inputs(stimuli)
 
-    # Construct simulation and run
+    # Construct simulation and run (spilling each response to disk so that only one is in memory at a time)
     sim = model()
-    results = sim.run(params, runfunc=get_information_curves(sim.simulate))
+    results = sim.run(params, runfunc=get_information_curves(sim.simulate, spill=True))
 
     return results
 
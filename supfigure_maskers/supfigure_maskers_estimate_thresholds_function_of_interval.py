@@ -1,36 +1,39 @@
 """
 This script implements the simulations described in Figure 6 of Guest and Oxenham (2021).
 """
-from re import finditer
+from functools import partial
 import apcmodels.simulation as si
 import apcmodels.anf as anf
-import apcmodels.decode as dc
-from apcmodels.util import save_to_csv
 import numpy as np
 import os, sys
 sys.path.append(os.getcwd())
 from util.functions import ISOToneGuest2021, GEOMToneGuest2021, adjust_level
+from util.finite_differences import FiniteDifferencePlan, decode_finite_differences
+from util.results import ResultsStore
+from util.sweeps import run_grid
 
 
-def simulate(model, model_name, fs, stim='iso', delta=0.001, finite_difference_method='forward', masker_interval=1):
+def prepare(model_name, fs, plan, stimulus='iso', masker_interval=1):
     """
-    Estimates F0 difference limens (FDLs) using ideal observer analysis for a given auditory nerve model. Saves
-    the results to disk. This specific harmonic complex tone stimulus used in this simulation is from Guest and
-    Oxenham (2021), although no acoustic noise is included in the stimulus.
+    Prepares the parameters needed to estimate F0 difference limens (FDLs) using ideal observer analysis for a given
+    auditory nerve model (see run_grid in util/sweeps.py). This specific harmonic complex tone stimulus used in this
+    simulation is from Guest and Oxenham (2021), although no acoustic noise is included in the stimulus.
 
     Args:
-        model: model object from apcmodels.anf
         model_name (str): name of the model
         fs (int): sampling rate in Hz
+        plan (FiniteDifferencePlan): finite-difference estimates of the derivative with respect to F0 to decode
+        stimulus (str): either 'iso' or 'geom'
+        masker_interval (float): interval between the target and masker F0s in semitones
+
+    Returns:
+        elements (list): unique perturbed parameter dicts for each condition (see FiniteDifferencePlan.expand), with
+            inputs added
     """
     # Define stimulus parameters
     #F0s = 10**np.linspace(np.log10(280) - 0.2, np.log10(1400) + 0.1, 24)  # simulate 8th harmonic of F0s
-    if finite_difference_method == 'forward' or finite_difference_method == 'backward':
-        F0s = np.array([280, 1400])
-        nominal_F0s = np.array([280, 1400])
-    else:
-        F0s = np.array([280, 1400]) - delta
-        nominal_F0s = np.array([280, 1400])
+    F0s = np.array([280, 1400])
+    nominal_F0s = np.array([280, 1400])
     F0s_masker = F0s*2**(masker_interval/12)
     levels = [30]  # dB SPL, per component
     dur = 0.10  # seconds
@@ -51,12 +54,6 @@ def simulate(model, model_name, fs, stim='iso', delta=0.001, finite_difference_m
     params.stitch('cf_low', cf_low)                            # stitch cf_low (each freq corresponds to a cf_low)
     params.stitch('cf_high', cf_high)                          # stitch cf_high (each freq corresponds to a cf_high)
     params.wiggle('level', levels)                             # wiggle levels
-    if finite_difference_method == 'forward':
-        params.append('delta_theta', [delta])
-    elif finite_difference_method == 'backward':
-        params.append('delta_theta', [delta])
-    elif finite_difference_method == 'central':
-        params.append('delta_theta', [delta*2])
 
     # Adjust levels to be in dB re: threshold
     params.flatten()
@@ -64,40 +61,31 @@ def simulate(model, model_name, fs, stim='iso', delta=0.001, finite_difference_m
         ele['nominal_level'] = ele['level']                                 # encode nominal level (dB re: threshold)
         ele['level'] = adjust_level(ele['F0']*8, ele['level'], model_name)  # encode actual level (dB SPL)
 
-    # Encode increments
-    if finite_difference_method == 'forward':
-        params.increment({'F0': delta})  # increment F0
-    elif finite_difference_method == 'backward':
-        params.increment({'F0': -1*delta})
-    elif finite_difference_method == 'central':
-        params.increment({'F0': 2*delta})
+    # Encode the perturbed F0s needed by every finite-difference estimate in the plan (each only once)
+    elements = plan.expand(params)
 
     # Synthesize stimuli
-    if stim == 'iso':
+    if stimulus == 'iso':
         synth = ISOToneGuest2021()
     else:
         synth = GEOMToneGuest2021()
-    stimuli = synth.synthesize_sequence(params)
-    params.add_inputs(stimuli)
-
-    # Construct simulation and run
-    sim = model()
-    results = sim.run(params, runfunc=dc.decode_ideal_observer(sim.simulate))
+    stimuli = synth.synthesize_sequence(elements)
+    plan.add_inputs(elements, stimuli)
 
-    # Compile results
-    save_to_csv([res[0] for res in results], params,
-                'supfigure_maskers/masker_interval_simulations/' + model_name + '_supfigure_maskers_unroved_AI_' + str(delta) + '_' + stim + '_' + str(masker_interval) + '_mi.csv', decoding_type='AI',
-                model=model_name, roving_type='none', stimulus=stim, delta=delta, finite_difference_method=finite_difference_method, masker_interval=masker_interval)
-    save_to_csv([res[1] for res in results], params,
-                'supfigure_maskers/masker_interval_simulations/' + model_name + '_supfigure_maskers_unroved_RP_' + str(delta) + '_' + stim + '_' + str(masker_interval) + '_mi.csv', decoding_type='RP',
-                model=model_name, roving_type='none', stimulus=stim, delta=delta, finite_difference_method=finite_difference_method, masker_interval=masker_interval)
+    return elements
 
 
-# Loop through models and calculate FDLs for each model
+# Clear results of any previous run, then loop through models and calculate FDLs for each model for every combination
+# of stimulus, masker interval, and delta (each perturbed F0 is only simulated once)
+store = ResultsStore('supfigure_maskers/masker_interval_simulations/results')
+store.clear()
+plan = FiniteDifferencePlan([('F0', delta, 'forward') for delta in [1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1]])
 for model, model_name, fs in zip([anf.AuditoryNerveHeinz2001],
                                  ['Heinz2001'],
                                  [int(1000e3)]):
-    for stim in ['iso', 'geom']:
-        for masker_interval in [0.0001, 0.001, 0.01, 0.1, 1]:
-            for delta in [1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1]:
-                simulate(model, model_name, fs, stim=stim, masker_interval=masker_interval, delta=delta)
+    results = run_grid(model, model_name, partial(prepare, model_name, fs, plan),
+                       {'stimulus': ['iso', 'geom'],
+                        'masker_interval': [0.0001, 0.001, 0.01, 0.1, 1]},
+                       decoder=partial(decode_finite_differences, plan=plan), requests=plan.requests)
+    results['roving_type'] = 'none'
+    store.append(results)
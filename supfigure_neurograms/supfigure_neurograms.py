@@ -9,6 +9,9 @@ sys.path.append(os.getcwd())
 import matplotlib
 matplotlib.use('Agg')
 from util.functions import ISOToneGuest2021, GEOMToneGuest2021, DBLToneGuest2021
+from util.neurograms import NeurogramStore
+from util.plotting import render_neurogram
+from util.precision import WorkingPrecision
 
 
 def sim_and_plot_neurogram(f0, stimulus, xlow=20, xhigh=25):
@@ -31,21 +34,19 @@ def sim_and_plot_neurogram(f0, stimulus, xlow=20, xhigh=25):
     else:
         params = si.Parameters(F0=f0, F0_masker_1=f0*2**(-6/12), F0_masker_2=f0*2**(8/12), level=50, level_masker_1=50, level_masker_2=50, fs=int(200e3), cf_low=f0*0.5, cf_high=f0*15, n_cf=200,
                             dur=0.10, dur_ramp=0.01, fiber_type='msr')
-    stimulus = stimulus().synthesize_sequence(params)
-    params.add_inputs(stimulus)
     sim = anf.AuditoryNerveZilany2014()
-    resp = sim.run(params)
+    neurogram = NeurogramStore().simulate(params[0], 'Zilany2014', stimulus(), WorkingPrecision(sim.simulate))
 
-    # Calculate various axes
-    t = np.linspace(0, resp[0].shape[1]/params[0]['fs'], resp[0].shape[1])
+    # Read only the plotted window of the neurogram and calculate various axes
+    times = neurogram.index_times(xlow/f0, xhigh/f0)
+    t, f, resp = neurogram.read(xlow/f0, xhigh/f0)
     t = t / (1/f0) - xlow  # adjust by requested xlow so that the x-axis will start at 0
     xhigh = xhigh - xlow
     xlow = xlow - xlow
-    f = 10**np.linspace(np.log10(params[0]['cf_low']), np.log10(params[0]['cf_high']), params[0]['n_cf'])
 
     # Get stimulus and add zero padding to it
     stim = np.concatenate([np.zeros(int(params[0]['fs']*0.005)),
-                                        params[0]['_input'],
+                                        neurogram.stimulus,
                                         np.zeros(int(params[0]['fs']*0.040))])
 
     # Generate plot
@@ -55,14 +56,14 @@ def sim_and_plot_neurogram(f0, stimulus, xlow=20, xhigh=25):
     axs[0, 2].axis('off')
 
     # Plot surface (middle)
-    axs[1, 1].pcolormesh(t, f, resp[0], shading='auto')
+    render_neurogram(axs[1, 1], t, f, resp, xlim=(xlow, xhigh))
     #axs[1, 1].get_xaxis().set_visible(False)
     axs[1, 1].set_xlabel("Normalized time (periods)")
     axs[1, 1].get_yaxis().set_visible(False)
     axs[1, 1].set_xlim((xlow, xhigh))
 
     # Plot acoustic stimulus (top)
-    axs[0, 1].plot(t, stim, color='black')
+    axs[0, 1].plot(t, stim[times], color='black')
     axs[0, 1].get_xaxis().set_visible(False)
     axs[0, 1].set_xlim((xlow, xhigh))
     axs[0, 1].set_ylabel('Amplitude (Pa)', rotation='horizontal', ha='right')
@@ -79,7 +80,7 @@ def sim_and_plot_neurogram(f0, stimulus, xlow=20, xhigh=25):
     axs[1, 0].set_xlabel('Level (dB)')
 
     # Plot excitation pattern (right)
-    axs[1, 2].plot(np.mean(resp[0], axis=1), f)
+    axs[1, 2].plot(neurogram.mean, f)
     idx = np.argmin(np.abs(f - f0*4))
     idx = np.argmin(np.abs(f - f0*12))
     idx = np.argmin(np.abs(f - f0*5.5))
@@ -0,0 +1,188 @@
+"""
+The following functions and classes implement a content-addressed on-disk cache of auditory nerve model responses so
+that scripts can be rerun (e.g., after a change to plotting code only) without re-running the underlying simulations.
+"""
+import hashlib
+import os
+from contextlib import contextmanager
+import numpy as np
+from util.precision import get_precision, to_precision
+
+# Parameters that determine the output of the auditory nerve models (other than the stimulus itself)
+MODEL_PARAMETERS = ['cf_low', 'cf_high', 'n_cf', 'cfs', 'fiber_type', 'anf_num', 'fs', 'fs_synapse', 'species',
+                    'cohc', 'cihc', 'powerlaw', 'noise', 'n_fiber_per_chan']
+
+
+def hash_value(hasher, value):
+    """ Feeds a parameter value into a hash object in a way that is stable across runs
+
+    Args:
+        hasher: hash object from hashlib
+        value: parameter value (ndarray, list, tuple, scalar, str, or None)
+    """
+    if isinstance(value, np.ndarray):
+        value = np.ascontiguousarray(value)
+        hasher.update(str((value.dtype.str, value.shape)).encode())
+        hasher.update(value.tobytes())
+    elif isinstance(value, (list, tuple)):
+        hasher.update(b'[')
+        for ele in value:
+            hash_value(hasher, ele)
+        hasher.update(b']')
+    elif isinstance(value, (float, np.floating)):
+        hasher.update(repr(float(value)).encode())
+    else:
+        hasher.update(repr(value).encode())
+
+
+class ResponseCache:
+    """ Content-addressed on-disk store of model responses with a size cap and least-recently-used (LRU) eviction
+
+    Each response is stored as a .npy file named after a hash of the stimulus, the model, and the model-relevant
+    parameters (see MODEL_PARAMETERS). Responses are loaded as read-only memory maps, so cache hits do not copy the
+    response into memory until it is used. The modification time of each file is refreshed whenever it is read, and
+    the least recently used files are deleted whenever the total size of the store exceeds max_size. To avoid scanning
+    the store after every put, each instance keeps a running estimate of the size of the store (the size at its last
+    scan plus the size of the responses it has written since) and only scans the store when the estimate exceeds
+    max_size, so responses written by other processes are only counted at the next scan. Each scan evicts responses
+    until the store is at most a fraction (eviction_target) of max_size, so that a full store is not scanned again
+    after the next put.
+    """
+    eviction_target = 0.9
+    def __init__(self, path=os.path.join('.cache', 'responses'), max_size=int(20e9)):
+        """
+        Arguments:
+            path (str): directory in which to store responses
+            max_size (int): maximum total size of the store in bytes
+        """
+        self.path = path
+        self.max_size = max_size
+        self.pinned = frozenset()
+        self._size = None  # estimated total size of the store in bytes, or None before the first scan
+        self._limit = max_size  # estimated size above which the store is scanned again
+        os.makedirs(self.path, exist_ok=True)
+
+    def key(self, params, model_name, replicate=0):
+        """ Calculates the key under which the response to a parameter dict is stored
+
+        Args:
+            params (dict): parameter dict, including the stimulus under the '_input' key
+            model_name (str): name of the model
+            replicate (int): index of the replicate, which allows independent responses of stochastic models to the
+                same stimulus to be stored separately
+
+        Returns:
+            key (str): hex digest identifying the response
+        """
+        hasher = hashlib.sha1()
+        hash_value(hasher, model_name)
+        hash_value(hasher, replicate)
+        hash_value(hasher, np.asarray(params['_input']))
+        for name in MODEL_PARAMETERS:
+            if name in params:
+                hash_value(hasher, name)
+                hash_value(hasher, params[name])
+        # Keep responses stored in reduced precision separate (double-precision keys are unchanged)
+        if get_precision() != np.float64:
+            hash_value(hasher, get_precision().str)
+        return hasher.hexdigest()
+
+    def get(self, key):
+        """ Returns the stored response for key as a read-only memory map, or None if key is not in the store """
+        filename = os.path.join(self.path, key + '.npy')
+        try:
+            response = np.load(filename, mmap_mode='r')
+        except (FileNotFoundError, ValueError):
+            return None
+        os.utime(filename)  # mark as recently used
+        return response
+
+    def put(self, key, response):
+        """ Stores a response under key and then evicts least recently used responses if the store is too large """
+        filename = os.path.join(self.path, key + '.npy')
+        filename_temp = filename + '.' + str(os.getpid()) + '.tmp'
+        with open(filename_temp, 'wb') as file:
+            np.save(file, np.asarray(response))
+        os.replace(filename_temp, filename)  # atomic, so that parallel workers never read a partial file
+        if self._size is not None:
+            self._size += os.path.getsize(filename)
+        if self._size is None or self._size > self._limit:
+            self.evict()
+
+    def evict(self):
+        """ Deletes least recently used responses until the total size of the store is at most eviction_target times
+        max_size (or until only pinned responses are left, see pin()) """
+        entries = []
+        total = 0
+        for entry in os.scandir(self.path):
+            if entry.name.endswith('.npy'):
+                stat = entry.stat()
+                total += stat.st_size
+                if entry.name[:-len('.npy')] not in self.pinned:
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        for _, size, filename in sorted(entries):
+            if total <= self.eviction_target * self.max_size:
+                break
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+            total -= size
+        # If pinned responses keep the store above max_size, wait until it has doubled before scanning again, so that
+        # a long run of pinned puts does not scan the store after every put
+        self._size = total
+        self._limit = self.max_size if total <= self.max_size else 2 * total
+
+    @contextmanager
+    def pin(self, keys):
+        """ Context manager that keeps the responses for keys from being evicted while it is active
+
+        Copies of the cache sent to worker processes while the context is active (e.g., as arguments of
+        executor.submit) also keep the responses. Pinned responses may push the store over max_size, in which case it is
+        trimmed back to max_size when the context exits.
+
+        Args:
+            keys (iterable): keys of the responses to keep
+        """
+        pinned = self.pinned
+        self.pinned = pinned | frozenset(keys)
+        try:
+            yield self
+        finally:
+            self.pinned = pinned
+            self.evict()
+
+
+class CachedSimulation:
+    """ Wraps a simulate method (e.g., AuditoryNerveZilany2014().simulate) so that its responses are cached on disk
+
+    Instances can be passed anywhere the wrapped method could be, e.g., as the runfunc of sim.run() or as the argument
+    of dc.decode_ideal_observer(). Responses are stored in the working precision (see util/precision.py) and are
+    returned as read-only memory maps of the stored files, whether or not they had to be simulated.
+    """
+    def __init__(self, simulate, model_name=None, cache=None):
+        """
+        Arguments:
+            simulate (function): function that accepts a parameter dict and returns a model response
+            model_name (str): name of the model used in the cache key, defaults to the model_name attribute of
+                simulate if it has one (e.g., ChannelSummary from util.summaries) or else the class name of the object
+                to which simulate is bound
+            cache (ResponseCache): cache in which to store responses, defaults to a ResponseCache with default settings
+        """
+        self.simulate = simulate
+        if model_name is None:
+            model_name = getattr(simulate, 'model_name', None) or type(simulate.__self__).__name__
+        self.model_name = model_name
+        self.cache = ResponseCache() if cache is None else cache
+
+    def __call__(self, params, replicate=0):
+        key = self.cache.key(params, self.model_name, replicate)
+        response = self.cache.get(key)
+        if response is None:
+            response = to_precision(self.simulate(params))
+            self.cache.put(key, response)
+            # Return the stored copy so that the response does not stay in memory (unless it could not be kept in the
+            # store, e.g., because it is larger than max_size on its own)
+            stored = self.cache.get(key)
+            response = response if stored is None else stored
+        return response
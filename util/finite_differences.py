@@ -0,0 +1,119 @@
+"""
+The following functions and classes plan and decode finite-difference estimates of the derivatives of model responses
+with respect to stimulus parameters. Rather than encoding each estimate as its own baseline and incremented simulations
+(as Parameters.increment does), a FiniteDifferencePlan collects every requested estimate (parameter, delta, and
+forward, backward, or central scheme) and expands each condition into the set of unique perturbed stimuli that they
+need, e.g., forward and backward estimates share the unperturbed stimulus, and forward, backward, and central estimates
+with the same delta share the stimuli at F0 + delta and F0 - delta. Each perturbed stimulus is then simulated only once
+and decode_finite_differences assembles the baseline and incremented simulations for each estimate from the shared pool.
+"""
+from collections import namedtuple
+import apcmodels.decode as dc
+
+# A single finite-difference estimate, stored as columns of the results (see run_grid in util/sweeps.py)
+FiniteDifference = namedtuple('FiniteDifference', ['parameter', 'delta', 'finite_difference_method'])
+
+# Offsets (in units of delta) of the parameter in the baseline and incremented simulations for each scheme. The
+# central scheme uses the simulation at -delta as the baseline, and so estimates the derivative over an increment of
+# 2*delta.
+SCHEMES = {'forward': (0, 1), 'backward': (0, -1), 'central': (-1, 1)}
+
+
+class FiniteDifferencePlan:
+    """ A set of finite-difference estimates and the unique perturbed stimuli needed to compute them """
+    def __init__(self, requests):
+        """
+        Arguments:
+            requests (list): list of FiniteDifference objects or (parameter, delta, finite_difference_method) tuples
+        """
+        self.requests = [FiniteDifference(*request) for request in requests]
+        for request in self.requests:
+            if request.finite_difference_method not in SCHEMES:
+                raise ValueError('Unknown finite-difference method ' + repr(request.finite_difference_method) + '!')
+        # Find the unique perturbations, each a (parameter, offset) pair with (None, 0) for the unperturbed stimulus,
+        # and the indices of the baseline and incremented perturbations for each request
+        self.perturbations = [(None, 0)]
+        self.pairs = []
+        for request in self.requests:
+            pair = []
+            for step in SCHEMES[request.finite_difference_method]:
+                perturbation = (None, 0) if step == 0 else (request.parameter, step*request.delta)
+                if perturbation not in self.perturbations:
+                    self.perturbations.append(perturbation)
+                pair.append(self.perturbations.index(perturbation))
+            self.pairs.append(tuple(pair))
+
+    def expand(self, params):
+        """ Expands each condition into its unique perturbed parameter dicts
+
+        Args:
+            params (Parameters, list): flattened Parameters object (or list of parameter dicts) without increments
+
+        Returns:
+            elements (list): list with one entry per condition, each a list of parameter dicts with one entry per
+                perturbation in self.perturbations. Stimuli for these can be synthesized with synthesize_sequence and
+                then added with add_inputs.
+        """
+        elements = []
+        for ele in params:
+            points = []
+            for idx, (parameter, offset) in enumerate(self.perturbations):
+                point = dict(ele)
+                if parameter is not None:
+                    point[parameter] = point[parameter] + offset
+                point['_perturbation'] = idx
+                points.append(point)
+            elements.append(points)
+        return elements
+
+    @staticmethod
+    def add_inputs(elements, stimuli):
+        """ Adds stimuli to the output of expand in place, analogously to Parameters.add_inputs """
+        for points, inputs in zip(elements, stimuli):
+            for point, _input in zip(points, inputs):
+                point['_input'] = _input
+
+    def assemble(self, points):
+        """ Returns the baseline and incremented parameter dicts for each request from the points of one condition
+
+        Args:
+            points (list): one entry of the output of expand, with stimuli added
+
+        Returns:
+            pairs (list): list with one entry per request, each a list of the baseline and incremented parameter dicts
+                with delta_theta set to the increment between them
+        """
+        pairs = []
+        for request, (idx_baseline, idx_increment) in zip(self.requests, self.pairs):
+            delta_theta = self.perturbations[idx_increment][1] - self.perturbations[idx_baseline][1]
+            pairs.append([dict(points[idx], delta_theta=[delta_theta]) for idx in (idx_baseline, idx_increment)])
+        return pairs
+
+
+def decode_finite_differences(ratefunc, plan, decoder=dc.decode_ideal_observer):
+    """ Returns a runfunc that decodes every request in a FiniteDifferencePlan, simulating each perturbation once
+
+    Args:
+        ratefunc (function): function that accepts a parameter dict and returns a firing-rate simulation, e.g.,
+            AuditoryNerveHeinz2001().simulate
+        plan (FiniteDifferencePlan): plan used to expand the parameters
+        decoder (function): function that accepts a ratefunc and returns a runfunc that decodes a baseline and
+            incremented simulation, e.g., dc.decode_ideal_observer
+
+    Returns:
+        inner (function): function that accepts one entry of the output of plan.expand() and returns a list with one
+            output of decoder per request in plan.requests
+    """
+    def inner(points):
+        # Simulate each perturbation the first time it is needed and reuse the response for every other request
+        responses = {}
+
+        def shared_ratefunc(params):
+            if params['_perturbation'] not in responses:
+                responses[params['_perturbation']] = ratefunc(params)
+            return responses[params['_perturbation']]
+
+        runfunc = decoder(shared_ratefunc)
+        return [runfunc(pair) for pair in plan.assemble(points)]
+
+    return inner
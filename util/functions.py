@@ -3,20 +3,127 @@ The following functions are used throughout the scripts in this repo to synthesi
 Guest and Oxenham (2021) and to process some of the simulations.
 """
 import apcmodels.synthesis as sy
+import apcmodels.simulation as si
 import apcmodels.signal as sg
 import numpy as np
-from scipy.signal import sosfiltfilt, butter
+import hashlib
+import inspect
+import os
+from functools import lru_cache
+from math import gcd
+from scipy.signal import sosfiltfilt, butter, czt, firwin, resample_poly
 from scipy.interpolate import interp1d
+from util.cache import hash_value
+from util.precision import to_precision
 
 
-class ISOToneGuest2021_exp1a(sy.Synthesizer):
+def flatten_parameter_sequence(parameters):
+    """ Flattens a (possibly nested) sequence of parameter dicts into a single list
+
+    Args:
+        parameters (Parameters, list, ndarray): a Parameters object or a list/ndarray of parameter dicts, where each
+            element can itself be a list/ndarray of parameter dicts (e.g., after calls to increment() or repeat())
+
+    Returns:
+        elements (list): list of parameter dicts in depth-first order
+        structure (list, ndarray): copy of the input structure with each dict replaced by its index in elements, which
+            can be passed to unflatten_parameter_sequence() to restore the original nesting
+    """
+    if isinstance(parameters, si.Parameters):
+        parameters = parameters.params
+    elements = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            elements.append(node)
+            return len(elements) - 1
+        elif isinstance(node, np.ndarray):
+            structure = np.empty(node.shape, dtype=object)
+            for idx in np.ndindex(node.shape):
+                structure[idx] = walk(node[idx])
+            return structure
+        else:
+            return [walk(child) for child in node]
+
+    return elements, walk(parameters)
+
+
+def unflatten_parameter_sequence(structure, outputs):
+    """ Inverse of flatten_parameter_sequence(), places outputs back into the original nesting
+
+    Args:
+        structure (list, ndarray): structure returned by flatten_parameter_sequence()
+        outputs (list): list of outputs, one per element returned by flatten_parameter_sequence()
+
+    Returns:
+        output (list, ndarray): outputs arranged in the same nesting as the original sequence of parameter dicts
+    """
+    if isinstance(structure, (int, np.integer)):
+        return outputs[structure]
+    elif isinstance(structure, np.ndarray):
+        output = np.empty(structure.shape, dtype=object)
+        for idx in np.ndindex(structure.shape):
+            output[idx] = unflatten_parameter_sequence(structure[idx], outputs)
+        return output
+    else:
+        return [unflatten_parameter_sequence(child, outputs) for child in structure]
+
+
+class BatchSynthesizerGuest2021(sy.Synthesizer):
+    """ Base class for synthesizers that can synthesize a whole sequence of stimuli at once
+
+    Subclasses implement synthesize() as usual, plus synthesize_batch(), which synthesizes a list of parameter dicts
+    sharing the same duration, ramp duration, and sampling rate into a single (n_stim, n_sample) array.
+    synthesize_sequence() flattens the sequence of parameter dicts, groups the elements by their time axis, dispatches
+    each group to synthesize_batch() in chunks of at most batch_size stimuli, and returns the stimuli in the same
+    nesting as the input sequence. Subclasses accept a backend argument ('time' or 'fft') at construction that selects
+    how the components of the complex tones are synthesized (see synthesize_harmonics_batch). Stimuli are synthesized in
+    double precision and returned in the working precision (see util/precision.py).
+    """
+    batch_size = 64
+
+    def synthesize_batch(self, elements, dur, dur_ramp, fs):
+        raise NotImplementedError
+
+    def synthesize_sequence(self, parameters, **kwargs):
+        """ Synthesizes a (possibly nested) sequence of stimuli using synthesize_batch()
+
+        Args:
+            parameters (Parameters, list, ndarray): a Parameters object or a list/ndarray of parameter dicts
+            **kwargs: keyword arguments passed to every call, overriding values in the parameter dicts
+
+        Returns:
+            output (list, ndarray): stimuli in the same nesting as parameters
+        """
+        elements, structure = flatten_parameter_sequence(parameters)
+        # Fill in defaults from the signature of synthesize() so that batches see the same values as synthesize()
+        defaults = {name: arg.default for name, arg in inspect.signature(self.synthesize).parameters.items()
+                    if arg.default is not inspect.Parameter.empty}
+        elements = [{**defaults, **ele, **kwargs} for ele in elements]
+        # Group elements that share a time axis
+        groups = {}
+        for idx, ele in enumerate(elements):
+            groups.setdefault((ele['dur'], ele['dur_ramp'], ele['fs']), []).append(idx)
+        # Synthesize each group in chunks
+        outputs = [None] * len(elements)
+        for (dur, dur_ramp, fs), idxs in groups.items():
+            for start in range(0, len(idxs), self.batch_size):
+                chunk = idxs[start:(start+self.batch_size)]
+                signals = self.synthesize_batch([elements[idx] for idx in chunk], dur, dur_ramp, fs)
+                for idx, signal in zip(chunk, signals):
+                    outputs[idx] = to_precision(signal)
+        return unflatten_parameter_sequence(structure, outputs)
+
+
+class ISOToneGuest2021_exp1a(BatchSynthesizerGuest2021):
     """ Synthesizes the ISO stimulus in Guest and Oxenham (2021).
 
     Simplified version of the stimulus in Guest and Oxenham (2021). This version is the version from Experiment 1a, and
     does not include acoustic masking noise.
     """
-    def __init__(self):
+    def __init__(self, backend='time'):
         super().__init__(stimulus_name='ISO Tone')
+        self.backend = backend
 
     def synthesize(self, F0, dur=0.350, dur_ramp=0.02, level=None, phase=None, fs=int(48e3), **kwargs):
         """
@@ -48,20 +155,46 @@ class ISOToneGuest2021_exp1a(sy.Synthesizer):
         elif isinstance(phase, float) or isinstance(phase, int) is int:
             phase = phase + np.zeros(len(freqs))
         # Synthesize, filter, and ramp complex tone signal
-        signal = sg.complex_tone(freqs, level, phase, dur, fs)
+        signal = complex_tone(freqs, level, phase, dur, fs, self.backend)
         signal = sg.cosine_ramp(signal, dur_ramp, fs)
         # Return
         return signal
 
+    def synthesize_batch(self, elements, dur, dur_ramp, fs):
+        """
+        Synthesizes a batch of ISO stimuli sharing the same duration, ramp duration, and sampling rate. See
+        synthesize() for a description of each parameter.
+
+        Args:
+            elements (list): list of parameter dicts, each containing the arguments of synthesize()
+            dur (float): duration in seconds
+            dur_ramp (float): duration of raised-cosine ramp in seconds
+            fs (int): sampling rate in Hz
+
+        Returns:
+            output (ndarray): complex tone stimuli of shape (n_stim, n_sample)
+        """
+        # Create arrays of frequencies, levels, and phases
+        freqs = np.array([ele['F0'] for ele in elements])[:, None]*np.array([6, 7, 8, 9, 10])
+        level = np.array([np.broadcast_to(40 if ele['level'] is None else ele['level'], freqs.shape[1])
+                          for ele in elements], dtype=float)  # default to 40 dB SPL per component
+        phase = np.array([np.broadcast_to(0 if ele['phase'] is None else ele['phase'], freqs.shape[1])
+                          for ele in elements], dtype=float)  # default to sine phase
+        # Synthesize and ramp complex tone signals
+        return synthesize_complex_tone_batch(freqs, level, 0, phase, dur, fs, dur_ramp, sos=None, ten=False,
+                                             backend=self.backend)
+
 
 class ISOToneGuest2021_exp1b(sy.Synthesizer):
     """ Synthesizes the ISO stimulus in Guest and Oxenham (2021).
 
     Simplified version of the stimulus in Guest and Oxenham (2021). This version is the version from Experiment 1b, and
-    does not include acoustic masking noise.
+    does not include acoustic masking noise. The backend argument ('time' or 'fft') selects how the components are
+    synthesized (see synthesize_harmonics_batch).
     """
-    def __init__(self):
+    def __init__(self, backend='time'):
         super().__init__(stimulus_name='ISO Tone')
+        self.backend = backend
 
     def synthesize(self, F0, dur=0.350, dur_ramp=0.02, level=45, phase=0, fs=int(48e3), **kwargs):
         """
@@ -84,11 +217,10 @@ class ISOToneGuest2021_exp1b(sy.Synthesizer):
         level = level * np.ones(len(freqs)) 
         phase = phase + np.zeros(len(freqs))
         # Synthesize, filter, and ramp complex tone signal
-        signal = sg.complex_tone(freqs, level, phase, dur, fs)
+        signal = complex_tone(freqs, level, phase, dur, fs, self.backend)
         signal = sg.cosine_ramp(signal, dur_ramp, fs)
         # Filter with bandpass filter
-        sos = butter(N=6, Wn=[F0 * 5.5 / (fs * 0.5), F0 * 10.5 / (fs * 0.5)], btype="band",
-                     output="sos")
+        sos = bandpass_sos(F0, fs, 5.5, 10.5)
         signal = sosfiltfilt(sos, signal)
         # Return
         return signal
@@ -139,6 +271,89 @@ class ISOToneGuest2021_exp1a_variable_harms(sy.Synthesizer):
         return signal
 
 
+@lru_cache(maxsize=512)
+def _butter_bandpass_sos(low, high):
+    """ Designs (and caches) a 6th-order Butterworth bandpass filter with normalized band edges low and high """
+    return butter(N=6, Wn=[low, high], btype="band", output="sos")
+
+
+def bandpass_sos(F0, fs, low, high):
+    """ Returns second-order sections for a Butterworth bandpass filter spanning low*F0 to high*F0
+
+    Filter designs are held in an LRU cache keyed by the normalized band edges, so repeated requests for the same
+    F0 and sampling rate (e.g., across repeats, levels, or phases of the same condition) return the same array
+    instead of redesigning the filter. Because cached arrays are shared between callers, they should not be modified
+    in place.
+
+    Args:
+        F0 (float): F0 of the complex tone in Hz
+        fs (int): sampling rate in Hz
+        low (float): lower edge of the passband as a multiple of F0
+        high (float): upper edge of the passband as a multiple of F0
+
+    Returns:
+        sos (ndarray): array of second-order sections of shape (6, 6)
+    """
+    return _butter_bandpass_sos(float(F0 * low / (fs * 0.5)), float(F0 * high / (fs * 0.5)))
+
+
+def sosfiltfilt_batch(sos, signals):
+    """ Applies zero-phase filtering to each row of signals, filtering rows that share a filter in a single call
+
+    Args:
+        sos (list): list of length n_stim of second-order sections, one per row of signals
+        signals (ndarray): array of signals of shape (n_stim, n_sample)
+
+    Returns:
+        signals (ndarray): filtered signals of shape (n_stim, n_sample)
+    """
+    # Group rows by filter
+    groups = {}
+    for idx, sos_stim in enumerate(sos):
+        groups.setdefault(np.asarray(sos_stim).tobytes(), (sos_stim, []))[1].append(idx)
+    # Filter each stack of same-filter rows along the time axis
+    for sos_stim, rows in groups.values():
+        signals[rows] = sosfiltfilt(sos_stim, signals[rows], axis=-1)
+    return signals
+
+
+@lru_cache(maxsize=32)
+def polyphase_filter(up, down):
+    """ Designs (and caches) the lowpass FIR filter used to resample by a factor of up/down
+
+    This is the same Kaiser-window design that scipy.signal.resample_poly uses by default, but it is designed only once
+    per pair of factors rather than once per call. Because cached arrays are shared between callers, they should not be
+    modified in place.
+
+    Args:
+        up (int): upsampling factor
+        down (int): downsampling factor
+
+    Returns:
+        h (ndarray): filter coefficients of shape (20*max(up, down) + 1, )
+    """
+    max_rate = max(up, down)
+    return firwin(2*10*max_rate + 1, 1/max_rate, window=('kaiser', 5.0))
+
+
+def resample_polyphase(signals, fs_in, fs_out):
+    """ Resamples signals along the last axis from one integer sampling rate to another with a polyphase filter
+
+    Args:
+        signals (ndarray): array of signals of shape (..., n_sample)
+        fs_in (int): sampling rate of signals in Hz
+        fs_out (int): sampling rate of the output in Hz
+
+    Returns:
+        signals (ndarray): resampled signals of shape (..., ceil(n_sample*fs_out/fs_in))
+    """
+    divisor = gcd(int(fs_in), int(fs_out))
+    up, down = int(fs_out) // divisor, int(fs_in) // divisor
+    if up == down:
+        return signals
+    return resample_poly(signals, up, down, axis=-1, window=polyphase_filter(up, down))
+
+
 def parse_level(freqs, level):
     """ Static method to aid in processing tone stimuli below
 
@@ -184,13 +399,13 @@ def parse_phase(freqs, phase):
     return phase
 
 
-def synthesize_complex_tone(freqs, level, level_noise, phase, dur, fs, dur_ramp, sos, ten):
+def synthesize_complex_tone(freqs, level, level_noise, phase, dur, fs, dur_ramp, sos, ten, backend='time'):
     """ Static method to aid in processing tone stimuli below
 
     See docstring of ISOToneGuest2021 and others below...
     """
     # Synthesize, filter, and ramp complex tone signal
-    signal = sg.complex_tone(freqs, level, phase, dur, fs)
+    signal = complex_tone(freqs, level, phase, dur, fs, backend)
     signal = sosfiltfilt(sos, signal)
     signal = sg.cosine_ramp(signal, dur_ramp, fs)
     # Synthesize noise
@@ -199,13 +414,195 @@ def synthesize_complex_tone(freqs, level, level_noise, phase, dur, fs, dur_ramp,
     return signal
 
 
-class ISOToneGuest2021(sy.Synthesizer):
+def parse_harmonic_batch(F0s, levels, phases, harmonic_ceiling=48000/2):
+    """ Static method to aid in batch processing of tone stimuli below
+
+    Constructs padded arrays of component frequencies, levels, and phases for a batch of harmonic complex tones, each
+    composed of all harmonics of its F0 below harmonic_ceiling. Levels and phases are parsed per-tone using
+    parse_level() and parse_phase(), so callables are drawn once per tone exactly as in the unbatched synthesizers.
+
+    Args:
+        F0s (ndarray): array of F0s in Hz of shape (n_stim, )
+        levels (list): list of level specifications of length n_stim (see parse_level)
+        phases (list): list of phase specifications of length n_stim (see parse_phase)
+        harmonic_ceiling (float): components at or above this frequency are omitted, in Hz
+
+    Returns:
+        freqs (ndarray): array of frequencies of shape (n_stim, n_component), padded with NaN
+        levels (ndarray): array of levels in dB SPL of shape (n_stim, n_component), padded with NaN
+        phases (ndarray): array of phases in degrees of shape (n_stim, n_component), padded with NaN
+    """
+    freqs = [np.arange(F0, harmonic_ceiling, F0) for F0 in F0s]  # up to Nyquist for fs=48
+    n_component = max([len(ele) for ele in freqs])
+    output = np.full((3, len(F0s), n_component), np.nan)
+    for idx, (freq, level, phase) in enumerate(zip(freqs, levels, phases)):
+        output[0, idx, :len(freq)] = freq
+        output[1, idx, :len(freq)] = parse_level(freq, level)
+        output[2, idx, :len(freq)] = parse_phase(freq, phase)
+    return output[0], output[1], output[2]
+
+
+def harmonic_series(freqs, dur, tol=1e-6):
+    """ Finds, for each tone, the fundamental of which its components are harmonics
+
+    Args:
+        freqs (ndarray): array of frequencies in Hz of shape (n_stim, n_component), padded with NaN where a tone has
+            fewer than n_component components
+        dur (float): duration in seconds
+        tol (float): maximum phase drift over the stimulus, in cycles, between a component and the nearest harmonic of
+            the fundamental for the component to count as that harmonic
+
+    Returns:
+        base (ndarray): fundamental of each tone in Hz, of shape (n_stim, )
+        harmonic (ndarray): harmonic number of each component, or 0 if the component is not a harmonic of base (or is
+            padding), of shape (n_stim, n_component)
+    """
+    base = np.zeros(freqs.shape[0])
+    harmonic = np.zeros(freqs.shape, dtype=int)
+    for idx, freq in enumerate(freqs):
+        valid = np.flatnonzero(~np.isnan(freq) & (freq > 0))
+        if len(valid) == 0:
+            continue
+        lowest = np.min(freq[valid])
+        spacing = np.diff(np.unique(freq[valid]))
+        base[idx] = lowest / max(1, np.round(lowest / np.min(spacing))) if len(spacing) > 0 else lowest
+        numbers = np.round(freq[valid] / base[idx])
+        matches = (np.abs(freq[valid] - numbers*base[idx]) * dur < tol) & (numbers > 0)
+        harmonic[idx, valid[matches]] = numbers[matches]
+    return base, harmonic
+
+
+def synthesize_harmonics_batch(freqs, level, phase, dur, fs, backend='time', harmonic_tol=1e-6):
+    """ Synthesizes the sum of sinusoidal components for many tones at once
+
+    All tones share a single time axis and are synthesized into one (n_stim, n_sample) array. Two backends are
+    available. The 'time' backend evaluates each component index for every tone in the batch at once via
+    broadcasting, so the number of Python-level iterations scales with the number of components rather than with the
+    number of components times the number of tones. The 'fft' backend instead treats the components of each tone that
+    are harmonics of a common fundamental (see harmonic_series) as the coefficients of a polynomial in
+    exp(2j*pi*F0*t), and evaluates that polynomial at every sample with a single chirp z-transform per tone (i.e., an
+    FFT-based Bluestein transform), so its cost does not grow with the number of components. This works for any F0,
+    not only F0s that complete an integer number of cycles over the stimulus. Components that are not harmonics of
+    the fundamental are synthesized in the time domain as in the 'time' backend.
+
+    Args:
+        freqs (ndarray): array of frequencies in Hz of shape (n_stim, n_component), padded with NaN where a tone has
+            fewer than n_component components
+        level (ndarray): array of levels in dB SPL of shape (n_stim, n_component)
+        phase (ndarray): array of phase offsets in degrees of shape (n_stim, n_component)
+        dur (float): duration in seconds
+        fs (int): sampling rate in Hz
+        backend (str): either 'time' or 'fft', indicates how components are synthesized
+        harmonic_tol (float): tolerance passed to harmonic_series() to decide which components are synthesized by the
+            chirp z-transform in the 'fft' backend
+
+    Returns:
+        signals (ndarray): array of tones of shape (n_stim, n_sample)
+    """
+    if backend not in ['time', 'fft']:
+        raise ValueError('backend is not recognized')
+    # Create shared time axis and output array
+    t = np.linspace(0, dur, int(dur*fs))
+    signals = np.zeros((freqs.shape[0], len(t)))
+    # Determine which components are synthesized in the time domain
+    if backend == 'fft':
+        base, harmonic = harmonic_series(freqs, dur, harmonic_tol)
+        # Tones whose components only share a very low fundamental (e.g., inharmonic tones) gain nothing from the
+        # chirp z-transform, so synthesize them in the time domain
+        harmonic[np.max(harmonic, axis=1) > len(t)] = 0
+    else:
+        harmonic = np.zeros(freqs.shape, dtype=int)
+    # Loop through component indices and synthesize that component of every tone at once
+    for idx_component in range(freqs.shape[1]):
+        rows = np.flatnonzero(~np.isnan(freqs[:, idx_component]) & (harmonic[:, idx_component] == 0))
+        if len(rows) == 0:
+            continue
+        tones = np.sin(2*np.pi*freqs[rows, idx_component, None]*t + 2*np.pi*phase[rows, idx_component, None]/360)
+        # Scale each component to its level in dB SPL (equivalent to sg.scale_dbspl applied to each row)
+        rms = np.sqrt(np.mean(tones**2, axis=1))
+        signals[rows] += tones * (20e-6 * 10**(level[rows, idx_component]/20) / rms)[:, None]
+    # Synthesize the harmonic components of each tone with one chirp z-transform
+    for idx in np.flatnonzero(np.any(harmonic > 0, axis=1)):
+        cols = np.flatnonzero(harmonic[idx] > 0)
+        step = 2*np.pi*freqs[idx, cols]*(t[1] - t[0])  # phase advance per sample of each component
+        offset = 2*np.pi*phase[idx, cols]/360
+        # Mean of sin(step*k + offset)**2 over the samples (in closed form), so that each component is scaled by its
+        # actual RMS over the stimulus, exactly as in the time domain
+        ratio = np.exp(2j*step)
+        near_one = np.abs(1 - ratio) < 1e-12
+        geometric = np.where(near_one, len(t), (1 - ratio**len(t)) / np.where(near_one, 1, 1 - ratio))
+        mean_square = 0.5 - 0.5*np.real(np.exp(2j*offset)*geometric)/len(t)
+        amplitudes = 20e-6 * 10**(level[idx, cols]/20) / np.sqrt(mean_square)
+        coefficients = np.zeros(np.max(harmonic[idx]) + 1, dtype=complex)
+        np.add.at(coefficients, harmonic[idx, cols], amplitudes*np.exp(1j*offset))
+        signals[idx] += np.imag(czt(coefficients, len(t), np.exp(2j*np.pi*base[idx]*(t[1] - t[0])), 1))
+    return signals
+
+
+def complex_tone(freqs, level, phase, dur, fs, backend='time'):
+    """ Synthesizes a complex tone using either sg.complex_tone() or the FFT backend of synthesize_harmonics_batch()
+
+    Args:
+        freqs (ndarray): array of frequencies in Hz of shape (n_component, )
+        level (ndarray): array of levels in dB SPL of shape (n_component, )
+        phase (ndarray): array of phase offsets in degrees of shape (n_component, )
+        dur (float): duration in seconds
+        fs (int): sampling rate in Hz
+        backend (str): either 'time' or 'fft', see synthesize_harmonics_batch()
+
+    Returns:
+        signal (ndarray): complex tone of shape (n_sample, )
+    """
+    if backend == 'time':
+        return sg.complex_tone(freqs, level, phase, dur, fs)
+    return synthesize_harmonics_batch(np.asarray(freqs, dtype=float)[None, :], np.asarray(level, dtype=float)[None, :],
+                                      np.asarray(phase, dtype=float)[None, :], dur, fs, backend)[0]
+
+
+def synthesize_complex_tone_batch(freqs, level, level_noise, phase, dur, fs, dur_ramp, sos, ten, backend='time'):
+    """ Batched version of synthesize_complex_tone() that synthesizes many complex tones at once
+
+    Args:
+        freqs (ndarray): array of frequencies in Hz of shape (n_stim, n_component), padded with NaN where a tone has
+            fewer than n_component components
+        level (ndarray): array of levels in dB SPL of shape (n_stim, n_component)
+        level_noise (float, ndarray): level of the TEN in dB SPL, either a float or an array of shape (n_stim, )
+        phase (ndarray): array of phase offsets in degrees of shape (n_stim, n_component)
+        dur (float): duration in seconds
+        fs (int): sampling rate in Hz
+        dur_ramp (float): duration of raised-cosine ramp in seconds
+        sos (list, None): list of length n_stim of second-order sections used to filter each tone, or None to skip
+            filtering
+        ten (bool, ndarray): whether or not to include threshold-equalizing masking noise, either a bool or an array
+            of shape (n_stim, )
+        backend (str): either 'time' or 'fft', see synthesize_harmonics_batch()
+
+    Returns:
+        signals (ndarray): array of complex tone stimuli of shape (n_stim, n_sample)
+    """
+    # Synthesize components
+    signals = synthesize_harmonics_batch(freqs, level, phase, dur, fs, backend)
+    # Filter each tone
+    if sos is not None:
+        signals = sosfiltfilt_batch(sos, signals)
+    # Ramp every tone with a shared ramp envelope
+    signals *= sg.cosine_ramp(np.ones(signals.shape[1]), dur_ramp, fs)
+    # Synthesize noise
+    ten = np.broadcast_to(ten, signals.shape[0])
+    level_noise = np.broadcast_to(level_noise, signals.shape[0])
+    for idx in np.flatnonzero(ten):
+        signals[idx] += sg.cosine_ramp(sg.te_noise(dur, fs, 0, fs / 2, level_noise[idx]), dur_ramp, fs)
+    return signals
+
+
+class ISOToneGuest2021(BatchSynthesizerGuest2021):
     """ Synthesizes the ISO stimulus in Guest and Oxenham (2021).
 
     This is the Experiment 1b version of the stimulus from Guest and Oxenham (2021).
     """
-    def __init__(self):
+    def __init__(self, backend='time'):
         super().__init__(stimulus_name='ISO Tone')
+        self.backend = backend
 
     def synthesize(self, F0, dur=0.350, dur_ramp=0.02, level=None, phase=None, fs=int(48e3), ten=False, level_noise=0,
                    **kwargs):
@@ -236,23 +633,47 @@ class ISOToneGuest2021(sy.Synthesizer):
             output (array): complex tone stimulus
         """
         # Set up bandpass filter
-        sos = butter(N=6, Wn=[F0 * 5.5 / (fs * 0.5), F0 * 10.5 / (fs * 0.5)], btype="band",
-                     output="sos")
+        sos = bandpass_sos(F0, fs, 5.5, 10.5)
         # Create array of frequencies, levels, and phases
         freqs = np.arange(F0, 48000 / 2, F0)  # up to Nyquist for fs=48
         level = parse_level(freqs, level)
         phase = parse_phase(freqs, phase)
         # Synthesize stimulus
-        signal = synthesize_complex_tone(freqs, level, level_noise, phase, dur, fs, dur_ramp, sos, ten)
+        signal = synthesize_complex_tone(freqs, level, level_noise, phase, dur, fs, dur_ramp, sos, ten, self.backend)
         return signal
 
+    def synthesize_batch(self, elements, dur, dur_ramp, fs):
+        """
+        Synthesizes a batch of ISO stimuli sharing the same duration, ramp duration, and sampling rate. See
+        synthesize() for a description of each parameter.
+
+        Args:
+            elements (list): list of parameter dicts, each containing the arguments of synthesize()
+            dur (float): duration in seconds
+            dur_ramp (float): duration of raised-cosine ramp in seconds
+            fs (int): sampling rate in Hz
+
+        Returns:
+            output (ndarray): complex tone stimuli of shape (n_stim, n_sample)
+        """
+        F0s = np.array([ele['F0'] for ele in elements])
+        # Set up bandpass filters
+        sos = [bandpass_sos(F0, fs, 5.5, 10.5) for F0 in F0s]
+        # Create arrays of frequencies, levels, and phases
+        freqs, level, phase = parse_harmonic_batch(F0s, [ele['level'] for ele in elements],
+                                                   [ele['phase'] for ele in elements])
+        # Synthesize stimuli
+        return synthesize_complex_tone_batch(freqs, level, [ele['level_noise'] for ele in elements], phase, dur, fs,
+                                             dur_ramp, sos, [ele['ten'] for ele in elements], self.backend)
+
 
-class GEOMToneGuest2021(sy.Synthesizer):
+class GEOMToneGuest2021(BatchSynthesizerGuest2021):
     """
     Synthesizes the GEOM stimulus in Guest and Oxenham (2021).
     """
-    def __init__(self):
+    def __init__(self, backend='time'):
         super().__init__(stimulus_name='GEOM Tone')
+        self.backend = backend
 
     def synthesize(self, F0, F0_masker, dur=0.350, dur_ramp=0.02, level=None, phase=None, level_masker=None,
                    phase_masker=None, ten=False, level_noise=0, fs=int(48e3), **kwargs):
@@ -287,33 +708,65 @@ class GEOMToneGuest2021(sy.Synthesizer):
             output (array): complex tone stimulus
         """
         # Set up bandpass filter for the target
-        sos = butter(N=6, Wn=[F0 * 5.5 / (fs * 0.5), F0 * 10.5 / (fs * 0.5)], btype="band",
-                     output="sos")
+        sos = bandpass_sos(F0, fs, 5.5, 10.5)
         # Set up the bandpass filter for the masker
-        sos_masker = butter(N=6, Wn=[F0 * 4 / (fs * 0.5), F0 * 12 / (fs * 0.5)], btype="band",
-                     output="sos")
+        sos_masker = bandpass_sos(F0, fs, 4, 12)
         # Create array of frequencies, levels, and phases
         freqs = np.arange(F0, 48000 / 2, F0)  # up to Nyquist for fs=48
         level = parse_level(freqs, level)
         phase = parse_phase(freqs, phase)
         # Synthesize the target signal (without TEN, because we add TEN only at the final step)
-        signal = synthesize_complex_tone(freqs, level, level_noise, phase, dur, fs, dur_ramp, sos, ten=False)
+        signal = synthesize_complex_tone(freqs, level, level_noise, phase, dur, fs, dur_ramp, sos, ten=False,
+                                         backend=self.backend)
         # Create array of frequencies, levels, and phases for the masker
         freqs_masker = np.arange(F0_masker, 48000 / 2, F0_masker)  # up to Nyquist for fs=48
         level_masker = parse_level(freqs_masker, level_masker)
         phase_masker = parse_phase(freqs_masker, phase_masker)
         # Synthesize the masker signal and add it to the target signal (with TEN, if requested)
         signal += synthesize_complex_tone(freqs_masker, level_masker, level_noise, phase_masker, dur, fs, dur_ramp,
-                                          sos_masker, ten)
+                                          sos_masker, ten, self.backend)
         return signal
 
+    def synthesize_batch(self, elements, dur, dur_ramp, fs):
+        """
+        Synthesizes a batch of GEOM stimuli sharing the same duration, ramp duration, and sampling rate. See
+        synthesize() for a description of each parameter.
+
+        Args:
+            elements (list): list of parameter dicts, each containing the arguments of synthesize()
+            dur (float): duration in seconds
+            dur_ramp (float): duration of raised-cosine ramp in seconds
+            fs (int): sampling rate in Hz
+
+        Returns:
+            output (ndarray): complex tone stimuli of shape (n_stim, n_sample)
+        """
+        F0s = np.array([ele['F0'] for ele in elements])
+        level_noise = [ele['level_noise'] for ele in elements]
+        # Set up bandpass filters for the targets and the maskers
+        sos = [bandpass_sos(F0, fs, 5.5, 10.5) for F0 in F0s]
+        sos_masker = [bandpass_sos(F0, fs, 4, 12) for F0 in F0s]
+        # Synthesize the target signals (without TEN, because we add TEN only at the final step)
+        freqs, level, phase = parse_harmonic_batch(F0s, [ele['level'] for ele in elements],
+                                                   [ele['phase'] for ele in elements])
+        signals = synthesize_complex_tone_batch(freqs, level, level_noise, phase, dur, fs, dur_ramp, sos, ten=False,
+                                                backend=self.backend)
+        # Synthesize the masker signals and add them to the target signals (with TEN, if requested)
+        freqs, level, phase = parse_harmonic_batch(np.array([ele['F0_masker'] for ele in elements]),
+                                                   [ele['level_masker'] for ele in elements],
+                                                   [ele['phase_masker'] for ele in elements])
+        signals += synthesize_complex_tone_batch(freqs, level, level_noise, phase, dur, fs, dur_ramp, sos_masker,
+                                                 [ele['ten'] for ele in elements], self.backend)
+        return signals
+
 
-class DBLToneGuest2021(sy.Synthesizer):
+class DBLToneGuest2021(BatchSynthesizerGuest2021):
     """
     Synthesizes the DBL stimulus in Guest and Oxenham (2021).
     """
-    def __init__(self):
+    def __init__(self, backend='time'):
         super().__init__(stimulus_name='DBL Tone')
+        self.backend = backend
 
     def synthesize(self, F0, F0_masker_1, F0_masker_2, dur=0.350, dur_ramp=0.02, level=None, phase=None,
                    level_masker_1=None, phase_masker_1=None, level_masker_2=None, phase_masker_2=None, ten=False,
@@ -352,33 +805,70 @@ class DBLToneGuest2021(sy.Synthesizer):
             output (array): complex tone stimulus
         """
         # Set up bandpass filter for the target
-        sos = butter(N=6, Wn=[F0 * 5.5 / (fs * 0.5), F0 * 10.5 / (fs * 0.5)], btype="band",
-                     output="sos")
+        sos = bandpass_sos(F0, fs, 5.5, 10.5)
         # Set up the bandpass filter for the masker
-        sos_masker = butter(N=6, Wn=[F0 * 4 / (fs * 0.5), F0 * 12 / (fs * 0.5)], btype="band",
-                     output="sos")
+        sos_masker = bandpass_sos(F0, fs, 4, 12)
         # Create array of frequencies, levels, and phases
         freqs = np.arange(F0, 48000 / 2, F0)  # up to Nyquist for fs=48
         level = parse_level(freqs, level)
         phase = parse_phase(freqs, phase)
         # Synthesize the target signal (without TEN, because we add TEN only at the final step)
-        signal = synthesize_complex_tone(freqs, level, level_noise, phase, dur, fs, dur_ramp, sos, ten=False)
+        signal = synthesize_complex_tone(freqs, level, level_noise, phase, dur, fs, dur_ramp, sos, ten=False,
+                                         backend=self.backend)
         # Create array of frequencies, levels, and phases for the masker
         freqs_masker = np.arange(F0_masker_1, 48000 / 2, F0_masker_1)  # up to Nyquist for fs=48
         level_masker = parse_level(freqs_masker, level_masker_1)
         phase_masker = parse_phase(freqs_masker, phase_masker_1)
         # Synthesize the masker signal and add it to the target signal (again without TEN)
         signal += synthesize_complex_tone(freqs_masker, level_masker, level_noise, phase_masker, dur, fs, dur_ramp,
-                                          sos_masker, ten=False)
+                                          sos_masker, ten=False, backend=self.backend)
         # Create array of frequencies, levels, and phases for the masker
         freqs_masker = np.arange(F0_masker_2, 48000 / 2, F0_masker_2)  # up to Nyquist for fs=48
         level_masker = parse_level(freqs_masker, level_masker_2)
         phase_masker = parse_phase(freqs_masker, phase_masker_2)
         # Synthesize the masker signal and add it to the target signal (finally with TEN, if requested)
         signal += synthesize_complex_tone(freqs_masker, level_masker, level_noise, phase_masker, dur, fs, dur_ramp,
-                                          sos_masker, ten=True)
+                                          sos_masker, ten=True, backend=self.backend)
         return signal
 
+    def synthesize_batch(self, elements, dur, dur_ramp, fs):
+        """
+        Synthesizes a batch of DBL stimuli sharing the same duration, ramp duration, and sampling rate. See
+        synthesize() for a description of each parameter.
+
+        Args:
+            elements (list): list of parameter dicts, each containing the arguments of synthesize()
+            dur (float): duration in seconds
+            dur_ramp (float): duration of raised-cosine ramp in seconds
+            fs (int): sampling rate in Hz
+
+        Returns:
+            output (ndarray): complex tone stimuli of shape (n_stim, n_sample)
+        """
+        F0s = np.array([ele['F0'] for ele in elements])
+        level_noise = [ele['level_noise'] for ele in elements]
+        # Set up bandpass filters for the targets and the maskers
+        sos = [bandpass_sos(F0, fs, 5.5, 10.5) for F0 in F0s]
+        sos_masker = [bandpass_sos(F0, fs, 4, 12) for F0 in F0s]
+        # Synthesize the target signals (without TEN, because we add TEN only at the final step)
+        freqs, level, phase = parse_harmonic_batch(F0s, [ele['level'] for ele in elements],
+                                                   [ele['phase'] for ele in elements])
+        signals = synthesize_complex_tone_batch(freqs, level, level_noise, phase, dur, fs, dur_ramp, sos, ten=False,
+                                                backend=self.backend)
+        # Synthesize the first masker signals and add them to the target signals (again without TEN)
+        freqs, level, phase = parse_harmonic_batch(np.array([ele['F0_masker_1'] for ele in elements]),
+                                                   [ele['level_masker_1'] for ele in elements],
+                                                   [ele['phase_masker_1'] for ele in elements])
+        signals += synthesize_complex_tone_batch(freqs, level, level_noise, phase, dur, fs, dur_ramp, sos_masker,
+                                                 ten=False, backend=self.backend)
+        # Synthesize the second masker signals and add them to the target signals (finally with TEN, if requested)
+        freqs, level, phase = parse_harmonic_batch(np.array([ele['F0_masker_2'] for ele in elements]),
+                                                   [ele['level_masker_2'] for ele in elements],
+                                                   [ele['phase_masker_2'] for ele in elements])
+        signals += synthesize_complex_tone_batch(freqs, level, level_noise, phase, dur, fs, dur_ramp, sos_masker,
+                                                 ten=True, backend=self.backend)
+        return signals
+
 
 class ComplexToneCedolin2005(sy.Synthesizer):
     """
@@ -449,11 +939,65 @@ class ComplexToneLarsen2008(sy.Synthesizer):
         return target_1
 
 
+# Absolute thresholds (dB SPL) of each auditory nerve model at a range of CFs, as estimated in
+# nofigure/absolute_thresholds. These are only used if the outputs of that script are not on disk.
+ABSOLUTE_THRESHOLDS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'nofigure',
+                                        'absolute_thresholds')
+ABSOLUTE_THRESHOLD_CFS = 10**np.linspace(np.log10(200), np.log10(20000), 25)
+ABSOLUTE_THRESHOLDS = {
+    'Heinz2001': np.array([11.75338957, 11.62867281, 11.68923837, 11.69510857, 11.71673396,
+                           11.78947423, 11.90428429, 12.0764798, 12.35406782, 12.76388996,
+                           13.21929098, 13.82237866, 14.72409746, 15.62127449, 16.58383025,
+                           17.33935012, 17.71101781, 17.87225817, 17.92201393, 17.9330261,
+                           17.93559906, 17.93581972, 17.93615349, 17.93697896, 17.93698821]),
+    'Zilany2014': np.array([24.16215997, 21.78254856, 19.98826118, 17.76583852, 15.53689047,
+                            13.21213245, 11.06027241, 9.33326088, 8.29574625, 7.81458668,
+                            7.72554453, 8.32412585, 10.78823985, 10.72308501, 8.244502,
+                            5.5022836, 2.76210577, 0.45029163, -0.36206515, 0.55300722,
+                            4.58129414, 8.37939556, 11.9621168, 15.44527991, 18.74309845]),
+    'Verhulst2018': np.array([21.87167926, 20.07611191, 19.04426302, 17.29593544, 15.99061908,
+                              15.75462616, 15.60087287, 15.4184775, 16.27429258, 17.40108221,
+                              18.12974557, 20.05392103, 20.87753392, 22.65084918, 23.85382262,
+                              25.55748375, 26.88444276, 28.2902204, 29.30248888, 32.05847776,
+                              33.5721896, 33.88356551, 36.15362977, 40., 40.]),
+}
+
+# Registry of level adjustments (cubic interpolants of absolute threshold as a function of log10 frequency) for each
+# model, along with the modification times of the files from which each was loaded
+_level_adjustments = {}
+
+
+def get_level_adjustment(model_name):
+    """
+    Returns a function that maps log10 frequency to the absolute threshold of an auditory nerve model. Absolute
+    thresholds are loaded from nofigure/absolute_thresholds/<model_name>.npy and cfs.npy if both files exist (and
+    from ABSOLUTE_THRESHOLDS otherwise). The interpolant is built once and reused until either file changes.
+
+    Parameters:
+        model_name (str): either 'Heinz2001', 'Zilany2014', or 'Verhulst2018'
+    """
+    if model_name not in ABSOLUTE_THRESHOLDS:
+        raise ValueError('model type is not recognize')
+    filenames = [os.path.join(ABSOLUTE_THRESHOLDS_PATH, 'cfs.npy'),
+                 os.path.join(ABSOLUTE_THRESHOLDS_PATH, model_name + '.npy')]
+    try:
+        stamp = tuple([os.stat(filename).st_mtime_ns for filename in filenames])
+    except OSError:
+        stamp = None
+    if model_name not in _level_adjustments or _level_adjustments[model_name][0] != stamp:
+        if stamp is None:
+            cfs, absolute_thresholds = ABSOLUTE_THRESHOLD_CFS, ABSOLUTE_THRESHOLDS[model_name]
+        else:
+            cfs, absolute_thresholds = [np.load(filename) for filename in filenames]
+        _level_adjustments[model_name] = (stamp, interp1d(np.log10(cfs), absolute_thresholds, kind='cubic'))
+    return _level_adjustments[model_name][1]
+
+
 def adjust_level(freq, level, model_name):
     """
     Accepts an input level in dB SPL and returns an adjusted level for the corresponding auditory nerve model.
     Adjustments are made based on estimates of absolute threshold for each nerve model made in
-    nofigure/absolute_thresholds.
+    nofigure/absolute_thresholds (see get_level_adjustment).
 
     Parameters:
         freq (float, ndarray): frequency at which the absolute threshold is estimated and used to adjust the level, in
@@ -462,48 +1006,64 @@ def adjust_level(freq, level, model_name):
         model_name (str): either 'Heinz2001', 'Zilany2014', or 'Verhulst2018', indicates which model's absolute
             thresholds should be used in the adjustment
     """
-    # Branch based on model
-    if model_name == 'Heinz2001':
-        cfs = np.array([200., 242.30553173, 293.55985352, 355.65588201,
-                        430.88693801, 522.03144314, 632.45553203, 766.23736991,
-                        928.31776672, 1124.68265038, 1362.58413812, 1650.80837054,
-                        2000., 2423.05531726, 2935.59853524, 3556.55882008,
-                        4308.86938006, 5220.31443137, 6324.55532034, 7662.37369911,
-                        9283.17766723, 11246.82650381, 13625.84138116, 16508.08370536,
-                        20000.])
-        absolute_thresholds = np.array([11.75338957, 11.62867281, 11.68923837, 11.69510857, 11.71673396,
-                                        11.78947423, 11.90428429, 12.0764798, 12.35406782, 12.76388996,
-                                        13.21929098, 13.82237866, 14.72409746, 15.62127449, 16.58383025,
-                                        17.33935012, 17.71101781, 17.87225817, 17.92201393, 17.9330261,
-                                        17.93559906, 17.93581972, 17.93615349, 17.93697896, 17.93698821])
-    elif model_name == 'Zilany2014':
-        cfs = np.array([200., 242.30553173, 293.55985352, 355.65588201,
-                        430.88693801, 522.03144314, 632.45553203, 766.23736991,
-                        928.31776672, 1124.68265038, 1362.58413812, 1650.80837054,
-                        2000., 2423.05531726, 2935.59853524, 3556.55882008,
-                        4308.86938006, 5220.31443137, 6324.55532034, 7662.37369911,
-                        9283.17766723, 11246.82650381, 13625.84138116, 16508.08370536,
-                        20000.])
-        absolute_thresholds = np.array([24.16215997, 21.78254856, 19.98826118, 17.76583852, 15.53689047,
-                                        13.21213245, 11.06027241, 9.33326088, 8.29574625, 7.81458668,
-                                        7.72554453, 8.32412585, 10.78823985, 10.72308501, 8.244502,
-                                        5.5022836, 2.76210577, 0.45029163, -0.36206515, 0.55300722,
-                                        4.58129414, 8.37939556, 11.9621168, 15.44527991, 18.74309845])
-    elif model_name == 'Verhulst2018':
-        cfs = np.array([200., 242.30553173, 293.55985352, 355.65588201,
-                        430.88693801, 522.03144314, 632.45553203, 766.23736991,
-                        928.31776672, 1124.68265038, 1362.58413812, 1650.80837054,
-                        2000., 2423.05531726, 2935.59853524, 3556.55882008,
-                        4308.86938006, 5220.31443137, 6324.55532034, 7662.37369911,
-                        9283.17766723, 11246.82650381, 13625.84138116, 16508.08370536,
-                        20000.])
-        absolute_thresholds = np.array([21.87167926, 20.07611191, 19.04426302, 17.29593544, 15.99061908,
-                                        15.75462616, 15.60087287, 15.4184775, 16.27429258, 17.40108221,
-                                        18.12974557, 20.05392103, 20.87753392, 22.65084918, 23.85382262,
-                                        25.55748375, 26.88444276, 28.2902204, 29.30248888, 32.05847776,
-                                        33.5721896, 33.88356551, 36.15362977, 40., 40.])
-    else:
-        raise ValueError('model type is not recognize')
-    # Calculate correction and return
-    adjustment = interp1d(np.log10(cfs), absolute_thresholds, kind='cubic')
-    return level + adjustment(np.log10(freq))
+    return level + get_level_adjustment(model_name)(np.log10(freq))
+
+
+def condition_seed(ele, key, *salt):
+    """
+    Returns a seed for np.random.default_rng() derived from the values of some parameters of a condition. The seed is
+    stable across runs, processes, and platforms (unlike Python's hash()).
+
+    Parameters:
+        ele (dict): parameter dict
+        key (list, tuple): names of the parameters that identify the condition
+        *salt: additional values mixed into the seed, e.g., the name of the parameter being drawn
+    """
+    hasher = hashlib.sha1()
+    for name in key:
+        hash_value(hasher, name)
+        hash_value(hasher, ele[name])
+    for value in salt:
+        hash_value(hasher, value)
+    return int(hasher.hexdigest()[:16], 16)
+
+
+def latin_hypercube_uniform(low, high, size=1):
+    """
+    Returns a draw function for common_random_draws() that samples each of size independent uniform variables on
+    [low, high) with one sample from each of n_rep equal-width strata across the repeats of a condition (i.e., Latin
+    hypercube sampling). Averages over repeats then vary much less from run to run than with independent draws.
+
+    Parameters:
+        low (float): lower bound of the uniform distribution
+        high (float): upper bound of the uniform distribution
+        size (int): number of variables drawn per repeat (e.g., one phase per component)
+    """
+    def draw(rng, n_rep):
+        strata = np.stack([rng.permutation(n_rep) for _ in range(size)], axis=1)
+        return low + (high - low) * (strata + rng.uniform(size=(n_rep, size))) / n_rep
+    return draw
+
+
+def common_random_draws(params, name, draw, key=(), seed=0):
+    """
+    Draws a random value of a parameter for each repeat of each condition from an explicit np.random.Generator, rather
+    than from the global NumPy RNG. The generator of each condition is seeded from the values of the parameters in key
+    (along with name and seed), so reruns are bit-identical and conditions that share the values of key (e.g., every
+    F0 if key is empty) share the same draws, which reduces the variance of comparisons between them. Must be called
+    after params.repeat() and before params.increment() so that the baseline and incremented stimuli of each trial
+    share the same draw.
+
+    Parameters:
+        params (Parameters): flattened Parameters object after repeat(), in which each element is a list of repeats
+        name (str): name of the parameter to draw
+        draw (function): function that accepts an np.random.Generator and the number of repeats and returns an array
+            of values with one entry per repeat along the first axis, e.g., latin_hypercube_uniform(0, 360, 5)
+        key (list, tuple): names of the parameters that identify a condition for the purpose of seeding
+        seed (int): seed mixed into every condition's seed, which can be changed to get a new set of draws
+    """
+    for ele in params:
+        rng = np.random.default_rng(condition_seed(ele[0], key, name, seed))
+        values = draw(rng, len(ele))
+        for rep, value in zip(ele, values):
+            rep[name] = value
@@ -0,0 +1,250 @@
+"""
+The following functions compute "information curves", i.e., the Fisher information about a stimulus parameter carried
+by each channel of a simulated auditory nerve response, for all-information (AI) and rate-place (RP) ideal observers.
+"""
+from contextlib import nullcontext
+import os
+import shutil
+import tempfile
+import uuid
+import apcmodels.decode as dc
+import numpy as np
+from util.precision import get_precision, to_precision
+
+
+def get_information_curves(ratefunc, dtype=None, block_size=2**14, spill=False):
+    """ Returns a runfunc that simulates responses and computes AI and RP information curves from them
+
+    Args:
+        ratefunc (function): function that accepts a parameter dict and returns a firing-rate simulation, e.g.,
+            AuditoryNerveZilany2014().simulate. If ratefunc returns memory-mapped arrays (e.g., if it is a
+            CachedSimulation from util.cache), the responses are read from disk one time block at a time.
+        dtype (type, None): floating-point type used for intermediate arrays in InformationAccumulator, defaults to
+            the working precision (see util/precision.py)
+        block_size (int, None): number of samples per time block, or None to process whole responses at once
+        spill (bool): if True, each response is written to a temporary file on disk as soon as it has been simulated
+            and read back one time block at a time (see SpilledRates), so that only one full response is in memory
+            at once. The files are deleted once the condition has been decoded.
+
+    Returns:
+        inner (function): function that accepts a list of parameter dicts (baseline followed by increments) and returns
+            arrays of AI and RP partial derivative matrices
+    """
+    def inner(params):
+        # Pull parameters from encoded list/dict of parameters
+        fs = dc.find_parameter(params, 'fs')
+        delta_theta = dc.find_parameter(params, 'delta_theta')
+
+        with SpilledRates(ratefunc) if spill else nullcontext(ratefunc) as spilled:
+            # Run ratefunc on kwargs and get firing rates for each input
+            rates = dc.run_rates_util(spilled, params)
+
+            # Check to see if the elements of rates are ndarrays or lists... if they are not lists, we need to put
+            # rates inside a list so it can be processed by the list comprehension below
+            if type(rates[0]) is not list:
+                rates = [rates]
+
+            # Compute partial derivative matrices for rates for AI and RP in a single pass over each response
+            accumulators = [accumulate_information(iterate_time_blocks(x, block_size), fs, delta_theta, dtype)
+                            for x in rates]
+        pdms_AI = np.array([accumulator.deriv_matrix_AI() for accumulator in accumulators])
+        pdms_RP = np.array([accumulator.deriv_matrix_RP() for accumulator in accumulators])
+
+        return pdms_AI, pdms_RP
+
+    return inner
+
+
+class SpilledRates:
+    """ Wraps a ratefunc so that each response is written to a temporary file on disk as soon as it has been simulated
+    and returned as a read-only memory map
+
+    Used as a context manager, which creates the temporary directory on entry and deletes it (and every response in it)
+    on exit, so the disk space used is bounded by the responses of a single condition.
+    """
+    def __init__(self, ratefunc, path=os.path.join('.cache', 'rates')):
+        """
+        Arguments:
+            ratefunc (function): function that accepts a parameter dict and returns a firing-rate simulation
+            path (str): directory in which to create the temporary directory (on disk rather than in /dev/shm, so that
+                the responses do not occupy memory)
+        """
+        self.ratefunc = ratefunc
+        self.path = path
+        self.directory = None
+
+    def __enter__(self):
+        os.makedirs(self.path, exist_ok=True)
+        self.directory = tempfile.mkdtemp(prefix='rates-', dir=self.path)
+        return self
+
+    def __exit__(self, *args):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __call__(self, params):
+        filename = os.path.join(self.directory, uuid.uuid4().hex + '.npy')
+        np.save(filename, np.asarray(to_precision(self.ratefunc(params))))
+        return np.load(filename, mmap_mode='r')
+
+
+class InformationAccumulator:
+    """ Accumulates AI and RP partial derivative matrices over consecutive time blocks of baseline and incremented
+    firing-rate simulations
+
+    The AI partial derivative matrix is an integral over time of products of normalized derivatives, and the RP partial
+    derivative matrix only depends on average rates, so both can be built up one block at a time. This means that the
+    full responses never need to be in memory at once, as long as they are read from disk (e.g., with SpilledRates or
+    CachedSimulation from util/cache.py) or streamed. Within each block, normalized derivatives are formed one
+    parameter at a time in preallocated buffers, so only a few n_channel x n_block arrays are allocated no matter how
+    many parameters are incremented.
+    """
+    def __init__(self, n_channel, fs, delta_theta, dtype=None):
+        """
+        Arguments:
+            n_channel (int): number of channels in each simulation
+            fs (int): sampling rate in Hz
+            delta_theta (ndarray): 1d ndarray containing the increment size for each incremented simulation
+            dtype (type, None): floating-point type used for intermediate arrays, e.g., np.float32 to halve memory use,
+                defaults to the working precision (see util/precision.py). Sums over time are always accumulated in
+                double precision.
+        """
+        self.fs = fs
+        self.delta_theta = np.atleast_1d(np.asarray(delta_theta, dtype=np.float64))
+        self.n_param = len(self.delta_theta)
+        self.dtype = get_precision() if dtype is None else dtype
+        self.n_sample = 0
+        self.sum_products = np.zeros((n_channel, self.n_param, self.n_param))
+        self.sum_rates = np.zeros((n_channel, self.n_param + 1))
+        self._buffers = None
+
+    def update(self, block):
+        """ Adds one time block to the running sums
+
+        Args:
+            block (list): list of ndarrays in shape (n_channel x n_block), the first from the baseline simulation and
+                the following from the incremented simulations, all covering the same samples
+        """
+        if len(block) != self.n_param + 1:
+            raise ValueError('Expected ' + str(self.n_param + 1) + ' simulations per block but received ' +
+                             str(len(block)) + '!')
+        n_block = block[0].shape[1]
+        # Reuse scratch buffers across blocks of the same size
+        if self._buffers is None or self._buffers[0].shape[1] != n_block:
+            self._buffers = [np.empty((block[0].shape[0], n_block), dtype=self.dtype) for _ in range(3)]
+        scale, deriv_i, deriv_j = self._buffers
+        # Add small baseline firing rate to avoid issues with zeros and NaNs (this cancels out of the differences) and
+        # precompute 1/sqrt(rate) in place, which normalizes the derivatives
+        np.add(block[0], 1, out=scale, casting='unsafe')
+        np.sqrt(scale, out=scale)
+        np.reciprocal(scale, out=scale)
+
+        def normalized_derivative(idx, out):
+            # Estimate derivative with respect to one parameter and normalize by the square root of rate
+            np.subtract(block[idx+1], block[0], out=out, casting='unsafe')
+            out *= scale
+            out /= self.delta_theta[idx]
+            return out
+
+        # Integrate products of derivatives over time for each pair of parameters
+        for idx_i in range(self.n_param):
+            normalized_derivative(idx_i, deriv_i)
+            self.sum_products[:, idx_i, idx_i] += np.einsum('ct,ct->c', deriv_i, deriv_i, dtype=np.float64)
+            for idx_j in range(idx_i):
+                normalized_derivative(idx_j, deriv_j)
+                product = np.einsum('ct,ct->c', deriv_i, deriv_j, dtype=np.float64)
+                self.sum_products[:, idx_i, idx_j] += product
+                self.sum_products[:, idx_j, idx_i] += product
+        # Keep running sums of rates for RP
+        for idx, ele in enumerate(block):
+            self.sum_rates[:, idx] += np.sum(ele, axis=1, dtype=np.float64)
+        self.n_sample += n_block
+
+    def deriv_matrix_AI(self):
+        """ Returns the AI partial derivative matrices in shape (n_channel x n_param x n_param) """
+        return self.sum_products / self.fs
+
+    def deriv_matrix_RP(self):
+        """ Returns the RP partial derivative matrices in shape (n_channel x n_param x n_param) """
+        # Average results across time and add small baseline firing rate to avoid issues with zeros and NaNs
+        rates = self.sum_rates / self.n_sample + 1
+        baseline = rates[:, 0]
+        incremented = rates[:, 1:]  # shape: n_CF x n_param
+        # Estimate derivative with respect to each parameter
+        deriv_estimate = (incremented - baseline[:, np.newaxis]) / self.delta_theta
+        # Normalize the derivatives by the square root of rate
+        deriv_norm = np.sqrt(1 / baseline)[:, np.newaxis] * deriv_estimate  # shape: n_CF x n_param
+        # Compute derivative matrix (the factor of two reproduces the original implementation, which stacked two
+        # copies of deriv_norm before taking the outer product)
+        return 2 * np.einsum('ci,cj->cij', deriv_norm, deriv_norm)  # shape: n_CF x n_param x n_param
+
+
+def iterate_time_blocks(x, block_size=2**14):
+    """ Yields consecutive time blocks of a list of simulations
+
+    Args:
+        x (list): list of ndarrays in shape (n_channel x n_sample), e.g., baseline and incremented simulations
+        block_size (int, None): number of samples per block, or None to yield the whole simulations as a single block
+
+    Yields:
+        block (list): list of views into each element of x covering the same samples
+    """
+    n_sample = x[0].shape[1]
+    block_size = n_sample if block_size is None else block_size
+    for start in range(0, n_sample, block_size):
+        yield [ele[:, start:(start+block_size)] for ele in x]
+
+
+def accumulate_information(blocks, fs, delta_theta, dtype=None):
+    """ Accumulates AI and RP partial derivative matrices from a stream of time blocks
+
+    Args:
+        blocks (iterable): iterable of lists of ndarrays in shape (n_channel x n_block), such as the output of
+            iterate_time_blocks or a generator that yields model output as it is produced
+        fs (int): sampling rate in Hz
+        delta_theta (float, ndarray): increment size for each incremented simulation, either a 1d ndarray or a scalar
+            shared by every incremented simulation
+        dtype (type, None): floating-point type used for intermediate arrays, defaults to the working precision
+
+    Returns:
+        accumulator (InformationAccumulator): accumulator containing the sums over every block
+    """
+    accumulator = None
+    for block in blocks:
+        if accumulator is None:
+            if len(block) < 2:
+                raise ValueError('There is only one simulation per condition --- ideal observer needs n_param + 1 '
+                                 'simulations!')
+            # Broadcast delta_theta to one increment per incremented simulation (e.g., a scalar shared by all of them)
+            delta_theta = np.broadcast_to(np.asarray(delta_theta, dtype=np.float64), (len(block) - 1,))
+            accumulator = InformationAccumulator(block[0].shape[0], fs, delta_theta, dtype)
+        accumulator.update(block)
+    return accumulator
+
+
+def compute_information_curve(x, fs, delta_theta, n_fiber_per_chan, _type, dtype=None, block_size=2**14):
+    """ Computes information curves
+
+    Args:
+        x (list): list of ndarrays containing firing-rate simulations in shape (n_channel x n_sample). The first
+            array should be a firing-rate simulation for baseline parameter values. The following arrays should
+            be firing-rate simulations where a single parameter has been incremented by a small amount.
+        fs (int): sampling rate in Hz
+        delta_theta (ndarray): 1d ndarray containing the increment size for each element of x after the first
+        n_fiber_per_chan (array): array containing integers of len n_cf, each element indicates how many fibers
+            are theoretically represented by the single corresponding channel in x
+        _type (str): either 'AI' or 'RP' for all-information or rate-place
+        dtype (type, None): floating-point type used for intermediate arrays, e.g., np.float32 to halve memory use,
+            defaults to the working precision (see util/precision.py)
+        block_size (int, None): number of samples per time block, or None to process whole simulations at once
+
+    Returns:
+        deriv_matrix (ndarray): partial derivative matrices in shape (n_channel x n_param x n_param)
+    """
+    if len(x) < 2:
+        raise ValueError('There is only one simulation per condition --- ideal observer needs n_param + 1 '
+                         'simulations!')
+    accumulator = accumulate_information(iterate_time_blocks(x, block_size), fs, delta_theta, dtype)
+    if _type == 'AI':
+        return accumulator.deriv_matrix_AI()
+    elif _type == 'RP':
+        return accumulator.deriv_matrix_RP()
@@ -0,0 +1,92 @@
+"""
+The following functions compute all-order interspike-interval (ISI) histograms, i.e., histograms of the intervals
+between every pair of spikes (not just adjacent spikes) in a spike train, up to a maximum interval. Counts are binned
+directly into a preallocated array, so memory use does not depend on the number of intervals. If numba is installed,
+a compiled loop is used; otherwise, intervals are computed one order (i.e., spike j - spike i for j = i + k) at a time
+with vectorized numpy operations.
+"""
+import numpy as np
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def all_order_isi_histogram(spike_trains, bins, range, unit=1, counts=None):
+    """ Computes an all-order ISI histogram pooled over one or more spike trains
+
+    Intervals are binned in the same way as np.histogram(intervals, bins=bins, range=range), i.e., bins are half-open
+    except for the last bin, which also includes the upper edge of the range.
+
+    Args:
+        spike_trains (list): list of 1d arrays of spike times
+        bins (int): number of equal-width bins
+        range (tuple): lower and upper edges of the histogram, in the same units as the intervals (see unit)
+        unit (float): intervals are divided by unit before binning, e.g., the period of the F0 to express intervals
+            in periods rather than seconds
+        counts (ndarray, None): array of shape (bins, ) to which counts are added, or None to start from zero
+
+    Returns:
+        counts (ndarray): array of interval counts in each bin, of shape (bins, )
+        edges (ndarray): array of bin edges, of shape (bins + 1, )
+    """
+    edges = np.linspace(range[0], range[1], bins + 1)
+    if counts is None:
+        counts = np.zeros(bins, dtype=np.int64)
+    for spike_times in spike_trains:
+        spike_times = np.sort(np.asarray(spike_times, dtype=np.float64))
+        if numba is not None:
+            _accumulate_compiled(spike_times, float(unit), edges, counts)
+        else:
+            _accumulate_vectorized(spike_times, unit, edges, counts)
+    return counts, edges
+
+
+def _bin_indices(intervals, edges):
+    """ Returns the index of the bin of each interval (which must lie within the edges), matching np.histogram """
+    n_bins = len(edges) - 1
+    indices = ((intervals - edges[0]) * (n_bins / (edges[-1] - edges[0]))).astype(np.intp)
+    indices[indices == n_bins] -= 1
+    # Correct for rounding errors in the computation above, as np.histogram does
+    indices[intervals < edges[indices]] -= 1
+    indices[(intervals >= edges[indices + 1]) & (indices != n_bins - 1)] += 1
+    return indices
+
+
+def _accumulate_vectorized(spike_times, unit, edges, counts):
+    """ Adds the all-order intervals of a sorted spike train to counts, one interval order at a time """
+    n_spike = len(spike_times)
+    if n_spike < 2:
+        return
+    # Find how many later spikes fall within the maximum interval of each spike, which bounds the interval order
+    window_ends = np.searchsorted(spike_times, spike_times + edges[-1] * unit, side='right')
+    max_order = np.max(window_ends - np.arange(n_spike)) - 1
+    for order in np.arange(1, min(max_order, n_spike - 1) + 1):
+        intervals = (spike_times[order:] - spike_times[:-order]) / unit
+        intervals = intervals[(intervals >= edges[0]) & (intervals <= edges[-1])]
+        counts += np.bincount(_bin_indices(intervals, edges), minlength=len(counts))
+
+
+def _accumulate_loop(spike_times, unit, edges, counts):
+    """ Adds the all-order intervals of a sorted spike train to counts with an explicit loop (compiled with numba) """
+    n_bins = len(edges) - 1
+    norm = n_bins / (edges[-1] - edges[0])
+    for idx_i in range(len(spike_times)):
+        for idx_j in range(idx_i + 1, len(spike_times)):
+            interval = (spike_times[idx_j] - spike_times[idx_i]) / unit
+            if interval > edges[-1]:
+                break
+            if interval < edges[0]:
+                continue
+            idx_bin = int((interval - edges[0]) * norm)
+            if idx_bin == n_bins:
+                idx_bin -= 1
+            if interval < edges[idx_bin]:
+                idx_bin -= 1
+            elif interval >= edges[idx_bin + 1] and idx_bin != n_bins - 1:
+                idx_bin += 1
+            counts[idx_bin] += 1
+
+
+if numba is not None:
+    _accumulate_compiled = numba.njit(cache=True)(_accumulate_loop)
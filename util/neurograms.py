@@ -0,0 +1,270 @@
+"""
+The following functions and classes implement an on-disk store of neurograms (auditory nerve responses of shape
+(n_cf, n_sample)) so that plots of them can be regenerated without re-simulating anything. Each neurogram is stored in
+its own directory, named after a hash of its parameters and stimulus waveform, that holds:
+    - metadata.json: sampling rate, number of samples, CFs, pyramid layout, and the parameters of the simulation
+    - data.npy: the full-resolution response in chunks of shape (n_chunk, n_cf, chunk_size), so that a read of a short
+      time window only touches the chunks that overlap the window
+    - min_<level>.npy and max_<level>.npy: a pyramid of decimated copies of the response, in which each sample of level
+      k is the minimum or maximum over factor**k full-resolution samples, for rendering long windows at screen
+      resolution
+    - mean.npy: the mean response of each CF (i.e., the excitation pattern)
+    - stimulus.npy: the stimulus
+All files are memory-mapped when read, so only the requested window is ever loaded into memory.
+"""
+import hashlib
+from importlib.metadata import PackageNotFoundError, version
+import json
+import os
+import shutil
+import uuid
+import numpy as np
+from util.cache import hash_value
+from util.precision import get_precision
+
+
+class Neurogram:
+    """ Read-only view of a neurogram stored on disk """
+    def __init__(self, path):
+        """
+        Arguments:
+            path (str): directory of the neurogram
+        """
+        self.path = path
+        with open(os.path.join(path, 'metadata.json')) as file:
+            self.metadata = json.load(file)
+        self.fs = self.metadata['fs']
+        self.n_sample = self.metadata['n_sample']
+        self.chunk_size = self.metadata['chunk_size']
+        self.factor = self.metadata['factor']
+        self.n_level = self.metadata['n_level']
+        self.cfs = np.array(self.metadata['cfs'])
+        self.parameters = self.metadata['parameters']
+
+    @property
+    def mean(self):
+        """ Mean response of each CF, of shape (n_cf, ) """
+        return np.load(os.path.join(self.path, 'mean.npy'))
+
+    @property
+    def stimulus(self):
+        """ Stimulus used to simulate the neurogram """
+        return np.load(os.path.join(self.path, 'stimulus.npy'), mmap_mode='r')
+
+    def index_cfs(self, cf_low=None, cf_high=None):
+        """ Returns the slice of CF indices with CFs between cf_low and cf_high (inclusive) """
+        start = 0 if cf_low is None else int(np.searchsorted(self.cfs, cf_low, side='left'))
+        stop = len(self.cfs) if cf_high is None else int(np.searchsorted(self.cfs, cf_high, side='right'))
+        return slice(start, stop)
+
+    def index_times(self, t_start=None, t_stop=None, level=0):
+        """ Returns the slice of sample indices at a pyramid level that covers times from t_start to t_stop (in s) """
+        step = self.factor**level
+        n_sample = -(-self.n_sample // step)
+        start = 0 if t_start is None else int(np.clip(np.floor(t_start*self.fs/step), 0, n_sample))
+        stop = n_sample if t_stop is None else int(np.clip(np.ceil(t_stop*self.fs/step) + 1, start, n_sample))
+        return slice(start, stop)
+
+    def read(self, t_start=None, t_stop=None, cf_low=None, cf_high=None):
+        """ Reads a window of the full-resolution response
+
+        Args:
+            t_start (float, None): start of the window in seconds, or None to start at the beginning of the response
+            t_stop (float, None): end of the window in seconds, or None to end at the end of the response
+            cf_low (float, None): lowest CF in Hz, or None to start at the lowest CF
+            cf_high (float, None): highest CF in Hz, or None to end at the highest CF
+
+        Returns:
+            t (ndarray): time of each sample in the window in seconds, of shape (n_sample_window, )
+            cfs (ndarray): CF of each channel in the window in Hz, of shape (n_cf_window, )
+            response (ndarray): response in the window, of shape (n_cf_window, n_sample_window)
+        """
+        times, channels = self.index_times(t_start, t_stop), self.index_cfs(cf_low, cf_high)
+        data = np.load(os.path.join(self.path, 'data.npy'), mmap_mode='r')
+        chunk_start, chunk_stop = times.start // self.chunk_size, -(-times.stop // self.chunk_size)
+        window = np.concatenate(list(data[chunk_start:chunk_stop, channels]), axis=-1) \
+            if chunk_stop > chunk_start else np.zeros((channels.stop - channels.start, 0), dtype=data.dtype)
+        offset = chunk_start * self.chunk_size
+        return np.arange(times.start, times.stop) / self.fs, self.cfs[channels], \
+            window[:, (times.start - offset):(times.stop - offset)]
+
+    def read_level(self, level, t_start=None, t_stop=None, cf_low=None, cf_high=None):
+        """ Reads a window of one level of the pyramid of decimated responses
+
+        Args:
+            level (int): level of the pyramid, where 0 is the full-resolution response and each sample of level k
+                spans factor**k full-resolution samples
+            t_start, t_stop, cf_low, cf_high: limits of the window, see read()
+
+        Returns:
+            t (ndarray): start time of each sample in the window in seconds, of shape (n_sample_window, )
+            cfs (ndarray): CF of each channel in the window in Hz, of shape (n_cf_window, )
+            minimum (ndarray): minimum response over each sample, of shape (n_cf_window, n_sample_window)
+            maximum (ndarray): maximum response over each sample, of shape (n_cf_window, n_sample_window)
+        """
+        if level == 0:
+            t, cfs, response = self.read(t_start, t_stop, cf_low, cf_high)
+            return t, cfs, response, response
+        if not 0 < level < self.n_level:
+            raise ValueError('level must be between 0 and ' + str(self.n_level - 1))
+        times, channels = self.index_times(t_start, t_stop, level), self.index_cfs(cf_low, cf_high)
+        minimum, maximum = [np.load(os.path.join(self.path, name + '_' + str(level) + '.npy'), mmap_mode='r')
+                            for name in ['min', 'max']]
+        return np.arange(times.start, times.stop) * self.factor**level / self.fs, self.cfs[channels], \
+            np.array(minimum[channels, times]), np.array(maximum[channels, times])
+
+    def choose_level(self, n_column, t_start=None, t_stop=None):
+        """ Returns the coarsest pyramid level with at least n_column samples between t_start and t_stop """
+        for level in reversed(range(self.n_level)):
+            times = self.index_times(t_start, t_stop, level)
+            if times.stop - times.start >= n_column:
+                return level
+        return 0
+
+
+def write_neurogram(path, response, fs, cfs, stimulus=None, parameters=None, chunk_size=4096, factor=4, min_size=64):
+    """ Writes a neurogram to a new directory
+
+    The directory is written under a temporary name and then renamed, so readers never see a partial neurogram.
+
+    Args:
+        path (str): directory of the neurogram, which must not exist yet
+        response (ndarray): response of shape (n_cf, n_sample)
+        fs (int): sampling rate of the response in Hz
+        cfs (ndarray): CF of each channel in Hz, of shape (n_cf, )
+        stimulus (ndarray, None): stimulus used to simulate the response
+        parameters (dict, None): parameters of the simulation, stored in the metadata (values that cannot be stored
+            in JSON are stored as strings)
+        chunk_size (int): number of samples per chunk of the full-resolution response
+        factor (int): decimation factor between successive levels of the pyramid
+        min_size (int): the pyramid stops at the first level with fewer than this many samples
+
+    Returns:
+        neurogram (Neurogram): view of the neurogram
+    """
+    response = np.atleast_2d(np.asarray(response))
+    n_cf, n_sample = response.shape
+    path_temp = path + '.' + uuid.uuid4().hex + '.tmp'
+    os.makedirs(path_temp)
+    # Write the full-resolution response in chunks along the time axis (zero-padding the last chunk)
+    n_chunk = -(-n_sample // chunk_size)
+    chunks = np.zeros((n_chunk, n_cf, chunk_size), dtype=response.dtype)
+    for idx in range(n_chunk):
+        segment = response[:, (idx*chunk_size):((idx+1)*chunk_size)]
+        chunks[idx, :, :segment.shape[1]] = segment
+    np.save(os.path.join(path_temp, 'data.npy'), chunks)
+    # Write the pyramid, reducing each level from the one below it
+    minimum, maximum = response, response
+    n_level = 1
+    while -(-minimum.shape[1] // factor) >= min_size:
+        minimum, maximum = [reduce_blocks(ele, factor, func) for ele, func in [(minimum, np.min), (maximum, np.max)]]
+        np.save(os.path.join(path_temp, 'min_' + str(n_level) + '.npy'), minimum)
+        np.save(os.path.join(path_temp, 'max_' + str(n_level) + '.npy'), maximum)
+        n_level += 1
+    # Write the excitation pattern, stimulus, and metadata
+    np.save(os.path.join(path_temp, 'mean.npy'), np.mean(response, axis=1, dtype=np.float64))
+    if stimulus is not None:
+        np.save(os.path.join(path_temp, 'stimulus.npy'), np.asarray(stimulus))
+    metadata = {'fs': fs, 'n_sample': n_sample, 'chunk_size': chunk_size, 'factor': factor, 'n_level': n_level,
+                'cfs': [float(cf) for cf in cfs], 'dtype': response.dtype.str,
+                'parameters': {name: to_json(value) for name, value in (parameters or {}).items()
+                               if not name.startswith('_')}}
+    with open(os.path.join(path_temp, 'metadata.json'), 'w') as file:
+        json.dump(metadata, file, indent=1)
+    try:
+        os.rename(path_temp, path)
+    except OSError:
+        shutil.rmtree(path_temp, ignore_errors=True)  # another process wrote the same neurogram first
+    return Neurogram(path)
+
+
+def reduce_blocks(x, factor, func):
+    """ Applies func (e.g., np.min) over consecutive blocks of factor samples along the last axis of x, padding the last
+    block with its final sample """
+    n_block = -(-x.shape[1] // factor)
+    padded = np.pad(x, ((0, 0), (0, n_block*factor - x.shape[1])), mode='edge')
+    return func(padded.reshape(x.shape[0], n_block, factor), axis=-1)
+
+
+def to_json(value):
+    """ Converts a parameter value to a value that can be stored in JSON """
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [to_json(ele) for ele in value]
+    return str(value)
+
+
+def model_version():
+    """ Returns the installed version of apcmodels, or None if it cannot be determined """
+    try:
+        return version('apcmodels')
+    except PackageNotFoundError:
+        return None
+
+
+class NeurogramStore:
+    """ Directory of neurograms, keyed by a hash of the parameters, model, and stimulus that produced them """
+    def __init__(self, path=os.path.join('.cache', 'neurograms')):
+        """
+        Arguments:
+            path (str): root directory of the store
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def key(self, params, model_name, stimulus_name, stimulus):
+        """ Calculates the key under which the neurogram for a parameter dict is stored
+
+        As in ResponseCache.key() in util/cache.py, the key depends on the stimulus waveform itself, so changes to the
+        synthesizers produce new neurograms rather than returning stale ones. It also depends on the installed version
+        of apcmodels, so that upgrading the models does too.
+
+        Args:
+            params (dict): parameter dict, whose entries whose names start with an underscore are ignored
+            model_name (str): name of the model
+            stimulus_name (str): name of the stimulus (e.g., the stimulus_name attribute of its synthesizer)
+            stimulus (ndarray): stimulus waveform
+
+        Returns:
+            key (str): hex digest identifying the neurogram
+        """
+        hasher = hashlib.sha1()
+        hash_value(hasher, model_name)
+        hash_value(hasher, model_version())
+        hash_value(hasher, stimulus_name)
+        hash_value(hasher, np.asarray(stimulus))
+        for name in sorted(params):
+            if not name.startswith('_'):
+                hash_value(hasher, name)
+                hash_value(hasher, params[name])
+        if get_precision() != np.float64:
+            hash_value(hasher, get_precision().str)
+        return hasher.hexdigest()
+
+    def simulate(self, params, model_name, synthesizer, simulate):
+        """ Returns the neurogram for a parameter dict, simulating it only if it is not in the store
+
+        The stimulus is always synthesized, since it is part of the key, but that is cheap next to the simulation.
+
+        Args:
+            params (dict): parameter dict, including cf_low, cf_high, n_cf (CFs are log-spaced between cf_low and
+                cf_high) and fs
+            model_name (str): name of the model
+            synthesizer (Synthesizer): synthesizer used to synthesize the stimulus
+            simulate (function): function that accepts a parameter dict and returns a response of shape
+                (n_cf, n_sample), e.g., WorkingPrecision(AuditoryNerveZilany2014().simulate)
+
+        Returns:
+            neurogram (Neurogram): view of the stored neurogram
+        """
+        stimulus = synthesizer.synthesize_sequence([params])[0]
+        path = os.path.join(self.path, self.key(params, model_name, synthesizer.stimulus_name, stimulus))
+        if os.path.exists(path):
+            return Neurogram(path)
+        response = simulate(dict(params, _input=stimulus))
+        cfs = 10**np.linspace(np.log10(params['cf_low']), np.log10(params['cf_high']), params['n_cf'])
+        return write_neurogram(path, response, params['fs'], cfs, stimulus,
+                               dict(params, model_name=model_name, stimulus_name=synthesizer.stimulus_name))
@@ -0,0 +1,191 @@
+"""
+The following functions and classes implement a small make-like task runner used by run.py to regenerate the
+simulations and figures in this repo. Each task declares the files it reads and writes, tasks are only rerun when their
+outputs are missing or older than their inputs, and independent tasks are run in parallel processes.
+"""
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from fnmatch import fnmatch
+import glob
+import os
+import subprocess
+import time
+
+# Environment variables through which a task is told how many worker processes it may start and how much memory (in
+# bytes) they may use in total (see run_sharded in util/sharding.py)
+WORKERS_VARIABLE = 'PIPELINE_WORKERS'
+MEMORY_VARIABLE = 'PIPELINE_MEMORY'
+
+
+class Task:
+    """ A single step of the pipeline, i.e., a command that reads some files and writes others
+
+    Inputs and outputs are given as glob patterns relative to the root of the repo. Dependencies between tasks are
+    inferred from these patterns: a task depends on every other task that writes a file that matches one of its
+    input patterns.
+    """
+    def __init__(self, name, command, inputs=(), outputs=(), env=None):
+        """
+        Arguments:
+            name (str): unique name of the task
+            command (list): command to run, e.g., ['python3', 'figure1/figure1.py']
+            inputs (list): glob patterns of files read by the task (the script itself should be included)
+            outputs (list): glob patterns of files written by the task
+            env (dict, None): environment variables set for the command in addition to those of run.py, e.g., the
+                output of share_resources()
+        """
+        self.name = name
+        self.command = command
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.env = dict(env or {})
+
+    def depends_on(self, other):
+        """ Returns True if any input pattern of this task overlaps with any output pattern of the other task """
+        return any([fnmatch(output, pattern) or fnmatch(pattern, output)
+                    for pattern in self.inputs for output in other.outputs])
+
+    def is_stale(self):
+        """ Returns True if any output is missing or if the oldest output is older than the newest input """
+        output_times = []
+        for pattern in self.outputs:
+            matches = glob.glob(pattern)
+            if len(matches) == 0:
+                return True
+            output_times.extend([os.path.getmtime(match) for match in matches])
+        input_times = [os.path.getmtime(match) for pattern in self.inputs for match in glob.glob(pattern)]
+        if len(output_times) == 0:
+            return True
+        return len(input_times) > 0 and min(output_times) < max(input_times)
+
+
+def total_memory():
+    """ Returns the total physical memory of the machine in bytes, or None if it cannot be determined """
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def share_resources(n_share):
+    """ Returns the environment variables that give a task an equal share of the CPUs and memory of the machine
+
+    Args:
+        n_share (int): number of tasks that may run at once and split the machine between them
+
+    Returns:
+        env (dict): environment variables to pass as Task(env=...)
+    """
+    env = {WORKERS_VARIABLE: str(max(1, (os.cpu_count() or 1) // n_share))}
+    if total_memory() is not None:
+        env[MEMORY_VARIABLE] = str(total_memory() // n_share)
+    return env
+
+
+def resolve_dependencies(tasks):
+    """ Returns a dict mapping each task name to the names of the tasks it depends on
+
+    Raises:
+        ValueError: if the dependency graph contains a cycle
+    """
+    dependencies = {task.name: [other.name for other in tasks if other is not task and task.depends_on(other)]
+                    for task in tasks}
+    # Check for cycles with a depth-first search
+    state = {}
+
+    def visit(name):
+        if state.get(name) == 'visiting':
+            raise ValueError('dependency cycle detected involving task ' + name)
+        if state.get(name) is None:
+            state[name] = 'visiting'
+            for dependency in dependencies[name]:
+                visit(dependency)
+            state[name] = 'done'
+
+    for name in dependencies:
+        visit(name)
+    return dependencies
+
+
+def select_tasks(tasks, dependencies, targets):
+    """ Returns the requested tasks along with every task they (directly or indirectly) depend on """
+    selected = set()
+    pending = list(targets)
+    while len(pending) > 0:
+        name = pending.pop()
+        if name not in dependencies:
+            raise ValueError('task ' + name + ' is not recognized')
+        if name not in selected:
+            selected.add(name)
+            pending.extend(dependencies[name])
+    return [task for task in tasks if task.name in selected]
+
+
+def run_pipeline(tasks, targets=None, n_jobs=None, force=False, dry_run=False):
+    """ Runs every stale task (and every task downstream of a stale task), running independent tasks in parallel
+
+    Args:
+        tasks (list): list of Task objects
+        targets (list, None): names of the tasks to bring up to date, or None to bring every task up to date
+        n_jobs (int, None): maximum number of tasks to run at once, defaults to the number of CPUs
+        force (bool): if True, every selected task is rerun regardless of file timestamps
+        dry_run (bool): if True, print the tasks that would be run without running them
+
+    Returns:
+        failed (list): names of tasks that failed or were skipped because an upstream task failed
+    """
+    dependencies = resolve_dependencies(tasks)
+    if targets is not None:
+        tasks = select_tasks(tasks, dependencies, targets)
+    names = [task.name for task in tasks]
+    dependencies = {name: [dependency for dependency in dependencies[name] if dependency in names] for name in names}
+    # Determine which tasks need to be run, propagating staleness downstream in dependency order
+    stale = {}
+
+    def check(task):
+        if task.name not in stale:
+            stale[task.name] = force or task.is_stale() or \
+                any([check(other) for other in tasks if other.name in dependencies[task.name]])
+        return stale[task.name]
+
+    for task in tasks:
+        check(task)
+    to_run = [task for task in tasks if stale[task.name]]
+    if dry_run:
+        for task in to_run:
+            print('Would run ' + task.name + ': ' + ' '.join(task.command))
+        return []
+    # Schedule tasks as soon as all of their dependencies have finished
+    done, failed, running = set(), [], {}
+    remaining = list(to_run)
+    with ThreadPoolExecutor(max_workers=n_jobs or os.cpu_count()) as executor:
+        while len(remaining) > 0 or len(running) > 0:
+            for task in list(remaining):
+                blockers = [name for name in dependencies[task.name] if stale[name] and name not in done]
+                if any([name in failed for name in blockers]):
+                    print('Skipping ' + task.name + ' because an upstream task failed')
+                    failed.append(task.name)
+                    remaining.remove(task)
+                elif len(blockers) == 0:
+                    print('Running ' + task.name + ': ' + ' '.join(task.command))
+                    running[executor.submit(run_task, task)] = task
+                    remaining.remove(task)
+            if len(running) == 0:
+                continue
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in finished:
+                task = running.pop(future)
+                returncode, elapsed = future.result()
+                if returncode == 0:
+                    print('Finished ' + task.name + ' in ' + str(round(elapsed, 1)) + ' s')
+                    done.add(task.name)
+                else:
+                    print('Task ' + task.name + ' failed with return code ' + str(returncode))
+                    failed.append(task.name)
+    return failed
+
+
+def run_task(task):
+    """ Runs a task's command in its own process and returns its return code and elapsed time in seconds """
+    start = time.time()
+    returncode = subprocess.run(task.command, env=dict(os.environ, **task.env)).returncode
+    return returncode, time.time() - start
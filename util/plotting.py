@@ -0,0 +1,81 @@
+"""
+The following functions render high-resolution neurograms (e.g., 200 CFs by tens of thousands of samples) efficiently.
+Rather than passing the whole response to pcolormesh, which draws one quad per sample even outside of the visible
+window, render_neurogram slices the response to the visible time window, min/max-decimates it to the pixel width of the
+axes, and draws it as a single image with imshow. The input arrays are not modified, so the full-resolution response
+remains available, e.g., for zoomed insets.
+"""
+import numpy as np
+
+
+def decimate_min_max(minimum, maximum, n_column):
+    """ Decimates responses along the last axis to n_column bins, keeping the minimum and maximum of each bin
+
+    Args:
+        minimum (ndarray): array of shape (n_row, n_sample) from which the minimum of each bin is taken
+        maximum (ndarray): array of shape (n_row, n_sample) from which the maximum of each bin is taken (for
+            full-resolution responses, the same array as minimum)
+        n_column (int): number of bins
+
+    Returns:
+        output (ndarray): array of shape (n_row, 2*n_column) in which the minimum and maximum of each bin alternate, so
+            that peaks narrower than a bin remain visible
+    """
+    starts = np.linspace(0, minimum.shape[1], n_column + 1).astype(int)[:-1]
+    return np.stack([np.minimum.reduceat(minimum, starts, axis=1), np.maximum.reduceat(maximum, starts, axis=1)],
+                    axis=-1).reshape(minimum.shape[0], 2*n_column)
+
+
+def edges_from_centers(centers):
+    """ Returns the edges of the bins around an increasing sequence of centers (as in pcolormesh(shading='nearest')) """
+    if len(centers) == 1:
+        return np.array([centers[0] - 0.5, centers[0] + 0.5])
+    midpoints = (centers[1:] + centers[:-1]) / 2
+    return np.concatenate([[2*centers[0] - midpoints[0]], midpoints, [2*centers[-1] - midpoints[-1]]])
+
+
+def render_neurogram(ax, t, cfs, response, xlim=None, maximum=None, n_column=None, n_row=None, **kwargs):
+    """ Draws a neurogram on an axes with imshow, equivalently to ax.pcolormesh(t, cfs, response, shading='auto')
+
+    Args:
+        ax (Axes): matplotlib axes on which to draw
+        t (ndarray): time of each sample (in any units, e.g., periods of the F0), evenly spaced, of shape (n_sample, )
+        cfs (ndarray): CF of each channel in Hz (not necessarily evenly spaced), of shape (n_cf, )
+        response (ndarray): response of shape (n_cf, n_sample), or the minimum of each sample if maximum is given
+        xlim (tuple, None): the visible time window; only samples inside it are drawn. Defaults to the whole response.
+        maximum (ndarray, None): the maximum of each sample, of shape (n_cf, n_sample), for responses that have
+            already been decimated (e.g., a level of the pyramid from Neurogram.read_level in util/neurograms.py)
+        n_column (int, None): number of bins to decimate the window into, defaults to the width of ax in pixels. The
+            window is only decimated if it has more than 2*n_column samples.
+        n_row (int, None): number of rows of the image, defaults to the height of ax in pixels. Channels are mapped to
+            rows by CF, so that unevenly spaced CFs appear as they would in pcolormesh on a linear axis.
+        **kwargs: keyword arguments passed to imshow (e.g., cmap)
+
+    Returns:
+        image (AxesImage): the image drawn on ax
+    """
+    t, cfs = np.asarray(t), np.asarray(cfs)
+    minimum = np.asarray(response)
+    maximum = minimum if maximum is None else np.asarray(maximum)
+    extent_ax = ax.get_window_extent()
+    n_column = n_column or max(1, int(np.ceil(extent_ax.width)))
+    n_row = n_row or max(len(cfs), int(np.ceil(extent_ax.height)))
+    # Slice to the visible window (keeping one sample on either side so that the window is filled to its edges)
+    if xlim is not None:
+        start = max(0, int(np.searchsorted(t, min(xlim), side='left')) - 1)
+        stop = min(len(t), int(np.searchsorted(t, max(xlim), side='right')) + 1)
+        t, minimum, maximum = t[start:stop], minimum[:, start:stop], maximum[:, start:stop]
+    edges_t = edges_from_centers(t)
+    # Decimate to the pixel width of the axes
+    if len(t) > 2*n_column:
+        image = decimate_min_max(minimum, maximum, n_column)
+    elif maximum is minimum:
+        image = minimum
+    else:
+        image = np.stack([minimum, maximum], axis=-1).reshape(minimum.shape[0], 2*minimum.shape[1])
+    # Map channels to evenly spaced rows
+    edges_cf = edges_from_centers(cfs)
+    rows = (np.arange(n_row) + 0.5) / n_row * (edges_cf[-1] - edges_cf[0]) + edges_cf[0]
+    image = image[np.clip(np.searchsorted(edges_cf, rows, side='right') - 1, 0, len(cfs) - 1)]
+    return ax.imshow(image, origin='lower', aspect='auto', extent=(edges_t[0], edges_t[-1], edges_cf[0], edges_cf[-1]),
+                     **kwargs)
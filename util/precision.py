@@ -0,0 +1,55 @@
+"""
+The following functions control the floating-point precision (the "working precision") in which stimuli, model
+responses, and the intermediate arrays of the decoders are stored. The default is double precision. Single precision
+(set_precision('float32') at the top of a script, or SIMULATION_PRECISION=float32 in the environment) halves the memory
+and memory bandwidth used by these arrays. Stimuli are still synthesized in double precision and only stored in the
+working precision, and sums over time (e.g., in InformationAccumulator and summarize_channels) are always accumulated
+in double precision.
+"""
+import os
+import numpy as np
+
+# Environment variable from which the working precision is read, so that worker processes inherit it
+ENVIRONMENT_VARIABLE = 'SIMULATION_PRECISION'
+
+_precision = np.dtype(os.environ.get(ENVIRONMENT_VARIABLE, 'float64'))
+
+
+def get_precision():
+    """ Returns the working precision as a numpy dtype """
+    return _precision
+
+
+def set_precision(dtype):
+    """ Sets the working precision for this process and for any process it starts afterwards
+
+    Args:
+        dtype (str, type): either 'float32' or 'float64' (or the corresponding numpy types)
+    """
+    global _precision
+    dtype = np.dtype(dtype)
+    if dtype not in (np.dtype(np.float32), np.dtype(np.float64)):
+        raise ValueError('precision must be float32 or float64, not ' + str(dtype))
+    _precision = dtype
+    os.environ[ENVIRONMENT_VARIABLE] = dtype.name
+
+
+def to_precision(x):
+    """ Returns a floating-point ndarray in the working precision (other values are returned unchanged) """
+    if isinstance(x, np.ndarray) and x.dtype.kind == 'f' and x.dtype != _precision:
+        return x.astype(_precision)
+    return x
+
+
+class WorkingPrecision:
+    """ Wraps a simulate method (e.g., AuditoryNerveZilany2014().simulate) so that its responses are returned in the
+    working precision """
+    def __init__(self, simulate):
+        """
+        Arguments:
+            simulate (function): function that accepts a parameter dict and returns a model response
+        """
+        self.simulate = simulate
+
+    def __call__(self, params):
+        return to_precision(self.simulate(params))
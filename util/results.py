@@ -0,0 +1,223 @@
+"""
+The following functions and classes implement a columnar store for the results of ideal observer simulations. Results
+are stored as .npz files of typed columns (one array per parameter) in a directory tree partitioned by model, decoding
+type, and roving type (e.g., results/model=Heinz2001/decoding_type=AI/roving_type=none/part-....npz). Each write adds
+a new file, so parallel workers can append to the same store without coordination, and reads only open the files (and
+columns) that can match the requested filters.
+"""
+import glob
+import os
+import time
+import uuid
+import numpy as np
+import pandas as pd
+
+# Columns used to partition the store, in the order in which they appear in the directory tree
+PARTITION_COLUMNS = ['model', 'decoding_type', 'roving_type']
+
+
+def to_column(values):
+    """ Converts a list of parameter values to a typed ndarray
+
+    Scalars and length-1 arrays (e.g., delta_theta=[0.001]) are stored as numbers, strings as unicode strings, and
+    anything else (e.g., arrays of per-component levels) as the string representation written by save_to_csv.
+
+    Args:
+        values (list): list of values of one parameter, one per row
+
+    Returns:
+        column (ndarray): 1d ndarray of shape (n_row, )
+    """
+    values = [value.item() if isinstance(value, np.ndarray) and value.size == 1 else value for value in values]
+    values = [value[0] if isinstance(value, (list, tuple)) and len(value) == 1 else value for value in values]
+    if all([isinstance(value, (bool, np.bool_)) for value in values]):
+        return np.array(values, dtype=bool)
+    if all([isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, (bool, np.bool_))
+            for value in values]):
+        return np.array(values)
+    if all([isinstance(value, str) for value in values]):
+        return np.array(values, dtype=str)
+    return np.array([str(value) for value in values], dtype=str)
+
+
+def parse_column(column):
+    """ Converts a column read from a CSV written by save_to_csv to a typed ndarray (e.g., '[0.001]' to 0.001) """
+    column = np.asarray(column)
+    if column.dtype != object:
+        return column
+    stripped = [value.strip('[]') if isinstance(value, str) else value for value in column]
+    try:
+        return np.array(stripped, dtype=np.float64)
+    except ValueError:
+        return np.array([str(value) for value in column], dtype=str)
+
+
+class ResultsStore:
+    """ Append-only columnar store of simulation results, partitioned by model, decoding type, and roving type """
+    def __init__(self, path):
+        """
+        Arguments:
+            path (str): root directory of the store
+        """
+        self.path = path
+
+    def append(self, columns):
+        """ Adds rows to the store
+
+        Args:
+            columns (dict, DataFrame): mapping from column names to 1d arrays of equal length, which must include every
+                column in PARTITION_COLUMNS
+        """
+        # Convert generic object columns (e.g., strings in a DataFrame) to typed columns, which load without pickling
+        columns = {name: to_column(list(column)) if np.asarray(column).dtype == object else np.asarray(column)
+                   for name, column in dict(columns).items()}
+        for name in PARTITION_COLUMNS:
+            if name not in columns:
+                raise ValueError('results must include a ' + name + ' column')
+        # Split rows by partition and write one file per partition
+        keys = list(zip(*[columns[name].astype(str) for name in PARTITION_COLUMNS]))
+        for key in sorted(set(keys)):
+            rows = np.array([idx for idx, row_key in enumerate(keys) if row_key == key])
+            directory = os.path.join(self.path, *[name + '=' + value for name, value in zip(PARTITION_COLUMNS, key)])
+            os.makedirs(directory, exist_ok=True)
+            filename = os.path.join(directory, 'part-' + str(time.time_ns()) + '-' + uuid.uuid4().hex + '.npz')
+            filename_temp = filename + '.' + str(os.getpid()) + '.tmp'
+            with open(filename_temp, 'wb') as file:
+                np.savez(file, **{name: column[rows] for name, column in columns.items()
+                                  if name not in PARTITION_COLUMNS})
+            os.replace(filename_temp, filename)  # atomic, so that readers never see a partial file
+
+    def read(self, columns=None, **filters):
+        """ Reads the rows of the store that match every filter
+
+        Args:
+            columns (list, None): names of the columns to read, or None to read every column
+            **filters: filters on column values, each either a single value (rows must be equal to it), a list, tuple
+                or set of values (rows must be equal to one of them), or a function that accepts a column and returns
+                a boolean mask. Filters on PARTITION_COLUMNS are applied to the directory tree, so files in other
+                partitions are never opened.
+
+        Returns:
+            results (DataFrame): matching rows
+        """
+        # Prune the directory tree using filters on partition columns
+        pattern = []
+        for name in PARTITION_COLUMNS:
+            pattern.append(name + '=' + (str(filters[name]) if name in filters and is_scalar(filters[name]) else '*'))
+        frames = []
+        for filename in sorted(glob.glob(os.path.join(self.path, *pattern, 'part-*.npz'))):
+            partition = dict([part.split('=', 1) for part in os.path.relpath(os.path.dirname(filename),
+                                                                           self.path).split(os.sep)])
+            if not all([matches(np.array([partition[name]]), filters[name])[0]
+                        for name in PARTITION_COLUMNS if name in filters]):
+                continue
+            with np.load(filename) as data:
+                # Evaluate filters first and only load the other columns if any rows match
+                n_row = len(data[data.files[0]]) if len(data.files) > 0 else 0
+                mask = np.ones(n_row, dtype=bool)
+                for name, value in filters.items():
+                    if name not in PARTITION_COLUMNS:
+                        mask &= matches(data[name], value) if name in data.files else False
+                if not np.any(mask):
+                    continue
+                names = data.files if columns is None else [name for name in columns if name in data.files]
+                frame = pd.DataFrame({name: data[name][mask] for name in names})
+            for name in PARTITION_COLUMNS:
+                if columns is None or name in columns:
+                    frame[name] = partition[name]
+            frames.append(frame)
+        if len(frames) == 0:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(frames, ignore_index=True)
+
+    def clear(self):
+        """ Deletes every result in the store, e.g., before a sweep is rerun from scratch """
+        for filename in glob.glob(os.path.join(self.path, *(['*'] * len(PARTITION_COLUMNS)), 'part-*.npz')):
+            os.remove(filename)
+
+    def compact(self):
+        """ Merges the files in each partition into a single file, which speeds up reads after many small appends """
+        for directory in sorted(set([os.path.dirname(filename) for filename in
+                                     glob.glob(os.path.join(self.path, *(['*'] * len(PARTITION_COLUMNS)),
+                                                            'part-*.npz'))])):
+            filenames = sorted(glob.glob(os.path.join(directory, 'part-*.npz')))
+            if len(filenames) < 2:
+                continue
+            frame = pd.concat([pd.DataFrame(dict(np.load(filename))) for filename in filenames], ignore_index=True)
+            partition = dict([part.split('=', 1) for part in os.path.relpath(directory, self.path).split(os.sep)])
+            for name in PARTITION_COLUMNS:
+                frame[name] = partition[name]
+            self.append({name: to_column(list(frame[name])) for name in frame.columns})
+            for filename in filenames:
+                os.remove(filename)
+
+
+def is_scalar(value):
+    """ Returns True if a filter value is a single value rather than a collection of values or a function """
+    return not (callable(value) or isinstance(value, (list, tuple, set, np.ndarray)))
+
+
+def matches(column, value):
+    """ Returns a boolean mask of the elements of column that satisfy a filter (see ResultsStore.read) """
+    if callable(value):
+        return np.asarray(value(column), dtype=bool)
+    if is_scalar(value):
+        value = [value]
+    if column.dtype.kind == 'U':
+        value = [str(ele) for ele in value]
+    return np.isin(column, list(value))
+
+
+def save_to_store(results, params, store, **kwargs):
+    """ Adds the results of a simulation to a ResultsStore, analogously to apcmodels.util.save_to_csv
+
+    Args:
+        results (list): list of results, one per element of params
+        params (Parameters): Parameters object used to run the simulation. Stimuli ('_input') are not stored.
+        store (ResultsStore, str): store (or root directory of store) to which results are added
+        **kwargs: constant columns to add to every row (e.g., decoding_type='AI', model='Heinz2001',
+            roving_type='none')
+    """
+    store = ResultsStore(store) if isinstance(store, str) else store
+    store.append(rows_to_columns(to_rows(results, params, **kwargs)))
+
+
+def to_rows(results, params, **kwargs):
+    """ Pairs each result with the parameters that produced it
+
+    Args:
+        results (list): list of results, one per element of params
+        params (Parameters, list): Parameters object (or list of its elements) used to run the simulation. Stimuli
+            ('_input') and other keys starting with an underscore are dropped.
+        **kwargs: constant columns to add to every row
+
+    Returns:
+        rows (list): list of dicts, one per result, with the result under the 'result' key
+    """
+    rows = []
+    for ele, result in zip(params, results):
+        ele = ele[0] if isinstance(ele, list) else ele  # use baseline parameters if increments are present
+        row = {key: value for key, value in ele.items() if not key.startswith('_')}
+        row.update(kwargs)
+        row['result'] = result
+        rows.append(row)
+    return rows
+
+
+def rows_to_columns(rows):
+    """ Converts a list of row dicts (see to_rows) to a dict of typed columns, filling missing values with None """
+    names = sorted(set([key for row in rows for key in row]))
+    return {name: to_column([row.get(name) for row in rows]) for name in names}
+
+
+def import_csv(filenames, store):
+    """ Adds the contents of CSV files written by save_to_csv to a ResultsStore
+
+    Args:
+        filenames (list): list of paths to CSV files
+        store (ResultsStore, str): store (or root directory of store) to which results are added
+    """
+    store = ResultsStore(store) if isinstance(store, str) else store
+    for filename in filenames:
+        frame = pd.read_csv(filename, index_col=0)
+        store.append({name: parse_column(frame[name].to_numpy()) for name in frame.columns})
@@ -0,0 +1,150 @@
+"""
+The following functions and classes pass large arrays (e.g., stimuli and model responses) between processes through
+memory-mapped scratch files rather than by pickling them. The sending process writes the arrays into a scratch file
+(in shared memory under /dev/shm, where available) and sends only ScratchArray references, which hold a filename,
+offset, shape, and dtype. The receiving process maps the file into memory, so no copy of the array is made in either
+process and the pages are shared by every process that maps them.
+"""
+import os
+import shutil
+import tempfile
+import uuid
+import numpy as np
+from util.functions import flatten_parameter_sequence, unflatten_parameter_sequence
+
+# Directory in which scratch files are created by default; /dev/shm is backed by memory, so scratch files never touch
+# the disk on Linux
+SCRATCH_PATH = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+# Offsets of arrays in scratch files are rounded up to a multiple of this many bytes
+ALIGNMENT = 64
+
+
+class ScratchArray:
+    """ Reference to an array stored in a scratch file, which pickles to a few hundred bytes whatever the array size """
+    def __init__(self, filename, offset, shape, dtype):
+        """
+        Arguments:
+            filename (str): path to the scratch file
+            offset (int): offset of the array in the file in bytes
+            shape (tuple): shape of the array
+            dtype (str): dtype string of the array, e.g., '<f8'
+        """
+        self.filename = filename
+        self.offset = offset
+        self.shape = shape
+        self.dtype = dtype
+
+    def load(self):
+        """ Returns the array as a copy-on-write memory map, i.e., it can be modified without affecting the file """
+        if int(np.prod(self.shape)) == 0:
+            return np.zeros(self.shape, dtype=self.dtype)
+        return np.memmap(self.filename, dtype=np.dtype(self.dtype), mode='c', offset=self.offset, shape=self.shape)
+
+
+class ScratchDirectory:
+    """ Temporary directory of scratch files that is deleted on exit when used as a context manager """
+    def __init__(self, path=None):
+        """
+        Arguments:
+            path (str, None): directory in which to create the scratch directory, defaults to SCRATCH_PATH
+        """
+        self.path = tempfile.mkdtemp(prefix='scratch-', dir=SCRATCH_PATH if path is None else path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cleanup()
+
+    def cleanup(self):
+        """ Deletes the scratch directory. Arrays that are still mapped remain valid until they are released. """
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def write(self, arrays):
+        """ Writes arrays into a single new scratch file
+
+        Args:
+            arrays (list): list of ndarrays
+
+        Returns:
+            references (list): list of ScratchArray objects, one per array
+        """
+        return write_scratch(self.path, arrays)
+
+
+def write_scratch(path, arrays):
+    """ Writes arrays into a single new scratch file in directory path and returns a ScratchArray for each array """
+    filename = os.path.join(path, uuid.uuid4().hex + '.bin')
+    references = []
+    with open(filename, 'wb') as file:
+        offset = 0
+        for array in arrays:
+            array = np.ascontiguousarray(array)
+            padding = -offset % ALIGNMENT
+            file.write(b'\0' * padding)
+            offset += padding
+            file.write(array.tobytes())
+            references.append(ScratchArray(filename, offset, array.shape, array.dtype.str))
+            offset += array.nbytes
+    return references
+
+
+def share_inputs(params, scratch):
+    """ Replaces the stimuli of a sequence of parameter dicts with references to a scratch file
+
+    Each distinct stimulus (by identity) is written only once, even if several parameter dicts refer to it.
+
+    Args:
+        params (Parameters, list): Parameters object or (possibly nested) list of parameter dicts with '_input' keys
+        scratch (ScratchDirectory): scratch directory in which to store the stimuli
+
+    Returns:
+        params (list): copy of params with the same nesting in which each '_input' is a ScratchArray
+    """
+    elements, structure = flatten_parameter_sequence(params)
+    arrays = {}
+    for ele in elements:
+        if '_input' in ele and not isinstance(ele['_input'], ScratchArray):
+            arrays.setdefault(id(ele['_input']), ele['_input'])
+    if len(arrays) == 0:
+        return unflatten_parameter_sequence(structure, elements)
+    references = dict(zip(arrays.keys(), scratch.write(list(arrays.values()))))
+    shared = [dict(ele, _input=references[id(ele['_input'])]) if id(ele.get('_input')) in references else ele
+              for ele in elements]
+    return unflatten_parameter_sequence(structure, shared)
+
+
+def load_inputs(ele):
+    """ Returns a copy of one element of a Parameters object with any ScratchArray stimuli mapped into memory """
+    elements, structure = flatten_parameter_sequence([ele])
+    loaded = [dict(element, _input=element['_input'].load()) if isinstance(element.get('_input'), ScratchArray)
+              else element for element in elements]
+    return unflatten_parameter_sequence(structure, loaded)[0]
+
+
+def share_outputs(output, path, min_size=2**16):
+    """ Replaces large ndarrays in the output of a runfunc (an ndarray or a tuple or list of them) with ScratchArrays
+
+    Args:
+        output: output of a runfunc
+        path (str): scratch directory in which to store the arrays
+        min_size (int): arrays smaller than this many bytes are returned unchanged, since pickling them is cheap
+
+    Returns:
+        output: output with the same structure, to be passed to load_outputs in the receiving process
+    """
+    if isinstance(output, np.ndarray):
+        return write_scratch(path, [output])[0] if output.nbytes >= min_size else output
+    if isinstance(output, (tuple, list)):
+        return type(output)([share_outputs(ele, path, min_size) for ele in output])
+    return output
+
+
+def load_outputs(output):
+    """ Inverse of share_outputs, maps any ScratchArrays in output into memory """
+    if isinstance(output, ScratchArray):
+        return output.load()
+    if isinstance(output, (tuple, list)):
+        return type(output)([load_outputs(ele) for ele in output])
+    return output
@@ -0,0 +1,168 @@
+"""
+The following functions and classes implement sharded execution of simulation sweeps. The flattened parameter grid of
+each sweep is split into shards, and shards from every sweep (e.g., the same sweep for several auditory nerve models)
+are dispatched to a single process pool so that the sweeps run concurrently rather than one after another. If a sweep
+has a synthesizer, its stimuli are synthesized inside the workers just before each condition is simulated and discarded
+afterwards, so stimuli for the whole sweep never need to be in memory at once. Otherwise, stimuli are passed to the
+workers through memory-mapped scratch files (see util/scratch.py) rather than being pickled.
+"""
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import os
+import apcmodels.decode as dc
+from util.functions import BatchSynthesizerGuest2021, flatten_parameter_sequence, unflatten_parameter_sequence
+from util.pipeline import MEMORY_VARIABLE, WORKERS_VARIABLE, total_memory
+from util.precision import WorkingPrecision, to_precision
+from util.scratch import ScratchDirectory, load_inputs, load_outputs, share_inputs, share_outputs
+
+# Approximate peak memory of a single worker simulating one condition, in bytes, for each model. The Verhulst et al.
+# (2018) model needs far more RAM than the others, so fewer of its shards are allowed to run at once.
+MEMORY_PER_WORKER = {'Heinz2001': int(2e9), 'Zilany2014': int(1e9), 'Verhulst2018': int(8e9)}
+
+
+class Sweep:
+    """ A parameter grid to be simulated with a given model and decoded with a given decoder """
+    def __init__(self, model, model_name, params, decoder=dc.decode_ideal_observer, memory_per_worker=None,
+                 synthesizer=None):
+        """
+        Arguments:
+            model: model class from apcmodels.anf
+            model_name (str): name of the model, used to look up its memory cost in MEMORY_PER_WORKER
+            params (Parameters, list): flattened Parameters object (or any iterable of its elements) with inputs
+                already added, or without inputs if synthesizer is given
+            decoder (function): function that accepts a simulate method and returns a runfunc, e.g.,
+                dc.decode_ideal_observer. Must be defined at the module level so that it can be sent to workers.
+            memory_per_worker (int, None): memory cost of one worker in bytes, defaults to the entry in
+                MEMORY_PER_WORKER for model_name (or 1 GB if there is no such entry)
+            synthesizer (Synthesizer, None): synthesizer used to synthesize the stimuli of each condition in the
+                worker just before it is simulated, or None if params already has inputs added
+        """
+        self.model = model
+        self.model_name = model_name
+        self.params = params
+        self.decoder = decoder
+        if memory_per_worker is None:
+            memory_per_worker = MEMORY_PER_WORKER.get(model_name, int(1e9))
+        self.memory_per_worker = memory_per_worker
+        self.synthesizer = synthesizer
+
+
+def synthesize_inputs(synthesizer, ele):
+    """ Returns a copy of one element of a Parameters object with stimuli added under the '_input' key
+
+    Args:
+        synthesizer (Synthesizer): synthesizer used to synthesize the stimuli
+        ele (dict, list): element of a flattened Parameters object, e.g., a list of baseline and incremented parameter
+            dicts
+
+    Returns:
+        ele (dict, list): copy of ele with the same nesting in which each parameter dict has an '_input' key, in the
+            working precision (see util/precision.py)
+    """
+    elements, structure = flatten_parameter_sequence([ele])
+    if isinstance(synthesizer, BatchSynthesizerGuest2021):
+        stimuli = synthesizer.synthesize_sequence(elements)
+    else:
+        stimuli = [synthesizer.synthesize(**element) for element in elements]
+    return unflatten_parameter_sequence(structure, [dict(element, _input=to_precision(stimulus))
+                                                    for element, stimulus in zip(elements, stimuli)])[0]
+
+
+def run_shard(model, decoder, shard, synthesizer=None, scratch_path=None):
+    """ Simulates and decodes every condition in a shard in the current process
+
+    Args:
+        model: model class from apcmodels.anf
+        decoder (function): function that accepts a simulate method and returns a runfunc
+        shard (list): list of elements of a Parameters object, whose stimuli may be ScratchArrays from util/scratch.py
+        synthesizer (Synthesizer, None): if given, the stimuli of each element are synthesized just before it is
+            simulated and released as soon as it has been decoded
+        scratch_path (str, None): scratch directory in which large outputs are stored (see share_outputs), or None to
+            return outputs as they are
+
+    Returns:
+        results (list): output of the runfunc for each element of the shard
+    """
+    sim = model()
+    runfunc = decoder(WorkingPrecision(sim.simulate))
+    results = []
+    for ele in shard:
+        ele = load_inputs(ele) if synthesizer is None else synthesize_inputs(synthesizer, ele)
+        result = runfunc(ele)
+        results.append(result if scratch_path is None else share_outputs(result, scratch_path))
+    return results
+
+
+def split_shards(sweeps, scratch, n_workers, shard_size=None):
+    """ Moves any stimuli into scratch files and splits each sweep into shards of consecutive conditions
+
+    Args:
+        sweeps (list): list of Sweep objects
+        scratch (ScratchDirectory): scratch directory in which to store stimuli of sweeps without a synthesizer
+        n_workers (int): number of worker processes
+        shard_size (int, None): number of conditions per shard, see run_sharded()
+
+    Returns:
+        shards (list): list of tuples of the index of the sweep, the index of the first condition of the shard in the
+            sweep, and the conditions of the shard, interleaved across sweeps so that every sweep makes progress at once
+    """
+    queues = []
+    for idx_sweep, sweep in enumerate(sweeps):
+        elements = list(sweep.params)
+        if sweep.synthesizer is None:
+            elements = share_inputs(elements, scratch)
+        size = shard_size or max(1, len(elements) // (4 * n_workers))
+        queues.append([(idx_sweep, start, elements[start:(start+size)]) for start in range(0, len(elements), size)])
+    shards = []
+    while any(queues):
+        for queue in queues:
+            if len(queue) > 0:
+                shards.append(queue.pop(0))
+    return shards
+
+
+def run_sharded(sweeps, n_workers=None, memory_budget=None, shard_size=None):
+    """ Runs several sweeps concurrently on a single process pool
+
+    Each sweep is split into shards of consecutive conditions. Shards are submitted round-robin across sweeps whenever
+    a worker is free and the summed memory cost of the running shards (see Sweep.memory_per_worker) plus the cost of
+    the next shard fits within memory_budget. A shard that would never fit on its own is still run, one at a time.
+
+    Args:
+        sweeps (list): list of Sweep objects
+        n_workers (int, None): number of worker processes, defaults to the value of the PIPELINE_WORKERS environment
+            variable (set by run.py, see share_resources in util/pipeline.py) or else to the number of CPUs
+        memory_budget (int, None): memory available to workers in bytes, defaults to the value of the PIPELINE_MEMORY
+            environment variable or else to the physical memory of the machine
+        shard_size (int, None): number of conditions per shard, defaults to a size that yields about four shards per
+            worker for each sweep
+
+    Returns:
+        results (list): list with one entry per sweep, each a list of runfunc outputs in the same order as the
+            elements of that sweep's Parameters object (i.e., ready to be passed to save_to_csv)
+    """
+    n_workers = n_workers or int(os.environ.get(WORKERS_VARIABLE, 0)) or os.cpu_count()
+    memory_budget = memory_budget or int(os.environ.get(MEMORY_VARIABLE, 0)) or total_memory() or float('inf')
+    results = [dict() for _ in sweeps]
+    running = {}
+    memory_in_use = 0
+    with ScratchDirectory() as scratch, ProcessPoolExecutor(max_workers=n_workers) as executor:
+        pending = split_shards(sweeps, scratch, n_workers, shard_size)
+        # Submit shards as workers and memory become available
+        while len(pending) > 0 or len(running) > 0:
+            for shard in list(pending):
+                if len(running) >= n_workers:
+                    break
+                cost = sweeps[shard[0]].memory_per_worker
+                if memory_in_use + cost <= memory_budget or len(running) == 0:
+                    sweep = sweeps[shard[0]]
+                    running[executor.submit(run_shard, sweep.model, sweep.decoder, shard[2], sweep.synthesizer,
+                                            scratch.path)] = shard
+                    memory_in_use += cost
+                    pending.remove(shard)
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in finished:
+                idx_sweep, start, _ = running.pop(future)
+                memory_in_use -= sweeps[idx_sweep].memory_per_worker
+                results[idx_sweep][start] = [load_outputs(result) for result in future.result()]
+    # Merge shards back into the original order of each sweep
+    return [[result for start in sorted(shards) for result in shards[start]] for shards in results]
@@ -0,0 +1,114 @@
+"""
+The following classes share stimuli between sweeps that differ only in the sampling rate and level of their stimuli,
+e.g., the same sweep run for several auditory nerve models. A StimulusPool synthesizes each unique stimulus once, at a
+reference level and at a fixed synthesis rate (48 kHz, the rate used in Guest and Oxenham (2021)), and stores the
+waveforms in a memory-mapped scratch file (see util/scratch.py). Workers then map the shared waveforms, upsample them
+to the sampling rate of their model (see resample_polyphase in util/functions.py), and scale them to the level of each
+condition with a single multiplication. Alternatively, the pool can synthesize each stimulus at the sampling rate of
+each model instead (fs_synthesis=None), in which case stimuli are only shared between sweeps that use the same sampling
+rate and between levels, but are identical (up to rounding) to stimuli synthesized directly at each level.
+"""
+import hashlib
+import inspect
+import numpy as np
+from util.cache import hash_value
+from util.functions import BatchSynthesizerGuest2021, flatten_parameter_sequence, resample_polyphase, \
+    unflatten_parameter_sequence
+from util.precision import to_precision
+
+
+class StimulusPool(BatchSynthesizerGuest2021):
+    """ Synthesizer that looks up stimuli in a pool of shared, unit-level waveforms
+
+    The wrapped synthesizer must be linear in level (i.e., changing the level of every component by the same number of
+    decibels must only scale the waveform, which excludes stimuli with random noise) and every level must be a scalar.
+    Stimuli are identified by the values of the arguments of the wrapped synthesizer's synthesize() other than level
+    and fs (and by fs, if fs_synthesis is None), so conditions that differ only in model parameters, level, or sampling
+    rate share a waveform. Use fill() before passing the pool to Sweep (see util/sharding.py) as its synthesizer.
+    """
+    def __init__(self, synthesizer, fs_synthesis=int(48e3), reference_level=0.0):
+        """
+        Arguments:
+            synthesizer (Synthesizer): synthesizer used to synthesize the shared waveforms at fs_synthesis
+            fs_synthesis (int, None): sampling rate in Hz at which the shared waveforms are synthesized, or None to
+                synthesize them at the sampling rate of each condition (so that they are never resampled)
+            reference_level (float): level in dB SPL at which the shared waveforms are synthesized
+        """
+        super().__init__(stimulus_name=synthesizer.stimulus_name)
+        self.synthesizer = synthesizer
+        self.fs_synthesis = fs_synthesis
+        self.reference_level = reference_level
+        self.names = [name for name, arg in inspect.signature(synthesizer.synthesize).parameters.items()
+                      if name not in ['level', 'fs'] and arg.kind not in [arg.VAR_POSITIONAL, arg.VAR_KEYWORD]]
+        self.references = dict()
+
+    def key(self, ele):
+        """ Returns the hex digest that identifies the shared waveform of a parameter dict """
+        hasher = hashlib.sha1()
+        for name in self.names:
+            if name in ele:
+                hash_value(hasher, name)
+                hash_value(hasher, ele[name])
+        if self.fs_synthesis is None:
+            hash_value(hasher, 'fs')
+            hash_value(hasher, ele['fs'])
+        return hasher.hexdigest()
+
+    def fill(self, params, scratch):
+        """ Synthesizes every stimulus needed by params that is not yet in the pool and stores it in a scratch file
+
+        Args:
+            params (list): list of Parameters objects (or possibly nested lists of parameter dicts), e.g., the
+                parameters of the same sweep for each model
+            scratch (ScratchDirectory): scratch directory in which to store the waveforms, which must not be deleted
+                until every stimulus has been looked up
+        """
+        unique = dict()
+        for ele in [ele for sweep_params in params for ele in flatten_parameter_sequence(sweep_params)[0]]:
+            key = self.key(ele)
+            if key not in self.references:
+                unique.setdefault(key, dict(ele, level=self.reference_level, fs=self.fs_synthesis or ele['fs']))
+        if len(unique) == 0:
+            return
+        if isinstance(self.synthesizer, BatchSynthesizerGuest2021):
+            stimuli = self.synthesizer.synthesize_sequence(list(unique.values()))
+        else:
+            stimuli = [self.synthesizer.synthesize(**ele) for ele in unique.values()]
+        self.references.update(zip(unique.keys(), scratch.write([np.asarray(stimulus, dtype=np.float64)
+                                                                 for stimulus in stimuli])))
+
+    def synthesize(self, level, fs=int(48e3), **kwargs):
+        """
+        Looks up a shared waveform, resamples it to fs (unless it was synthesized at fs), and scales it to level
+
+        Arguments:
+            level (float): level of the stimulus in dB SPL, must be a scalar
+            fs (int): sampling rate in Hz
+            **kwargs: other arguments of the wrapped synthesizer's synthesize()
+
+        Returns:
+            output (array): stimulus
+        """
+        if np.ndim(level) != 0:
+            raise ValueError('StimulusPool only supports scalar levels')
+        key = self.key(dict(kwargs, fs=fs))
+        if key not in self.references:
+            raise KeyError('stimulus is not in the pool, call fill() first')
+        signal = self.references[key].load()
+        if self.fs_synthesis is not None:
+            signal = resample_polyphase(signal, self.fs_synthesis, fs)
+        return signal * 10**((level - self.reference_level)/20)
+
+    def synthesize_sequence(self, parameters, **kwargs):
+        """ Looks up a (possibly nested) sequence of stimuli
+
+        Args:
+            parameters (Parameters, list, ndarray): a Parameters object or a list/ndarray of parameter dicts
+            **kwargs: keyword arguments passed to every call, overriding values in the parameter dicts
+
+        Returns:
+            output (list, ndarray): stimuli in the same nesting as parameters
+        """
+        elements, structure = flatten_parameter_sequence(parameters)
+        outputs = [to_precision(self.synthesize(**{**ele, **kwargs})) for ele in elements]
+        return unflatten_parameter_sequence(structure, outputs)
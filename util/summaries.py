@@ -0,0 +1,69 @@
+"""
+The following functions and classes reduce auditory nerve model responses (neurograms of shape n_cf x n_sample) to
+compact per-channel summaries (time-averaged rate, variance over time, and optionally rates averaged in consecutive
+time windows) as soon as they are simulated, so that full responses never need to be kept in memory or saved to disk.
+Summaries are stored as numpy structured arrays, which can be saved and loaded without pickling.
+"""
+import numpy as np
+
+
+def summary_dtype(n_window=0):
+    """ Returns the structured dtype of a per-channel summary with n_window windowed rates """
+    fields = [('mean', np.float64), ('var', np.float64)]
+    if n_window > 0:
+        fields.append(('windowed', np.float64, (n_window, )))
+    return np.dtype(fields)
+
+
+def summarize_channels(response, fs=None, window=None):
+    """ Reduces a response to a per-channel summary
+
+    Args:
+        response (ndarray): model response of shape (n_cf, n_sample)
+        fs (int, None): sampling rate of the response in Hz, only needed if window is given
+        window (float, None): duration in seconds of consecutive windows in which rates are averaged, or None to skip
+            windowed rates. Samples left over after the last full window are ignored.
+
+    Returns:
+        summary (ndarray): structured array of shape (n_cf, ) with fields 'mean' (time-averaged rate), 'var' (variance
+            of rate over time) and, if window is given, 'windowed' (rate averaged in each window, of shape
+            (n_cf, n_window))
+    """
+    response = np.atleast_2d(response)
+    n_cf, n_sample = response.shape
+    n_window = 0 if window is None else n_sample // int(round(window * fs))
+    summary = np.zeros(n_cf, dtype=summary_dtype(n_window))
+    # Accumulate the sum and sum of squares of each channel without making a copy of the response
+    summary['mean'] = np.einsum('ct->c', response, dtype=np.float64) / n_sample
+    summary['var'] = np.einsum('ct,ct->c', response, response, dtype=np.float64) / n_sample - summary['mean']**2
+    if n_window > 0:
+        n_per_window = n_sample // n_window
+        summary['windowed'] = np.mean(response[:, :(n_window*n_per_window)].reshape((n_cf, n_window, n_per_window)),
+                                      axis=2)
+    return summary
+
+
+class ChannelSummary:
+    """ Wraps a simulate method (e.g., AuditoryNerveZilany2014().simulate) so that it returns a per-channel summary of
+    each response (see summarize_channels) rather than the response itself
+
+    Instances can be passed anywhere the wrapped method could be, e.g., as the runfunc of sim.run() or wrapped in
+    CachedSimulation, in which case only the summaries are cached.
+    """
+    def __init__(self, simulate, window=None, model_name=None):
+        """
+        Arguments:
+            simulate (function): function that accepts a parameter dict and returns a response of shape
+                (n_cf, n_sample)
+            window (float, None): duration in seconds of windows in which rates are averaged, or None
+            model_name (str): name used to identify the summarized model (e.g., in cache keys), defaults to the class
+                name of the object to which simulate is bound followed by the summary settings
+        """
+        self.simulate = simulate
+        self.window = window
+        if model_name is None:
+            model_name = type(simulate.__self__).__name__ + '_summary_' + repr(window)
+        self.model_name = model_name
+
+    def __call__(self, params):
+        return summarize_channels(self.simulate(params), params.get('fs'), self.window)
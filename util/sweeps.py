@@ -0,0 +1,129 @@
+"""
+The following functions implement declarative simulation sweeps. A sweep is described by a set of axes (e.g., delta,
+finite-difference method, and stimulus), whose Cartesian product gives the conditions of the sweep, and a function that
+expands each condition into a Parameters object. Every model simulation needed by any condition is identified by its
+cache key (see util/cache.py), so simulations shared between conditions (e.g., a baseline that does not depend on the
+size of the increment) are only run once. The unique simulations are run on a process pool and stored in a
+ResponseCache, and each condition is then decoded from the cache. The responses of the sweep are pinned in the cache
+until every condition has been decoded. Stimuli are passed to the workers through memory-mapped scratch files (see
+util/scratch.py). Results are returned as a single tidy table with one row per result.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import os
+import apcmodels.decode as dc
+import pandas as pd
+from util.cache import CachedSimulation, ResponseCache
+from util.functions import flatten_parameter_sequence
+from util.results import rows_to_columns, to_rows
+from util.scratch import ScratchDirectory, load_inputs, share_inputs
+
+
+def expand_grid(axes):
+    """ Returns every combination of the values of the axes, with the last axis varying fastest
+
+    Args:
+        axes (dict): mapping from axis names to lists of values
+
+    Returns:
+        conditions (list): list of dicts mapping each axis name to one of its values
+    """
+    names = list(axes.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*[axes[name] for name in names])]
+
+
+def simulate_shard(model, model_name, cache, shard):
+    """ Simulates every parameter dict in a shard in the current process and stores the responses in the cache
+
+    Args:
+        model: model class from apcmodels.anf
+        model_name (str): name of the model used in cache keys
+        cache (ResponseCache): cache in which to store responses
+        shard (list): list of parameter dicts, including stimuli (which may be ScratchArrays from util/scratch.py)
+    """
+    runfunc = CachedSimulation(model().simulate, model_name, cache)
+    for ele in shard:
+        runfunc(load_inputs(ele))
+
+
+def decode_shard(model, model_name, cache, decoder, shard):
+    """ Decodes every condition in a shard from cached responses in the current process
+
+    Args:
+        model: model class from apcmodels.anf
+        model_name (str): name of the model used in cache keys
+        cache (ResponseCache): cache holding the responses
+        decoder (function): function that accepts a simulate method and returns a runfunc
+        shard (list): list of elements of a Parameters object, whose stimuli may be ScratchArrays
+
+    Returns:
+        results (list): output of the runfunc for each element of the shard
+    """
+    runfunc = decoder(CachedSimulation(model().simulate, model_name, cache))
+    return [runfunc(load_inputs(ele)) for ele in shard]
+
+
+def run_grid(model, model_name, prepare, axes, decoder=dc.decode_ideal_observer, outputs=('AI', 'RP'), requests=None,
+             cache=None, n_workers=None, **kwargs):
+    """ Runs a sweep over the Cartesian product of axes, simulating each unique stimulus only once
+
+    Args:
+        model: model class from apcmodels.anf
+        model_name (str): name of the model, used in cache keys and stored in the 'model' column
+        prepare (function): function that accepts one value of each axis (and kwargs) as keyword arguments and returns
+            a flattened Parameters object (or a list of its elements, e.g., the output of FiniteDifferencePlan.expand
+            from util/finite_differences.py) with increments and inputs already added
+        axes (dict): mapping from axis names to lists of values, e.g., {'delta': [1e-6, 1e-4]}
+        decoder (function): function that accepts a simulate method and returns a runfunc, e.g.,
+            dc.decode_ideal_observer. Must be defined at the module level so that it can be sent to workers.
+        outputs (tuple): names stored in the 'decoding_type' column for each element of the runfunc output, or None if
+            the runfunc returns a single result
+        requests (list, None): if the runfunc returns a list of outputs for each element, one per request (e.g.,
+            decode_finite_differences from util/finite_differences.py), a list of namedtuples describing each request
+            whose fields are stored as columns, or None if the runfunc returns a single output per element
+        cache (ResponseCache): cache in which responses are stored, defaults to a ResponseCache with default settings
+        n_workers (int, None): number of worker processes, defaults to the number of CPUs
+        **kwargs: keyword arguments passed to every call of prepare
+
+    Returns:
+        results (DataFrame): table with one row per result, with a column for each axis and each parameter, a 'model'
+            column, a 'decoding_type' column (if outputs is not None), and the result in the 'result' column
+    """
+    cache = ResponseCache() if cache is None else cache
+    n_workers = n_workers or os.cpu_count()
+    conditions = expand_grid(axes)
+    params = [list(prepare(**condition, **kwargs)) for condition in conditions]
+    # Find the unique simulations across every condition that are not already cached
+    unique = {}
+    for ele in [ele for elements in params for ele in flatten_parameter_sequence(elements)[0]]:
+        unique.setdefault(cache.key(ele, model_name), ele)
+    missing = [ele for key, ele in unique.items() if not os.path.exists(os.path.join(cache.path, key + '.npy'))]
+    # Pin the responses of the sweep so that least-recently-used eviction cannot delete a response between simulating
+    # and decoding it (which would make the decoders silently simulate it again)
+    with cache.pin(unique), ScratchDirectory() as scratch, ProcessPoolExecutor(max_workers=n_workers) as executor:
+        # Move the stimuli into a scratch file (once each) so that workers receive only references to them
+        shared_params, shared_missing = share_inputs([params, missing], scratch)
+        # Simulate the unique stimuli, dealing them out so that each worker gets a similar mix of conditions
+        n_shard = min(n_workers, len(missing))
+        for future in [executor.submit(simulate_shard, model, model_name, cache, shared_missing[idx::n_shard])
+                       for idx in range(n_shard)]:
+            future.result()
+        # Decode each condition from the cache
+        futures = [executor.submit(decode_shard, model, model_name, cache, decoder, elements)
+                   for elements in shared_params]
+        results = [future.result() for future in futures]
+    # Assemble the results of every condition (and request) into a single table
+    rows = []
+    for condition, elements, result in zip(conditions, params, results):
+        if requests is None:
+            splits = [(dict(), result)]
+        else:
+            splits = [(request._asdict(), [res[idx] for res in result]) for idx, request in enumerate(requests)]
+        for columns, output in splits:
+            if outputs is None:
+                rows.extend(to_rows(output, elements, model=model_name, **columns, **condition))
+            else:
+                for idx, name in enumerate(outputs):
+                    rows.extend(to_rows([res[idx] for res in output], elements, model=model_name,
+                                        decoding_type=name, **columns, **condition))
+    return pd.DataFrame(rows_to_columns(rows))